@@ -0,0 +1 @@
+"""Benchmarks and synthetic corpus for the conversion hot paths (see run and corpus)."""
@@ -0,0 +1,260 @@
+"""
+Synthetic, reproducible corpus for the benchmarks.
+
+Books are generated from a seed: the same (words, script, nesting, seed)
+always gives byte-identical files. ``script`` picks the text mix:
+
+    latin   English-like words
+    cjk     CJK ideographs (one word each, as utils.count_words counts them)
+    mixed   paragraphs alternating between the two, with Latin terms in CJK text
+
+``nesting`` > 0 makes the XHTML pathological: every chapter gets
+containers nested ``nesting`` deep, nested lists and paragraphs with
+hundreds of inline tags.
+
+    python -m benchmarks.corpus --words 1M --script mixed -o /tmp/corpus
+"""
+import argparse
+import random
+import zipfile
+from html import escape
+from pathlib import Path
+
+
+# Words per chapter; a book of N words has about N / CHAPTER_WORDS chapters.
+CHAPTER_WORDS = 5000
+
+SCRIPTS = ('latin', 'cjk', 'mixed')
+
+_LATIN = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which but "
+    "have an they you were her she there been one all we their has would when if so no will more "
+    "reading chapter history language between knowledge structure evidence particular river "
+    "mountain century government experience argument beautiful philosophy consequently notebook"
+).split()
+
+# Common ideographs (U+4E00..U+9FA5)
+_CJK_FIRST, _CJK_LAST = 0x4E00, 0x9FA5
+
+
+def parse_size(text: str) -> int:
+    """'10k', '1.5M' or '2000' -> number of words."""
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def format_size(words: int) -> str:
+    for scale, suffix in ((1_000_000, 'M'), (1_000, 'k')):
+        if words >= scale and words % scale == 0:
+            return f"{words // scale}{suffix}"
+    return str(words)
+
+
+class TextGenerator:
+    """Sentences in one of SCRIPTS, with an exact running word count."""
+
+    def __init__(self, script: str = 'latin', seed: int = 0):
+        if script not in SCRIPTS:
+            raise ValueError(f"script must be one of {', '.join(SCRIPTS)}")
+        self.script = script
+        self.rnd = random.Random(seed)
+
+    def _latin(self, words: int) -> str:
+        choice = self.rnd.choice
+        text = " ".join(choice(_LATIN) for _ in range(words))
+        return text[:1].upper() + text[1:] + "."
+
+    def _cjk(self, words: int) -> str:
+        randint = self.rnd.randint
+        return "".join(chr(randint(_CJK_FIRST, _CJK_LAST)) for _ in range(words)) + "。"
+
+    def sentence(self, words: int) -> str:
+        """A sentence of exactly ``words`` words."""
+        if self.script == 'latin':
+            return self._latin(words)
+        if self.script == 'cjk':
+            return self._cjk(words)
+        # mixed: CJK with a Latin term now and then, or a Latin sentence
+        if self.rnd.random() < 0.5:
+            return self._latin(words)
+        if words < 4:
+            return self._cjk(words)
+        latin = self.rnd.randint(1, 2)
+        head = self.rnd.randint(1, words - latin - 1)
+        return self._cjk(head)[:-1] + f" {self._latin(latin)[:-1]} " + self._cjk(words - latin - head)
+
+    def paragraph(self, words: int) -> str:
+        parts = []
+        while words > 0:
+            n = min(words, self.rnd.randint(6, 30))
+            parts.append(self.sentence(n))
+            words -= n
+        return " ".join(parts)
+
+    def paragraph_sizes(self, words: int) -> list[int]:
+        """Split ``words`` into paragraph lengths of 20-200 words."""
+        sizes = []
+        while words > 0:
+            n = min(words, self.rnd.randint(20, 200))
+            sizes.append(n)
+            words -= n
+        return sizes
+
+
+def _chapter_sizes(words: int) -> list[int]:
+    sizes = [CHAPTER_WORDS] * (words // CHAPTER_WORDS)
+    if words % CHAPTER_WORDS:
+        sizes.append(words % CHAPTER_WORDS)
+    return sizes
+
+
+# ---- Markdown ----
+
+def markdown_text(words: int, script: str = 'latin', seed: int = 0) -> str:
+    """A Markdown book of about ``words`` words: chapters (#), sections (##) and paragraphs."""
+    gen = TextGenerator(script, seed)
+    out = [f"# Benchmark Book\n\n**Author:** {gen.sentence(2)[:-1]}\n\n---\n\n"]
+    for c, size in enumerate(_chapter_sizes(words), 1):
+        out.append(f"# Chapter {c}\n\n")
+        for p, para in enumerate(gen.paragraph_sizes(size)):
+            if p and p % 8 == 0:
+                out.append(f"## Section {c}.{p // 8}\n\n")
+            out.append(gen.paragraph(para) + "\n\n")
+        out.append("---\n\n")
+    return "".join(out)
+
+
+def write_markdown(path, words: int, script: str = 'latin', seed: int = 0) -> Path:
+    path = Path(path)
+    path.write_text(markdown_text(words, script, seed), encoding='utf-8')
+    return path
+
+
+# ---- EPUB ----
+
+def _inline(gen: TextGenerator, words: int) -> str:
+    """Paragraph body with bold, italic, code and link runs."""
+    out = []
+    while words > 0:
+        n = min(words, gen.rnd.randint(3, 25))
+        text = escape(gen.sentence(n))
+        kind = gen.rnd.random()
+        if kind < 0.1:
+            text = f"<b>{text}</b>"
+        elif kind < 0.2:
+            text = f"<em>{text}</em>"
+        elif kind < 0.25:
+            text = f'<a href="#n{words}">{text}</a>'
+        elif kind < 0.28:
+            text = f"<code>{text}</code>"
+        out.append(text)
+        words -= n
+    return " ".join(out)
+
+
+def _nested(gen: TextGenerator, depth: int) -> str:
+    """Pathological markup: deep containers, nested lists, a paragraph of tiny inline tags."""
+    containers = "<div><section>" * (depth // 2) + f"<p>{escape(gen.sentence(12))}</p>" + "</section></div>" * (depth // 2)
+    lists = ""
+    for level in range(min(depth, 50)):
+        lists += f"<ul><li>{escape(gen.sentence(3))}"
+    lists += "</li></ul>" * min(depth, 50)
+    tiny = "".join(f"<span><i>{escape(gen.sentence(1))}</i></span> " for _ in range(depth * 4))
+    return f"<div>{containers}</div>\n{lists}\n<p>{tiny}</p>\n"
+
+
+def chapter_xhtml(gen: TextGenerator, number: int, words: int, nesting: int = 0) -> bytes:
+    body = [f"<h1>Chapter {number}</h1>\n"]
+    for p, para in enumerate(gen.paragraph_sizes(words)):
+        if p and p % 8 == 0:
+            body.append(f"<h2>Section {number}.{p // 8}</h2>\n")
+        if p % 13 == 5:
+            items = "".join(f"<li>{escape(gen.sentence(4))}</li>" for _ in range(4))
+            body.append(f"<ul>{items}</ul>\n")
+        body.append(f"<p>{_inline(gen, para)}</p>\n")
+    if nesting:
+        body.append(_nested(gen, nesting))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml">\n'
+        f"<head><title>Chapter {number}</title></head>\n"
+        f"<body>\n{''.join(body)}</body>\n</html>\n"
+    ).encode('utf-8')
+
+
+_CONTAINER = (
+    '<?xml version="1.0"?>\n'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+    '</rootfiles></container>\n'
+)
+
+
+def write_epub(path, words: int, script: str = 'latin', nesting: int = 0, seed: int = 0) -> Path:
+    """An EPUB 3 of about ``words`` words in chapters of CHAPTER_WORDS, chapter by chapter."""
+    path = Path(path)
+    gen = TextGenerator(script, seed)
+    manifest, spine = [], []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        z.writestr('META-INF/container.xml', _CONTAINER)
+        for c, size in enumerate(_chapter_sizes(words), 1):
+            z.writestr(f'OEBPS/chapter{c}.xhtml', chapter_xhtml(gen, c, size, nesting))
+            manifest.append(f'<item id="c{c}" href="chapter{c}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="c{c}"/>')
+        z.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="id">bench-{script}-{words}-{nesting}-{seed}</dc:identifier>'
+            f'<dc:title>Benchmark {script} {format_size(words)}</dc:title>'
+            '<dc:creator>Benchmark Generator</dc:creator><dc:language>en</dc:language></metadata>'
+            f'<manifest>{"".join(manifest)}</manifest><spine>{"".join(spine)}</spine></package>\n'
+        ))
+    return path
+
+
+class Corpus:
+    """Generated books in a directory, made on first use and reused afterwards."""
+
+    def __init__(self, root, seed: int = 0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.seed = seed
+
+    def _name(self, words, script, nesting, suffix):
+        nested = f"-nest{nesting}" if nesting else ""
+        return self.root / f"{script}-{format_size(words)}{nested}-s{self.seed}{suffix}"
+
+    def epub(self, words: int, script: str = 'latin', nesting: int = 0) -> Path:
+        path = self._name(words, script, nesting, ".epub")
+        if not path.exists():
+            write_epub(path.with_name(path.name + ".tmp"), words, script, nesting, self.seed).replace(path)
+        return path
+
+    def markdown(self, words: int, script: str = 'latin') -> Path:
+        path = self._name(words, script, 0, ".md")
+        if not path.exists():
+            write_markdown(path.with_name(path.name + ".tmp"), words, script, self.seed).replace(path)
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic EPUB and Markdown books")
+    parser.add_argument("-o", "--output", type=Path, default=Path("corpus"), help="output directory")
+    parser.add_argument("--words", default="10k,100k,1M", help="comma-separated sizes, e.g. 10k,1M,5M")
+    parser.add_argument("--script", default="mixed", help=f"comma-separated, of: {', '.join(SCRIPTS)}")
+    parser.add_argument("--nesting", type=int, default=0, help="pathological nesting depth (0 = none)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.output, args.seed)
+    for words in map(parse_size, args.words.split(',')):
+        for script in args.script.split(','):
+            for path in (corpus.epub(words, script, args.nesting), corpus.markdown(words, script)):
+                print(f" - {path} ({path.stat().st_size / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Benchmarks for the conversion hot paths.
+
+Each component runs on books from the synthetic corpus (see corpus) at
+several sizes and scripts, and is reported as
+
+    p50 / p95   latency of one call (a chapter for the HTML components,
+                the whole book for the others)
+    words/s     words processed per second over all calls
+    MB/s        input bytes per second
+    peak MB     peak memory allocated during one pass (tracemalloc)
+    RSS MB      peak RSS of the process that ran it, interpreter included;
+                both measured once in a fresh process, apart from the timing
+
+Results are printed and saved as JSON; with --baseline the run is
+compared against an earlier results file and exits with status 1 if any
+case got slower or bigger by more than --threshold.
+
+    python -m benchmarks.run --sizes 10k,100k,1M -o results.json
+    python -m benchmarks.run --baseline results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from bs4 import BeautifulSoup
+
+from zlibrary_to_notebooklm.chunking import ChunkPolicy, plan_parts, split_markdown_file
+from zlibrary_to_notebooklm.convert_epub import chapter_to_markdown, epub_to_markdown, html_to_markdown
+from zlibrary_to_notebooklm.epub_reader import EpubReader
+from zlibrary_to_notebooklm.utils import count_words
+
+try:
+    from .corpus import CHAPTER_WORDS, SCRIPTS, Corpus, format_size, parse_size
+except ImportError:
+    from corpus import CHAPTER_WORDS, SCRIPTS, Corpus, format_size, parse_size
+
+
+# Components measured on the EPUB corpus; the rest use the Markdown corpus.
+EPUB_COMPONENTS = ('html_to_markdown', 'chapter_to_markdown', 'epub_to_markdown', 'process_book')
+MARKDOWN_COMPONENTS = ('count_words', 'split_greedy', 'split_balanced', 'plan_greedy', 'plan_balanced')
+COMPONENTS = MARKDOWN_COMPONENTS + EPUB_COMPONENTS
+
+# Results file format version.
+RESULTS_VERSION = 1
+
+
+def _quiet(fn):
+    """fn with its prints (progress output of the converters) suppressed."""
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return call
+
+
+def _split_budget(words: int) -> int:
+    """A word budget that cuts the book into about four parts."""
+    return max(1000, words // 4)
+
+
+# Word budget of the plan_* components: under CHAPTER_WORDS, so every
+# chapter is cut at blank lines and the book packs into many small parts
+# (the most work for the packer and the balancing search).
+PLAN_BUDGET = CHAPTER_WORDS * 2 // 5
+
+
+def prepare(case: dict, workdir: Path) -> tuple[list, int, int]:
+    """The calls of one pass over a case, and the words and bytes they process.
+
+    Files a component writes go to ``workdir``.
+    """
+    corpus = Corpus(case["corpus"], case["seed"])
+    component, words, script, nesting = case["component"], case["words"], case["script"], case["nesting"]
+
+    if component in MARKDOWN_COMPONENTS:
+        source = corpus.markdown(words, script)
+        size = source.stat().st_size
+        if component == 'count_words':
+            text = source.read_text(encoding='utf-8')
+            return [lambda: count_words(text)], count_words(text), size
+        if component in ('plan_greedy', 'plan_balanced'):
+            # Planning alone: index, paragraph fallback and packing, no part files
+            policy = ChunkPolicy(max_words=PLAN_BUDGET, balance=component == 'plan_balanced')
+            return [lambda: plan_parts(source, policy)], count_words(source.read_text(encoding='utf-8')), size
+        md_file = workdir / source.name
+        shutil.copyfile(source, md_file)
+        policy = ChunkPolicy(max_words=_split_budget(words), balance=component == 'split_balanced')
+        return [lambda: split_markdown_file(md_file, policy)], count_words(md_file.read_text(encoding='utf-8')), size
+
+    source = corpus.epub(words, script, nesting)
+    with EpubReader(source) as book:
+        chapters = [content for _, content in book.documents()]
+    total = sum(count_words(chapter_to_markdown(content)) for content in chapters)
+
+    if component == 'html_to_markdown':
+        # Parsing is done up front: this times the Markdown builder alone
+        soups = [BeautifulSoup(content.decode('utf-8'), 'html.parser') for content in chapters]
+        return [lambda soup=soup: html_to_markdown(soup) for soup in soups], total, sum(map(len, chapters))
+    if component == 'chapter_to_markdown':
+        return [lambda content=content: chapter_to_markdown(content) for content in chapters], total, sum(map(len, chapters))
+
+    book_file = workdir / source.name
+    shutil.copyfile(source, book_file)
+    if component == 'epub_to_markdown':
+        return [_quiet(lambda: epub_to_markdown(book_file, book_file.with_suffix('.md')))], total, source.stat().st_size
+    if component == 'process_book':
+        from main import process_book
+        return [_quiet(lambda: process_book(book_file, policy=ChunkPolicy(max_words=_split_budget(words))))], \
+            total, source.stat().st_size
+    raise ValueError(f"unknown component: {component}")
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))]
+
+
+def time_case(case: dict, repeat: int, time_budget: float) -> dict:
+    """Run ``repeat`` passes (fewer once ``time_budget`` seconds are spent, but at least one)."""
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        calls, words, size = prepare(case, Path(tmp))
+        calls[0]()  # warm-up: imports, caches, first-touch of the input
+        latencies = []
+        started = time.perf_counter()
+        passes = 0
+        while passes < repeat and (passes == 0 or time.perf_counter() - started < time_budget):
+            for call in calls:
+                t = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - t)
+            passes += 1
+    total = sum(latencies)
+    return {
+        "words": words,
+        "bytes": size,
+        "calls": len(calls),
+        "passes": passes,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "words_per_s": words * passes / total if total else None,
+        "mb_per_s": size * passes / total / 2**20 if total else None,
+    }
+
+
+def _max_rss_mb() -> float | None:
+    """Peak RSS of this process so far."""
+    # ru_maxrss survives exec on Linux (it would report the parent's peak),
+    # the mm's own high-water mark does not
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def _memory_probe(case: dict) -> tuple[float, float | None]:
+    """(peak MB traced during one pass, peak RSS MB of the process); runs in a fresh process."""
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        calls, _, _ = prepare(case, Path(tmp))
+        tracemalloc.start()
+        for call in calls:
+            call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peak / 2**20, _max_rss_mb()
+
+
+def measure_memory(case: dict) -> tuple[float, float | None]:
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_memory_probe, (case,))
+
+
+def case_name(case: dict) -> str:
+    nested = f"-nest{case['nesting']}" if case["nesting"] else ""
+    return f"{case['script']}-{format_size(case['words'])}{nested}"
+
+
+def plan_cases(args) -> list[dict]:
+    cases = []
+    base = {"corpus": str(args.corpus), "seed": args.seed}
+    for component in args.components:
+        for words in args.sizes:
+            for script in args.scripts:
+                cases.append({**base, "component": component, "words": words, "script": script, "nesting": 0})
+        # Pathological markup only matters to the components that parse HTML
+        if args.nesting and component in EPUB_COMPONENTS:
+            cases.append({**base, "component": component, "words": min(args.sizes),
+                          "script": "mixed", "nesting": args.nesting})
+    return cases
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Ratios (current / baseline) of p50 latency and peak memory for every case in both runs."""
+    old = {(r["component"], r["case"]): r for r in baseline["results"]}
+    rows = []
+    for r in results["results"]:
+        b = old.get((r["component"], r["case"]))
+        if b is None:
+            continue
+        time_ratio = r["p50_ms"] / b["p50_ms"] if b["p50_ms"] else None
+        mem_ratio = (r["peak_mb"] / b["peak_mb"]
+                     if r.get("peak_mb") is not None and b.get("peak_mb") else None)
+        regressed = any(ratio is not None and ratio > 1 + threshold for ratio in (time_ratio, mem_ratio))
+        improved = time_ratio is not None and time_ratio < 1 - threshold
+        rows.append({
+            "component": r["component"],
+            "case": r["case"],
+            "p50_ratio": time_ratio,
+            "peak_ratio": mem_ratio,
+            "status": "regressed" if regressed else "improved" if improved else "same",
+        })
+    return rows
+
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def print_results(results: list[dict]):
+    print(f"{'component':<20} {'case':<18} {'words':>9} {'p50 ms':>10} {'p95 ms':>10} "
+          f"{'words/s':>12} {'MB/s':>8} {'peak MB':>8} {'RSS MB':>8}")
+    for r in results:
+        print(f"{r['component']:<20} {r['case']:<18} {r['words']:>9,} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+              f"{_fmt(r['words_per_s'], '>12,.0f')} {_fmt(r['mb_per_s'], '>8.2f')} "
+              f"{_fmt(r['peak_mb'], '>8.1f')} {_fmt(r['rss_mb'], '>8.1f')}")
+
+
+def print_comparison(rows: list[dict], threshold: float):
+    print(f"\nAgainst baseline (threshold {threshold:.0%}):")
+    print(f"{'component':<20} {'case':<18} {'p50':>8} {'peak':>8}  status")
+    for row in rows:
+        print(f"{row['component']:<20} {row['case']:<18} {_fmt(row['p50_ratio'], '>7.2f')}x "
+              f"{_fmt(row['peak_ratio'], '>7.2f')}x  {row['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the conversion hot paths on a synthetic corpus")
+    parser.add_argument("--sizes", default="10k,100k,1M",
+                        help="comma-separated book sizes in words (e.g. 10k,100k,1M,5M)")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help="comma-separated, of: latin, cjk, mixed")
+    parser.add_argument("--components", default=",".join(COMPONENTS),
+                        help=f"comma-separated, of: {', '.join(COMPONENTS)}")
+    parser.add_argument("--nesting", type=int, default=200,
+                        help="depth of the pathological-markup cases (0 = skip them)")
+    parser.add_argument("--repeat", type=int, default=5, help="passes per case")
+    parser.add_argument("--time-budget", type=float, default=30,
+                        help="seconds after which a case stops repeating (one pass always runs)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak-memory measurements")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "zlibrary-bench-corpus",
+                        help="directory the generated books are kept in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="compare against this results file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    args.sizes = [parse_size(s) for s in args.sizes.split(',')]
+    args.scripts = args.scripts.split(',')
+    args.components = args.components.split(',')
+    for name, chosen, allowed in (("script", args.scripts, SCRIPTS), ("component", args.components, COMPONENTS)):
+        unknown = set(chosen) - set(allowed)
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(sorted(unknown))}")
+
+    results = []
+    for case in plan_cases(args):
+        name = case_name(case)
+        print(f"⏱️  {case['component']} {name}", file=sys.stderr)
+        result = {"component": case["component"], "case": name, **time_case(case, args.repeat, args.time_budget)}
+        result["peak_mb"], result["rss_mb"] = (None, None) if args.no_memory else measure_memory(case)
+        results.append(result)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding='utf-8')
+        print(f"\n📁 Results: {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        rows = compare(report, baseline, args.threshold)
+        print_comparison(rows, args.threshold)
+        if any(row["status"] == "regressed" for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,50 +1,443 @@
 #!/usr/bin/env python3
 """
 Main script to convert EPUB/PDF to Markdown and split for NotebookLM.
+
+Run as a CLI on one book, or as an HTTP ingestion service (start.sh runs
+``uvicorn main:app``): books are submitted as uploads or Z-Library URLs,
+queued, converted in a process pool, and their status, word counts and
+part files are served back.
+
+    POST /jobs/file?filename=book.epub   body: the book file  -> 202 job
+    POST /jobs/url                       {"url": "..."}        -> 202 job
+    GET  /jobs/{id}                      job status and result
+    GET  /jobs/{id}/events               status updates (server-sent events)
+    GET  /jobs/{id}/parts/{n}            part file n (1-based)
+
+Submissions beyond INGEST_QUEUE_SIZE waiting jobs get 429.
 """
 
-import sys
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+
 from zlibrary_to_notebooklm.convert_epub import epub_to_markdown
-from zlibrary_to_notebooklm.utils import split_markdown_file, count_words
+from zlibrary_to_notebooklm.convert_pdf import pdf_to_markdown
+from zlibrary_to_notebooklm.chunking import ChunkPolicy, plan_parts, write_parts
+from zlibrary_to_notebooklm.conversion_cache import ConversionCache
+from zlibrary_to_notebooklm.chapter_store import ChapterStore
 
-def process_book(book_file: Path):
-    """Process EPUB/PDF book file"""
+
+BOOK_SUFFIXES = (".epub", ".pdf")
+
+
+def convert_book(book_file: Path, workers: int = 1, policy: ChunkPolicy = ChunkPolicy(),
+                 cache: ConversionCache | None = None) -> dict | None:
+    """Convert an EPUB/PDF to Markdown and split it under policy.
+
+    Returns a dict with the Markdown path, its words and characters and
+    the parts (path and words of each), or None if the conversion failed.
+    """
+    # Convert EPUB/PDF -> Markdown (PDF pages are extracted in parallel)
+    output_md = book_file.with_suffix(".md")
+    if book_file.suffix.lower() == ".pdf":
+        stats = pdf_to_markdown(book_file, output_md, workers=workers)
+    elif cache is not None:
+        stats = cache.epub_to_markdown(book_file, output_md, workers=workers)
+    else:
+        stats = epub_to_markdown(book_file, output_md, workers=workers)
+    if not stats:
+        return None
+
+    # Word count is tallied while the chapters are written
+    total_words = stats["words"]
+    if policy.fits(total_words, stats["characters"]):
+        parts = [{"path": output_md, "words": total_words}]
+    else:
+        if stats.get("key") is not None:
+            plan = cache.plan_parts(stats["key"], output_md, policy)
+        else:
+            plan = plan_parts(output_md, policy)
+        files = write_parts(output_md, plan)
+        parts = [{"path": f, "words": part.words} for f, part in zip(files, plan)]
+    return {
+        "markdown": output_md,
+        "words": total_words,
+        "characters": stats["characters"],
+        "parts": parts,
+    }
+
+
+def process_book(book_file: Path, workers: int = 1, policy: ChunkPolicy = ChunkPolicy(),
+                 cache: ConversionCache | None = None):
+    """Process EPUB/PDF book file (reusing cached conversions when a cache is given)"""
     if not book_file.exists():
         print(f"❌ File not found: {book_file}")
         return
 
     print(f"📖 Processing book: {book_file.name}")
+    result = convert_book(book_file, workers, policy, cache)
+    if not result:
+        print(f"❌ Conversion failed: {book_file}")
+        return
 
-    # Convert EPUB -> Markdown (PDFs are returned as-is)
-    output_md = book_file.with_suffix(".md")
-    epub_to_markdown(book_file, output_md)
-
-    # Count words
-    with open(output_md, 'r', encoding='utf-8') as f:
-        text = f.read()
-    total_words = count_words(text)
-    print(f"ℹ️ Total words: {total_words:,}")
-
-    # Split if too large
-    if total_words > 350000:
-        print("⚠️ File exceeds 350k words, splitting...")
-        chunks = split_markdown_file(output_md)
-    else:
-        chunks = [output_md]
+    print(f"ℹ️ Total words: {result['words']:,}")
+    if len(result["parts"]) > 1:
+        print(f"⚠️ File exceeds the part budget ({policy.max_words:,} words), split into {len(result['parts'])} parts")
 
     print("\n✅ Processing complete! Output files:")
-    for c in chunks:
-        print(f" - {c}")
+    for part in result["parts"]:
+        print(f" - {part['path']}")
+    return result
+
+
+# ---- ingestion service ----
+
+INGEST_DIR = Path(os.environ.get("INGEST_DIR", Path.home() / ".zlibrary" / "ingest"))
+# Conversion processes; also the number of jobs processed at once.
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+# Jobs that may wait for a worker before submissions are refused with 429.
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 16))
+INGEST_MAX_UPLOAD_MB = int(os.environ.get("INGEST_MAX_UPLOAD_MB", 500))
+# Finished jobs kept (with their files) before the oldest are dropped.
+INGEST_KEEP_JOBS = int(os.environ.get("INGEST_KEEP_JOBS", 200))
+
+# Conversion cache of a pool worker process.
+_worker_cache = None
+
+
+def _init_ingest_worker():
+    global _worker_cache
+    _worker_cache = ConversionCache(chapters=ChapterStore())
+
+
+def _ingest(book_file: str, policy: ChunkPolicy) -> dict | None:
+    """convert_book in a pool worker; paths come back as strings."""
+    result = convert_book(Path(book_file), policy=policy, cache=_worker_cache)
+    if result is None:
+        return None
+    result["markdown"] = str(result["markdown"])
+    for part in result["parts"]:
+        part["path"] = str(part["path"])
+    return result
+
+
+class Ingestion:
+    """Job table, bounded queue and the workers that drain it."""
+
+    def __init__(self, root: Path, workers: int, queue_size: int, keep_jobs: int):
+        self.root = root
+        self.workers = workers
+        self.keep_jobs = keep_jobs
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.running = 0
+        self._changed = asyncio.Condition()
+        self._uploader = None
+
+    async def start(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_ingest_worker)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+
+    def full(self) -> bool:
+        return self.queue.full()
+
+    def new_job(self, source: str, policy: ChunkPolicy) -> dict:
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "source": source,
+            "max_words": policy.max_words,
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None,
+        }
+        (self.root / job_id).mkdir()
+        self.jobs[job_id] = job
+        return job
+
+    def submit(self, job: dict, policy: ChunkPolicy, book_file: Path | None = None, url: str | None = None):
+        """Queue a job; raises asyncio.QueueFull when the queue is at capacity."""
+        try:
+            self.queue.put_nowait((job["id"], policy, book_file, url))
+        except asyncio.QueueFull:
+            self.discard(job["id"])
+            raise
+
+    def discard(self, job_id: str):
+        self.jobs.pop(job_id, None)
+        shutil.rmtree(self.root / job_id, ignore_errors=True)
+
+    async def _update(self, job: dict, **fields):
+        job.update(fields)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def wait_changed(self, timeout: float):
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, policy, book_file, url = await self.queue.get()
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            self.running += 1
+            await self._update(job, status="running", started=time.time())
+            try:
+                if url is not None:
+                    await self._update(job, status="downloading")
+                    book_file = await self._download(url, self.root / job_id)
+                    await self._update(job, status="running")
+                result = await loop.run_in_executor(
+                    self.pool, _ingest, str(book_file), policy
+                )
+                if result is None:
+                    raise RuntimeError("conversion failed")
+                await self._update(job, status="done", result=self._public_result(job_id, result))
+            except Exception as e:
+                await self._update(job, status="failed", error=f"{type(e).__name__}: {e}")
+            finally:
+                self.running -= 1
+                job["finished"] = time.time()
+                self._evict()
+
+    async def _download(self, url: str, job_dir: Path) -> Path:
+        """Download a book from Z-Library into the job directory."""
+        if self._uploader is None:
+            from zlibrary_to_notebooklm.upload import ZLibraryAutoUploader
+            self._uploader = ZLibraryAutoUploader(headless=True)
+        book_file, _ = await self._uploader.fetch_book(url)
+        if not book_file or not book_file.exists():
+            raise RuntimeError("download failed")
+        target = job_dir / book_file.name
+        shutil.copyfile(book_file, target)
+        return target
+
+    def _public_result(self, job_id: str, result: dict) -> dict:
+        return {
+            "words": result["words"],
+            "characters": result["characters"],
+            "parts": [
+                {
+                    "index": i,
+                    "name": Path(part["path"]).name,
+                    "words": part["words"],
+                    "bytes": Path(part["path"]).stat().st_size,
+                    "url": f"/jobs/{job_id}/parts/{i}",
+                }
+                for i, part in enumerate(result["parts"], 1)
+            ],
+            "_paths": [part["path"] for part in result["parts"]],
+        }
+
+    def _evict(self):
+        finished = [j for j in self.jobs.values() if j["status"] in ("done", "failed")]
+        for job in finished[:max(0, len(finished) - self.keep_jobs)]:
+            self.discard(job["id"])
+
+
+def _view(job: dict) -> dict:
+    """A job as returned by the API (without server-side paths)."""
+    view = dict(job)
+    if view["result"] is not None:
+        view["result"] = {k: v for k, v in view["result"].items() if not k.startswith("_")}
+    return view
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ingestion = Ingestion(INGEST_DIR, INGEST_WORKERS, INGEST_QUEUE_SIZE, INGEST_KEEP_JOBS)
+    await ingestion.start()
+    app.state.ingestion = ingestion
+    yield
+    await ingestion.close()
+
+
+app = FastAPI(title="Book ingestion", lifespan=lifespan)
+
+
+class URLJob(BaseModel):
+    url: str
+    max_words: int = ChunkPolicy.max_words
+
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=429, detail="ingestion queue is full", headers={"Retry-After": "30"})
+
+
+def _policy(max_words: int) -> ChunkPolicy:
+    try:
+        return ChunkPolicy(max_words=max_words)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _job_or_404(request: Request, job_id: str) -> dict:
+    job = request.app.state.ingestion.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="no such job")
+    return job
+
+
+@app.get("/health")
+async def health(request: Request):
+    ingestion = request.app.state.ingestion
+    return {
+        "queued": ingestion.queue.qsize(),
+        "queue_size": ingestion.queue.maxsize,
+        "running": ingestion.running,
+        "workers": ingestion.workers,
+    }
+
+
+@app.post("/jobs/file", status_code=202)
+async def submit_file(request: Request, filename: str, max_words: int = ChunkPolicy.max_words):
+    """Queue a book sent as the raw request body (streamed to disk)."""
+    ingestion = request.app.state.ingestion
+    name = Path(filename).name
+    if Path(name).suffix.lower() not in BOOK_SUFFIXES:
+        raise HTTPException(status_code=415, detail=f"only {', '.join(BOOK_SUFFIXES)} books are accepted")
+    policy = _policy(max_words)
+    # Refuse before reading the body when there is no room anyway
+    if ingestion.full():
+        raise _busy()
+
+    job = ingestion.new_job(name, policy)
+    book_file = ingestion.root / job["id"] / name
+    limit = INGEST_MAX_UPLOAD_MB * 2**20
+    received = 0
+    # File I/O goes to the default thread pool so a slow disk never stalls
+    # the event loop (and with it every other request)
+    loop = asyncio.get_running_loop()
+    try:
+        f = await loop.run_in_executor(None, open, book_file, "wb")
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=f"book larger than {INGEST_MAX_UPLOAD_MB} MB")
+                await loop.run_in_executor(None, f.write, chunk)
+        finally:
+            await loop.run_in_executor(None, f.close)
+        if not received:
+            raise HTTPException(status_code=400, detail="empty body")
+        ingestion.submit(job, policy, book_file=book_file)
+    except asyncio.QueueFull:
+        raise _busy()
+    except BaseException:
+        ingestion.discard(job["id"])
+        raise
+    return _view(job)
+
+
+@app.post("/jobs/url", status_code=202)
+async def submit_url(request: Request, body: URLJob):
+    """Queue a book to be downloaded from a Z-Library URL."""
+    ingestion = request.app.state.ingestion
+    policy = _policy(body.max_words)
+    if ingestion.full():
+        raise _busy()
+    job = ingestion.new_job(body.url, policy)
+    try:
+        ingestion.submit(job, policy, url=body.url)
+    except asyncio.QueueFull:
+        raise _busy()
+    return _view(job)
+
+
+@app.get("/jobs")
+async def list_jobs(request: Request):
+    return [_view(job) for job in request.app.state.ingestion.jobs.values()]
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    return _view(_job_or_404(request, job_id))
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """Server-sent events: the job each time its status changes, until it finishes."""
+    job = _job_or_404(request, job_id)
+    ingestion = request.app.state.ingestion
+
+    async def events():
+        last = None
+        while True:
+            view = _view(job)
+            state = (view["status"], view["error"])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(view, ensure_ascii=False)}\n\n"
+            if view["status"] in ("done", "failed") or await request.is_disconnected():
+                return
+            await ingestion.wait_changed(timeout=15)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/jobs/{job_id}/parts/{index}")
+async def get_part(request: Request, job_id: str, index: int):
+    job = _job_or_404(request, job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"job is {job['status']}")
+    paths = job["result"]["_paths"]
+    if not 1 <= index <= len(paths):
+        raise HTTPException(status_code=404, detail="no such part")
+    return FileResponse(paths[index - 1], media_type="text/markdown; charset=utf-8",
+                        filename=Path(paths[index - 1]).name)
+
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <path_to_book_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Convert EPUB/PDF to Markdown and split for NotebookLM")
+    parser.add_argument("book_file", help="path to the book file")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="processes used to convert chapters or PDF pages (0 = one per CPU)")
+    parser.add_argument("--max-words", type=int, default=ChunkPolicy.max_words,
+                        help="word budget per part")
+    parser.add_argument("--max-chars", type=int, help="character budget per part")
+    parser.add_argument("--max-tokens", type=int, help="estimated-token budget per part")
+    parser.add_argument("--balance", action="store_true",
+                        help="even out part sizes instead of filling each part to the budget")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always convert from scratch, bypassing the conversion cache and chapter memo")
+    args = parser.parse_args()
 
-    book_path = Path(sys.argv[1])
-    process_book(book_path)
+    policy = ChunkPolicy(
+        max_words=args.max_words,
+        max_chars=args.max_chars,
+        max_tokens=args.max_tokens,
+        balance=args.balance,
+    )
+    cache = None if args.no_cache else ConversionCache(chapters=ChapterStore())
+    process_book(Path(args.book_file), workers=args.workers, policy=policy, cache=cache)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The package is imported as zlibrary_to_notebooklm through the module of
+# that name at the repository root (see zlibrary_to_notebooklm.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,132 @@
+"""Batch mode: URL lists, per-host limits and the summary file."""
+import asyncio
+import io
+import json
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+from zlibrary_to_notebooklm.batch import read_urls, run_batch, write_summary
+from zlibrary_to_notebooklm.pipeline import HostLimiter
+
+
+def test_read_urls_from_a_file(tmp_path):
+    source = tmp_path / "urls.txt"
+    source.write_text(
+        "# books to fetch\n"
+        "https://z-library.test/book/1\n"
+        "\n"
+        "  https://z-library.test/book/2   # the second one\n"
+        "https://z-library.test/book/1\n"
+        "https://other.test/book/3\n",
+        encoding="utf-8",
+    )
+    assert read_urls(str(source)) == [
+        "https://z-library.test/book/1", "https://z-library.test/book/2", "https://other.test/book/3",
+    ]
+
+
+def test_read_urls_from_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("https://a.test/1\nhttps://a.test/2\n#https://a.test/3\n"))
+    assert read_urls("-") == ["https://a.test/1", "https://a.test/2"]
+
+
+def test_host_limiter_spaces_and_bounds_requests():
+    limiter = HostLimiter(concurrency=2, interval=0.05)
+    starts = {"a": [], "b": []}
+    in_use = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    async def request(host):
+        async with limiter.slot(host):
+            starts[host].append(asyncio.get_running_loop().time())
+            in_use[host] += 1
+            peak[host] = max(peak[host], in_use[host])
+            await asyncio.sleep(0.2)
+            in_use[host] -= 1
+
+    async def main():
+        await asyncio.gather(*(request(host) for host in "ab" * 4))
+
+    began = time.monotonic()
+    asyncio.run(main())
+    for host in "ab":
+        gaps = [b - a for a, b in zip(starts[host], starts[host][1:])]
+        assert min(gaps) >= 0.045
+        assert peak[host] == 2
+    # The two hosts are limited independently: 4 requests each, 2 at a time
+    assert time.monotonic() - began < 0.6
+
+
+class FakeUploader:
+    """Downloads record which host they hit and when; everything else is instant."""
+
+    pdf_split = "pdf"
+    journal = None
+
+    def __init__(self, root=None):
+        self.root = root
+        self.store = self
+        self.downloads = []
+
+    def completed_result(self, url):
+        return None
+
+    def journaled_conversion(self, url):
+        return None
+
+    def record_conversion(self, url, final_file):
+        pass
+
+    def sha256_of(self, path):
+        return None
+
+    async def fetch_book(self, url):
+        start = asyncio.get_running_loop().time()
+        await asyncio.sleep(0.05)
+        self.downloads.append((urlparse(url).netloc, start, asyncio.get_running_loop().time()))
+        if url.endswith("/missing"):
+            return None, None
+        path = self.root / f"{len(self.downloads)}.txt"
+        path.write_text(url)
+        return path, "txt"
+
+    def convert_to_txt(self, file_path, file_format=None):
+        return file_path
+
+    async def upload_to_notebooklm_async(self, file_path, title=None, url=None):
+        return {"success": True, "notebook_id": f"nb-{file_path.stem}", "title": url}
+
+
+def test_batch_limits_each_host_and_summarizes(tmp_path):
+    urls = [f"https://z-library.test/book/{i}" for i in range(4)] + \
+        [f"https://mirror.test/book/{i}" for i in range(4)] + ["https://z-library.test/missing"]
+    uploader = FakeUploader(tmp_path)
+    started = time.time()
+    results, stages = asyncio.run(run_batch(uploader, urls, concurrency=4, per_host=1, host_interval=0,
+                                            convert_workers=1))
+
+    assert [r["url"] for r in results] == urls
+    assert [r["success"] for r in results] == [True] * 8 + [False]
+    # One download at a time per host, while both hosts are downloading
+    spans = {}
+    for host in ("z-library.test", "mirror.test"):
+        spans[host] = sorted((start, end) for h, start, end in uploader.downloads if h == host)
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(spans[host], spans[host][1:]))
+    assert any(a_start < b_end and b_start < a_end
+               for a_start, a_end in spans["z-library.test"] for b_start, b_end in spans["mirror.test"])
+    assert (stages["download"]["done"], stages["download"]["failed"], stages["upload"]["done"]) == (8, 1, 8)
+
+    summary = write_summary(results, tmp_path / "summary.json", started, stages, {"operations": {}})
+    assert json.loads((tmp_path / "summary.json").read_text(encoding="utf-8")) == summary
+    assert (summary["total"], summary["succeeded"], summary["failed"]) == (9, 8, 1)
+    assert summary["stages"] == stages
+    assert summary["jobs"][8]["error"] == "下载失败"
+    assert summary["elapsed_seconds"] >= 0
+
+
+@pytest.mark.parametrize("stages, resilience", [(None, None), ({}, {})])
+def test_summary_without_stats(tmp_path, stages, resilience):
+    summary = write_summary([], tmp_path / "summary.json", time.time(), stages, resilience)
+    assert (summary["total"], summary["stages"], summary["resilience"], summary["jobs"]) == (0, {}, {}, [])
@@ -0,0 +1,217 @@
+"""The shared browser pool, on a fake Playwright."""
+import asyncio
+
+import pytest
+
+from zlibrary_to_notebooklm import browser_pool
+from zlibrary_to_notebooklm.browser_pool import BrowserPool
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+        self.visited = []
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def is_closed(self):
+        return self.closed
+
+    async def goto(self, url, **kwargs):
+        self.visited.append(url)
+
+    async def close(self):
+        self.closed = True
+
+    def crash(self):
+        self.handlers["crash"](self)
+
+
+class FakeContext:
+    def __init__(self, blank_page=False, **options):
+        self.options = options
+        self.pages = [FakePage(self)] if blank_page else []
+        self.handlers = []
+        self.closed = False
+
+    def on(self, event, handler):
+        assert event == "close"
+        self.handlers.append(handler)
+
+    async def new_page(self):
+        self.pages.append(FakePage(self))
+        return self.pages[-1]
+
+    async def close(self):
+        self.closed = True
+        for page in self.pages:
+            page.closed = True
+        for handler in self.handlers:
+            handler(self)
+
+
+class FakeBrowser:
+    def __init__(self, chromium):
+        self.chromium = chromium
+        self.closed = False
+
+    async def new_context(self, **options):
+        self.chromium.contexts.append(FakeContext(**options))
+        return self.chromium.contexts[-1]
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self):
+        self.browsers = []
+        self.contexts = []
+
+    async def launch(self, **options):
+        self.browsers.append(FakeBrowser(self))
+        return self.browsers[-1]
+
+    async def launch_persistent_context(self, **options):
+        self.contexts.append(FakeContext(blank_page=True, **options))
+        return self.contexts[-1]
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+        self.stopped = False
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    playwright = FakePlaywright()
+    monkeypatch.setattr(browser_pool, "async_playwright", lambda: playwright)
+    return playwright
+
+
+def run_jobs(pool, jobs, job=None):
+    """Run ``jobs`` jobs through the pool at once; returns the pages they got."""
+    used = []
+
+    async def default(page):
+        await asyncio.sleep(0.001)
+
+    async def one():
+        async with pool.page() as page:
+            used.append(page)
+            await (job or default)(page)
+
+    async def main():
+        async with pool:
+            await asyncio.gather(*(one() for _ in range(jobs)))
+
+    asyncio.run(main())
+    return used
+
+
+@pytest.mark.parametrize("options", [
+    {"contexts": 2},
+    {"storage_state": "state.json", "contexts": 0},
+    {"pages_per_context": 0},
+    {"max_page_uses": 0},
+])
+def test_invalid_options(tmp_path, options):
+    with pytest.raises(ValueError):
+        BrowserPool(tmp_path, **options)
+
+
+def test_persistent_profile_reuses_its_page(playwright, tmp_path):
+    pool = BrowserPool(tmp_path / "profile")
+    used = run_jobs(pool, 5)
+    # The persistent context's own blank page serves every job
+    context, = playwright.chromium.contexts
+    assert context.options["user_data_dir"] == str(tmp_path / "profile")
+    assert playwright.chromium.browsers == []
+    assert pool.pages_opened == 1 and len(context.pages) == 1
+    assert set(used) == {context.pages[0]}
+    assert context.pages[0].visited == ["about:blank"] * 5
+    # Closing the pool closes everything
+    assert context.closed and playwright.stopped
+
+
+def test_saved_session_opens_contexts_from_one_browser(playwright, tmp_path):
+    pool = BrowserPool(tmp_path, storage_state=tmp_path / "state.json", contexts=2, pages_per_context=2)
+    assert pool.size == 4
+    in_use = peak = 0
+
+    async def job(page):
+        nonlocal in_use, peak
+        in_use += 1
+        peak = max(peak, in_use)
+        await asyncio.sleep(0.01)
+        in_use -= 1
+
+    used = run_jobs(pool, 20, job)
+    assert len(used) == 20 and peak == 4
+    browser, = playwright.chromium.browsers
+    assert browser.closed
+    assert [c.options["storage_state"] for c in playwright.chromium.contexts] == [str(tmp_path / "state.json")] * 2
+    assert pool.pages_opened == 4 and len(set(used)) == 4
+
+
+def test_pages_are_replaced_after_max_uses(playwright, tmp_path):
+    pool = BrowserPool(tmp_path, max_page_uses=2)
+    used = run_jobs(pool, 5)
+    assert pool.pages_opened == 3
+    assert [used.index(page) for page in used] == [0, 0, 2, 2, 4]
+
+
+def test_failed_job_retires_its_page(playwright, tmp_path):
+    pool = BrowserPool(tmp_path)
+
+    async def main():
+        async with pool:
+            with pytest.raises(RuntimeError):
+                async with pool.page() as page:
+                    first = page
+                    raise RuntimeError("job failed")
+            assert first.closed
+            async with pool.page() as page:
+                assert page is not first
+
+    asyncio.run(main())
+    assert pool.pages_opened == 2
+
+
+def test_crashed_page_is_replaced(playwright, tmp_path):
+    pool = BrowserPool(tmp_path)
+
+    async def main():
+        async with pool:
+            async with pool.page() as page:
+                first = page
+                page.crash()
+            async with pool.page() as page:
+                assert page is not first and first.closed
+
+    asyncio.run(main())
+
+
+def test_closed_context_is_reopened(playwright, tmp_path):
+    pool = BrowserPool(tmp_path, storage_state=tmp_path / "state.json")
+
+    async def main():
+        async with pool:
+            async with pool.page() as page:
+                await page.context.close()
+            async with pool.page() as page:
+                assert not page.is_closed()
+
+    asyncio.run(main())
+    assert len(playwright.chromium.contexts) == 2
+    assert pool.pages_opened == 2
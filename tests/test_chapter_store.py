@@ -0,0 +1,140 @@
+"""The SQLite memo of converted chapters."""
+import sqlite3
+import threading
+import zipfile
+
+import pytest
+
+from zlibrary_to_notebooklm.chapter_store import ChapterStore
+from zlibrary_to_notebooklm.convert_epub import CONVERTER_VERSION, epub_to_markdown
+from benchmarks.corpus import write_epub
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChapterStore(tmp_path / "chapters.sqlite3")
+    yield store
+    store.close()
+
+
+def last_used(store, digest):
+    return store._db.execute("SELECT last_used FROM chapters WHERE digest = ?", (digest,)).fetchone()[0]
+
+
+def test_chapters_are_buffered_until_flush(store):
+    digest = ChapterStore.digest(b"<html>chapter</html>")
+    store.put(digest, "# Chapter\n\ntext", 2)
+    assert store.get(digest) is None
+    assert store.size() == (0, 0)
+    store.flush()
+    assert store.get(digest) == ("# Chapter\n\ntext", 2)
+    assert (store.hits, store.misses) == (1, 1)
+    assert store.size()[0] == 1
+
+
+def test_survives_reopening(tmp_path):
+    with ChapterStore(tmp_path / "chapters.sqlite3") as store:
+        store.put("d1", "中文 chapter", 3)
+    with ChapterStore(tmp_path / "chapters.sqlite3") as store:
+        assert store.get("d1") == ("中文 chapter", 3)
+
+
+def test_other_converter_versions_are_misses_and_pruned(store):
+    store._db.execute("INSERT INTO chapters VALUES (?, ?, ?, ?, ?)",
+                      ("d1", CONVERTER_VERSION - 1, b"stale", 1, 0.0))
+    store._db.commit()
+    assert store.get("d1") is None
+    assert store.prune() == 1
+    assert store.size() == (0, 0)
+
+
+def test_hits_refresh_last_used(store, monkeypatch):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr("zlibrary_to_notebooklm.chapter_store.time.time", lambda: next(clock))
+    store.put("old", "a", 1)
+    store.put("new", "b", 1)
+    store.flush()
+    assert (last_used(store, "old"), last_used(store, "new")) == (100, 101)
+    store.get("old")
+    store.flush()
+    assert last_used(store, "old") == 102
+
+
+def test_least_recently_used_chapters_are_pruned(store, monkeypatch):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr("zlibrary_to_notebooklm.chapter_store.time.time", lambda: next(clock))
+    for digest in ("a", "b", "c"):
+        store.put(digest, digest * 1000, 1)
+    store.flush()
+    store.get("a")
+    store.flush()
+    sizes = dict(store._db.execute("SELECT digest, LENGTH(markdown) FROM chapters"))
+    assert store.prune(sizes["a"] + sizes["c"]) == 1
+    assert store.get("b") is None
+    assert store.prune(0) == 2
+    assert store.size() == (0, 0)
+
+
+def test_size_limit_is_kept_on_flush(tmp_path):
+    with ChapterStore(tmp_path / "chapters.sqlite3", max_bytes=1) as store:
+        store.put("a", "text", 1)
+        store.flush()
+        assert store.size() == (0, 0)
+
+
+def test_concurrent_threads(store):
+    def convert(worker):
+        for i in range(50):
+            digest = f"{worker}-{i}"
+            if store.get(digest) is None:
+                store.put(digest, digest, i)
+        store.flush()
+
+    threads = [threading.Thread(target=convert, args=(w,)) for w in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.size()[0] == 400
+    assert store.get("7-49") == ("7-49", 49)
+
+
+def revise(epub, revised, chapter):
+    """Copy of epub with one chapter's text changed."""
+    with zipfile.ZipFile(epub) as src, zipfile.ZipFile(revised, 'w') as dst:
+        for info in src.infolist():
+            data = src.read(info)
+            if info.filename == f"OEBPS/chapter{chapter}.xhtml":
+                data = data.replace(b"</body>", b"<p>An erratum.</p></body>")
+            dst.writestr(info, data)
+    return revised
+
+
+def test_a_revised_book_only_converts_the_changed_chapter(store, tmp_path):
+    book = write_epub(tmp_path / "book.epub", 20_000)
+    first = epub_to_markdown(book, tmp_path / "first.md", memo=store)
+    assert (store.hits, store.misses) == (0, 4)
+
+    again = epub_to_markdown(book, tmp_path / "again.md", memo=store)
+    assert (store.hits, store.misses) == (4, 4)
+    assert (tmp_path / "again.md").read_bytes() == (tmp_path / "first.md").read_bytes()
+    assert again["words"] == first["words"]
+
+    revised = revise(book, tmp_path / "revised.epub", 3)
+    stats = epub_to_markdown(revised, tmp_path / "revised.md", memo=store)
+    assert (store.hits, store.misses) == (7, 5)
+    assert stats["words"] == first["words"] + 2
+    # Same as converting the revision without the memo
+    epub_to_markdown(revised, tmp_path / "plain.md")
+    assert (tmp_path / "revised.md").read_bytes() == (tmp_path / "plain.md").read_bytes()
+
+
+def test_shared_between_connections(tmp_path):
+    path = tmp_path / "chapters.sqlite3"
+    with ChapterStore(path) as one, ChapterStore(path) as two:
+        one.put("d1", "text", 1)
+        one.flush()
+        assert two.get("d1") == ("text", 1)
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.close()
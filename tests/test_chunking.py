@@ -0,0 +1,211 @@
+"""Invariants of the Markdown splitter, checked on seeded random books."""
+import random
+import re
+
+import pytest
+
+from zlibrary_to_notebooklm import chunking
+from zlibrary_to_notebooklm.chunking import (
+    ChunkPolicy, _balanced_limits, _pack, estimate_tokens, index_chapters, plan_parts, word_budget, write_parts,
+)
+from zlibrary_to_notebooklm import utils
+from zlibrary_to_notebooklm.utils import count_words
+
+SEEDS = range(200)
+
+_WORDS = "the river of knowledge 中 文 书 argument R&D notebook x".split()
+
+
+def random_book(rnd: random.Random) -> str:
+    """Markdown with headings of every level, blank-line paragraphs of very
+    different sizes (some far over any budget), CJK and stray whitespace."""
+    out = []
+    for _ in range(rnd.randint(0, 40)):
+        kind = rnd.random()
+        if kind < 0.2:
+            out.append("#" * rnd.randint(1, 6) + " " + " ".join(rnd.choices(_WORDS, k=rnd.randint(1, 4))) + "\n\n")
+        elif kind < 0.25:
+            out.append(rnd.choice(["\n", "\n\n\n", "  \n", "---\n\n"]))
+        else:
+            words = rnd.choice([1, 3, 10, 40, 200]) * rnd.randint(1, 3)
+            sep = rnd.choice([" ", "", "\n"])
+            out.append(sep.join(rnd.choices(_WORDS, k=words)) + rnd.choice(["\n\n", "\n", ""]))
+    return "".join(out)
+
+
+def random_policy(rnd: random.Random) -> ChunkPolicy:
+    return ChunkPolicy(
+        max_words=rnd.choice([1, 5, 20, 60, 150, 400, 5000]),
+        max_chars=rnd.choice([None, None, 50, 300, 2000]),
+        max_tokens=rnd.choice([None, None, 40, 500]),
+        heading_levels=rnd.randint(1, 6),
+        paragraph_fallback=rnd.random() < 0.8,
+        target_parts=rnd.choice([None, None, 1, 3, 7]),
+        balance=rnd.random() < 0.5,
+    )
+
+
+def over_budget(text: str, total_words: int, policy: ChunkPolicy) -> bool:
+    words, chars = count_words(text), len(text)
+    return (
+        words > word_budget(total_words, policy)
+        or (policy.max_chars is not None and chars > policy.max_chars)
+        or (policy.max_tokens is not None and estimate_tokens(words, chars) > policy.max_tokens)
+    )
+
+
+def is_single_segment(text: str, policy: ChunkPolicy) -> bool:
+    """Whether text is one chapter (no cut before a heading inside it) or,
+    with the paragraph fallback, one paragraph (no blank line before its end)."""
+    if re.search(r'\n(?=#{1,%d}\s)' % policy.heading_levels, text):
+        return False
+    return not policy.paragraph_fallback or '\n\n' not in text[:-2]
+
+
+def check_plan(text: str, policy: ChunkPolicy, tmp_path):
+    book = tmp_path / "book.md"
+    book.write_text(text, encoding='utf-8')
+    parts = plan_parts(book, policy)
+
+    # Parts tile the file, in order, and none is empty
+    assert [p.start for p in parts[:1]] == ([0] if text else [])
+    assert all(a.end == b.start for a, b in zip(parts, parts[1:]))
+    assert (parts[-1].end if parts else 0) == len(text)
+    assert all(p.end > p.start for p in parts)
+
+    # Word counts are right and add up to the whole file
+    total = count_words(text)
+    assert [p.words for p in parts] == [count_words(text[p.start:p.end]) for p in parts]
+    assert sum(p.words for p in parts) == total
+
+    # Every part is within budget unless it is a single chapter or paragraph
+    for p in parts:
+        chunk = text[p.start:p.end]
+        assert not over_budget(chunk, total, policy) or is_single_segment(chunk, policy), (p, policy)
+
+    # The written parts concatenate back to the file
+    files = write_parts(book, parts)
+    assert [f.name for f in files] == [f"book_part{i}.md" for i in range(1, len(parts) + 1)]
+    assert "".join(f.read_text(encoding='utf-8') for f in files) == text
+    for f in files:
+        f.unlink()
+    return parts
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_plan_parts_invariants(seed, tmp_path):
+    rnd = random.Random(seed)
+    check_plan(random_book(rnd), random_policy(rnd), tmp_path)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_balance_keeps_part_count_and_evens_sizes(seed, tmp_path):
+    rnd = random.Random(seed)
+    text = random_book(rnd)
+    policy = ChunkPolicy(max_words=rnd.choice([5, 20, 60, 150]), heading_levels=rnd.randint(1, 3))
+    greedy = check_plan(text, policy, tmp_path)
+    balanced = check_plan(text, ChunkPolicy(**{**policy.__dict__, 'balance': True}), tmp_path)
+    assert len(balanced) == len(greedy)
+    assert max((p.words for p in balanced), default=0) <= max((p.words for p in greedy), default=0)
+
+
+def test_plan_parts_edge_cases(tmp_path):
+    policy = ChunkPolicy(max_words=3)
+    assert check_plan("", policy, tmp_path) == []
+    assert len(check_plan("\n\n\n", policy, tmp_path)) == 1
+    # One paragraph over budget becomes a part of its own
+    parts = check_plan("a b\n\none two three four five six\n\nc d\n", policy, tmp_path)
+    assert [p.words for p in parts] == [2, 6, 2]
+    # Without the fallback an oversized chapter stays whole
+    parts = check_plan("# A\n\nx y z w\n\nv\n# B\n\nq\n", ChunkPolicy(max_words=3, paragraph_fallback=False), tmp_path)
+    assert [p.words for p in parts] == [6, 2]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_index_is_the_same_for_any_block_size(seed, tmp_path, monkeypatch):
+    rnd = random.Random(seed)
+    # A long line with no newline at all before the book
+    text = " ".join(rnd.choices(_WORDS, k=500)) + random_book(rnd) + "# Tail\n" + "x" * 300
+    path = tmp_path / "book.md"
+    path.write_text(text, encoding="utf-8")
+    whole = index_chapters(path)
+    assert whole[-1].end == len(text)
+    # Words are exact while no single word is longer than a block
+    monkeypatch.setattr(chunking, "_BLOCK_SIZE", max(len(w) for w in re.findall(r"\w+", text)) + 1)
+    assert index_chapters(path) == whole
+    # Shorter blocks cut inside words, but never move a chapter
+    monkeypatch.setattr(chunking, "_BLOCK_SIZE", 16)
+    assert [(p.start, p.end) for p in index_chapters(path)] == [(p.start, p.end) for p in whole]
+
+def test_index_of_a_file_without_newlines_reads_in_bounded_pieces(tmp_path, monkeypatch):
+    path = tmp_path / "line.md"
+    path.write_text("word 中文 " * 20_000, encoding="utf-8")
+    carried = []
+    count = chunking.count_words
+    monkeypatch.setattr(chunking, "_BLOCK_SIZE", 1000)
+    monkeypatch.setattr(chunking, "count_words", lambda text: carried.append(len(text)) or count(text))
+    assert index_chapters(path) == [chunking.Part(0, 160_000, 60_000)]
+    # Each block is counted as it comes instead of carrying the whole line
+    assert max(carried) <= 1010
+
+
+def test_utils_split_markdown_file_wraps_the_chunking_splitter(tmp_path):
+    book = tmp_path / "book.md"
+    book.write_text("# A\n\none two three\n# B\n\nfour five\n# C\n\nsix\n", encoding="utf-8")
+    files = utils.split_markdown_file(book, max_words=6)
+    assert [f.name for f in files] == ["book_part1.md", "book_part2.md"]
+    assert "".join(f.read_text(encoding="utf-8") for f in files) == book.read_text(encoding="utf-8")
+    assert [count_words(f.read_text(encoding="utf-8")) for f in files] == [4, 5]
+
+
+def min_parts(sizes, limits):
+    """Fewest contiguous parts under limits (segments over a limit alone), by dynamic programming."""
+    best = [0] + [None] * len(sizes)
+    for end in range(1, len(sizes) + 1):
+        for start in range(end - 1, -1, -1):
+            totals = [sum(s[k] for s in sizes[start:end]) for k in range(len(limits))]
+            if end - start > 1 and any(t > l for t, l in zip(totals, limits)):
+                break
+            if best[start] is not None and (best[end] is None or best[start] + 1 < best[end]):
+                best[end] = best[start] + 1
+    return best[-1]
+
+
+def random_sizes(rnd: random.Random):
+    dims = rnd.randint(1, 3)
+    limits = tuple(float(rnd.randint(5, 50)) for _ in range(dims))
+    sizes = [tuple(float(rnd.choice([0, 1, 2, 5, 10, 30, 80])) for _ in range(dims))
+             for _ in range(rnd.randint(1, 30))]
+    return sizes, limits
+
+
+def groups(sizes, starts):
+    return [sizes[a:b] for a, b in zip(starts, starts[1:] + [len(sizes)])]
+
+
+def fits(group, limits):
+    return len(group) == 1 or all(sum(s[k] for s in group) <= l for k, l in enumerate(limits))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_pack_is_minimal_and_within_limits(seed):
+    rnd = random.Random(seed)
+    sizes, limits = random_sizes(rnd)
+    starts = _pack(sizes, limits)
+    assert starts[0] == 0 and starts == sorted(set(starts))
+    assert all(fits(g, limits) for g in groups(sizes, starts))
+    assert len(starts) == min_parts(sizes, limits)
+    assert _pack(sizes, limits, len(starts)) == starts
+    assert len(starts) == 1 or _pack(sizes, limits, len(starts) - 1) is None
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_balanced_limits_keep_part_count(seed):
+    rnd = random.Random(seed)
+    sizes, limits = random_sizes(rnd)
+    parts = len(_pack(sizes, limits))
+    balanced = _balanced_limits(sizes, limits, parts)
+    assert all(b <= l for b, l in zip(balanced, limits))
+    starts = _pack(sizes, balanced)
+    assert len(starts) <= parts
+    assert all(fits(g, balanced) for g in groups(sizes, starts))
@@ -0,0 +1,155 @@
+"""The persistent EPUB -> Markdown conversion cache."""
+import os
+import shutil
+
+import pytest
+
+from zlibrary_to_notebooklm import conversion_cache
+from zlibrary_to_notebooklm.chunking import ChunkPolicy, plan_parts
+from zlibrary_to_notebooklm.conversion_cache import ConversionCache, cache_key, file_sha256
+from benchmarks.corpus import write_epub
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(tmp_path / "cache")
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """The books actually converted (cache misses)."""
+    converted = []
+    convert = conversion_cache.epub_to_markdown
+
+    def counting(epub_path, output_path, **kwargs):
+        converted.append(epub_path)
+        return convert(epub_path, output_path, **kwargs)
+
+    monkeypatch.setattr(conversion_cache, "epub_to_markdown", counting)
+    return converted
+
+
+@pytest.fixture(scope="module")
+def books(tmp_path_factory):
+    root = tmp_path_factory.mktemp("books")
+    return [write_epub(root / f"book{seed}.epub", 3000, seed=seed) for seed in range(3)]
+
+
+def test_hit_serves_the_same_markdown(cache, conversions, books, tmp_path):
+    first = cache.epub_to_markdown(books[0], tmp_path / "first.md")
+    assert (first["cached"], first["chapters"]) == (False, 1)
+    assert first["key"] == cache_key(file_sha256(books[0]))
+
+    # The same bytes under another name
+    renamed = tmp_path / "renamed.epub"
+    shutil.copyfile(books[0], renamed)
+    second = cache.epub_to_markdown(renamed, tmp_path / "second.md")
+    assert second["cached"] is True
+    assert {k: second[k] for k in ("words", "characters", "chapters", "key")} == \
+        {k: first[k] for k in ("words", "characters", "chapters", "key")}
+    assert (tmp_path / "second.md").read_bytes() == (tmp_path / "first.md").read_bytes()
+    assert conversions == [books[0]]
+
+
+def test_txt_output_name_becomes_md(cache, books, tmp_path):
+    stats = cache.epub_to_markdown(books[0], tmp_path / "book.txt")
+    assert stats["output_path"] == tmp_path / "book.md"
+    assert (tmp_path / "book.md").exists()
+
+
+def test_options_are_part_of_the_key(books):
+    digest = file_sha256(books[0])
+    assert cache_key(digest) == cache_key(digest, {})
+    assert cache_key(digest, {"a": 1, "b": 2}) == cache_key(digest, {"b": 2, "a": 1})
+    assert cache_key(digest, {"a": 1}) != cache_key(digest)
+    assert cache_key(digest) != cache_key(file_sha256(books[1]))
+
+
+def test_failed_conversion_is_not_cached(cache, tmp_path):
+    broken = tmp_path / "broken.epub"
+    broken.write_bytes(b"not a zip")
+    assert not cache.epub_to_markdown(broken, tmp_path / "broken.md")
+    assert cache.entries() == []
+
+
+def test_damaged_entries_are_misses(cache, conversions, books, tmp_path):
+    key = cache.epub_to_markdown(books[0], tmp_path / "a.md")["key"]
+    (cache._entry(key) / "meta.json").write_text("{not json")
+    assert cache.lookup(key) is None
+    assert cache.epub_to_markdown(books[0], tmp_path / "b.md")["cached"] is False
+
+    # The Markdown evicted under a live meta.json: converted again
+    key = cache.epub_to_markdown(books[1], tmp_path / "c.md")["key"]
+    (cache._entry(key) / "output.md").unlink()
+    stats = cache.epub_to_markdown(books[1], tmp_path / "d.md")
+    assert stats["cached"] is False
+    assert (tmp_path / "d.md").read_bytes() == (tmp_path / "c.md").read_bytes()
+    assert conversions == [books[0], books[0], books[1], books[1]]
+
+
+def test_split_layouts_are_stored_per_policy(cache, books, tmp_path, monkeypatch):
+    md = tmp_path / "book.md"
+    key = cache.epub_to_markdown(books[0], md)["key"]
+    planned = []
+
+    def counting(file_path, policy):
+        planned.append(policy)
+        return plan_parts(file_path, policy)
+
+    monkeypatch.setattr(conversion_cache, "plan_parts", counting)
+    small, large = ChunkPolicy(max_words=500), ChunkPolicy(max_words=2000, balance=True)
+    first = cache.plan_parts(key, md, small)
+    assert len(first) > 1
+    assert cache.plan_parts(key, md, small) == first
+    assert cache.plan_parts(key, md, large) == plan_parts(md, large)
+    assert planned == [small, large]
+    assert len(cache.lookup(key)["parts"]) == 2
+    # A fresh cache object on the same directory sees the stored layouts
+    assert ConversionCache(cache.cache_dir).plan_parts(key, md, small) == first
+    assert planned == [small, large]
+
+
+def test_plan_parts_without_an_entry(cache, books, tmp_path):
+    md = tmp_path / "book.md"
+    ConversionCache(tmp_path / "elsewhere").epub_to_markdown(books[0], md)
+    policy = ChunkPolicy(max_words=500)
+    assert cache.plan_parts("0" * 64, md, policy) == plan_parts(md, policy)
+    assert cache.entries() == []
+
+
+def test_least_recently_used_entries_are_evicted(cache, books, tmp_path):
+    keys = [cache.epub_to_markdown(book, tmp_path / f"{i}.md")["key"] for i, book in enumerate(books)]
+    for age, key in zip((300, 100, 200), keys):
+        meta_file = cache._entry(key) / "meta.json"
+        os.utime(meta_file, (meta_file.stat().st_mtime - age,) * 2)
+    assert [e["key"] for e in cache.entries()] == [keys[0], keys[2], keys[1]]
+
+    # A lookup marks the entry as used
+    cache.lookup(keys[0])
+    assert [e["key"] for e in cache.entries()] == [keys[2], keys[1], keys[0]]
+
+    sizes = {e["key"]: e["size"] for e in cache.entries()}
+    assert cache.prune(sizes[keys[1]] + sizes[keys[0]]) == 1
+    assert [e["key"] for e in cache.entries()] == [keys[1], keys[0]]
+    assert not cache._entry(keys[2]).exists()
+    assert cache.clear() == 2
+    assert cache.entries() == []
+
+
+def test_size_limit_is_kept_on_store(tmp_path, books):
+    cache = ConversionCache(tmp_path / "cache", max_bytes=1)
+    for i, book in enumerate(books):
+        cache.epub_to_markdown(book, tmp_path / f"{i}.md")
+    # Each new entry evicts the older ones (and itself: nothing fits in a byte)
+    assert cache.entries() == []
+
+
+def test_half_written_entries_are_ignored(cache, books, tmp_path):
+    key = cache.epub_to_markdown(books[0], tmp_path / "a.md")["key"]
+    partial = cache._entry(key).parent / ".tmp-crashed"
+    shutil.copytree(cache._entry(key), partial)
+    assert [e["key"] for e in cache.entries()] == [key]
+    # Storing an entry that already exists leaves it alone
+    before = (cache._entry(key) / "meta.json").read_bytes()
+    cache.store(key, {"output_path": tmp_path / "a.md", "words": 0, "characters": 0, "chapters": 0})
+    assert (cache._entry(key) / "meta.json").read_bytes() == before
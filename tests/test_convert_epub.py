@@ -0,0 +1,108 @@
+"""EPUB -> Markdown conversion: streamed output, running totals and pooled chapters."""
+import pytest
+
+from zlibrary_to_notebooklm import convert_epub
+from zlibrary_to_notebooklm.convert_epub import CHAPTER_SEPARATOR, convert_chapters, epub_to_markdown
+from zlibrary_to_notebooklm.epub_reader import EpubReader
+from zlibrary_to_notebooklm.utils import count_words
+from benchmarks.corpus import write_epub
+
+
+@pytest.fixture(scope="module")
+def book(tmp_path_factory):
+    return write_epub(tmp_path_factory.mktemp("books") / "book.epub", 23_000, script="mixed")
+
+
+def test_totals_match_the_written_file(book, tmp_path):
+    stats = epub_to_markdown(book, tmp_path / "book.md")
+    text = (tmp_path / "book.md").read_text(encoding="utf-8")
+    assert stats["output_path"] == tmp_path / "book.md"
+    assert stats["words"] == count_words(text) > 23_000
+    assert stats["characters"] == len(text)
+    # One separator after the title block, one after each chapter
+    assert stats["chapters"] == text.count(CHAPTER_SEPARATOR) - 1 == 5
+    assert text.startswith("# Benchmark mixed 23k\n\n**Author:** Benchmark Generator\n\n---\n\n")
+
+
+def test_txt_output_name_becomes_md(book, tmp_path):
+    stats = epub_to_markdown(book, tmp_path / "book.txt")
+    assert stats["output_path"] == tmp_path / "book.md"
+    assert not (tmp_path / "book.txt").exists()
+
+
+def test_chapters_are_written_as_they_are_converted(book, tmp_path, monkeypatch):
+    output = tmp_path / "book.md"
+    seen = []
+    convert = convert_epub.convert_chapters
+
+    def watching(*args):
+        for result in convert(*args):
+            # Everything before this chapter is already in the file
+            seen.append(output.stat().st_size)
+            yield result
+
+    monkeypatch.setattr(convert_epub, "convert_chapters", watching)
+    epub_to_markdown(book, output)
+    assert len(seen) == 5
+    assert seen == sorted(seen) and len(set(seen)) == 5
+
+
+def test_failed_and_tiny_chapters_are_skipped(book, tmp_path, monkeypatch):
+    calls = []
+    convert = convert_epub.chapter_to_markdown
+
+    def flaky(content, parser=None):
+        calls.append(content)
+        if len(calls) == 2:
+            raise ValueError("broken chapter")
+        if len(calls) == 4:
+            return "too short"
+        return convert(content, parser)
+
+    monkeypatch.setattr(convert_epub, "chapter_to_markdown", flaky)
+    stats = epub_to_markdown(book, tmp_path / "book.md")
+    text = (tmp_path / "book.md").read_text(encoding="utf-8")
+    assert stats["chapters"] == text.count(CHAPTER_SEPARATOR) - 1 == 3
+    assert (stats["words"], stats["characters"]) == (count_words(text), len(text))
+    assert "too short" not in text
+
+
+def test_unreadable_book(tmp_path):
+    broken = tmp_path / "broken.epub"
+    broken.write_bytes(b"not a zip")
+    assert epub_to_markdown(broken, tmp_path / "broken.md") is None
+
+
+@pytest.mark.parametrize("workers", [0, 2, 3])
+def test_pool_converts_identically(book, tmp_path, workers):
+    serial = epub_to_markdown(book, tmp_path / "serial.md")
+    pooled = epub_to_markdown(book, tmp_path / "pooled.md", workers=workers)
+    assert (tmp_path / "pooled.md").read_bytes() == (tmp_path / "serial.md").read_bytes()
+    assert {k: pooled[k] for k in ("words", "characters", "chapters")} == \
+        {k: serial[k] for k in ("words", "characters", "chapters")}
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_pool_keeps_order_and_bounds_chapters_in_flight(book, workers):
+    with EpubReader(book) as reader:
+        contents = [content for _, content in reader.documents()] * 3
+    read = []
+
+    def documents():
+        for content in contents:
+            read.append(content)
+            yield content
+
+    results = []
+    for result in convert_chapters(documents(), workers):
+        # At most 2 * workers chapters are read ahead of the one yielded
+        assert len(read) - len(results) <= max(1, 2 * workers)
+        results.append(result)
+    assert results == [convert_epub._chapter_result(content) for content in contents]
+
+
+def test_pool_reports_chapter_errors_in_place():
+    contents = [b"<html><body><p>one</p></body></html>", None, b"<html><body><p>three</p></body></html>"]
+    results = list(convert_chapters(contents, workers=2))
+    assert [r[0] for r in results] == ["one", None, "three"]
+    assert results[1][2] is not None and results[0][2] is None
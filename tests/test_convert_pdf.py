@@ -0,0 +1,117 @@
+"""Page-range extraction and PDF splitting on generated PDFs."""
+import pytest
+
+from zlibrary_to_notebooklm import convert_pdf
+from zlibrary_to_notebooklm.convert_pdf import iter_pdf_pages, page_count, split_pdf
+from zlibrary_to_notebooklm.utils import count_words
+
+pypdf = pytest.importorskip("pypdf")
+
+
+def write_pdf(path, texts: list[str], fanout: int = 3) -> None:
+    """A PDF with one line of text per page, its pages in a page tree
+    ``fanout`` wide (so several levels deep), the font and media box
+    inherited from the root."""
+    objects = {}  # number -> body
+
+    def add(body: str) -> int:
+        number = len(objects) + 1
+        objects[number] = body
+        return number
+
+    catalog = add("")
+    root = add("")
+    font = add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    def build(texts, parent):
+        """Pages node for texts; returns its object number."""
+        node = add("")
+        if len(texts) <= fanout:
+            kids = []
+            for i, text in enumerate(texts):
+                stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+                content = add(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+                kids.append(add(f"<< /Type /Page /Parent {node} 0 R /Contents {content} 0 R >>"))
+        else:
+            size = -(-len(texts) // fanout)
+            kids = [build(texts[i:i + size], node) for i in range(0, len(texts), size)]
+        refs = " ".join(f"{k} 0 R" for k in kids)
+        objects[node] = f"<< /Type /Pages /Parent {parent} 0 R /Kids [{refs}] /Count {len(texts)} >>"
+        return node
+
+    top = build(texts, root) if texts else None
+    objects[root] = (
+        f"<< /Type /Pages /Kids [{f'{top} 0 R' if top else ''}] /Count {len(texts)} "
+        f"/Resources << /Font << /F1 {font} 0 R >> >> /MediaBox [0 0 612 792] >>"
+    )
+    objects[catalog] = f"<< /Type /Catalog /Pages {root} 0 R >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number in sorted(objects):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def page_texts(n: int) -> list[str]:
+    return [f"page {i} of the book" for i in range(n)]
+
+
+@pytest.mark.parametrize("fanout", [2, 3, 100])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_iter_pdf_pages_reads_every_page_in_order(tmp_path, fanout, workers):
+    pdf = tmp_path / "book.pdf"
+    write_pdf(pdf, page_texts(23), fanout)
+    assert page_count(pdf) == 23
+    pages = list(iter_pdf_pages(pdf, workers=workers, pages_per_task=4))
+    assert pages == [(text, count_words(text)) for text in page_texts(23)]
+
+
+@pytest.mark.parametrize("start, end", [(0, 1), (0, 23), (5, 9), (8, 17), (22, 23)])
+def test_page_range_walks_only_to_the_wanted_pages(tmp_path, start, end):
+    pdf = tmp_path / "book.pdf"
+    write_pdf(pdf, page_texts(23), fanout=3)
+    with open(pdf, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        pages = convert_pdf._page_range(reader, start, end)
+        assert [p.extract_text() for p in pages] == page_texts(23)[start:end]
+        # Inherited attributes are applied to each page
+        assert all(p.mediabox.width == 612 and "/Font" in p["/Resources"] for p in pages)
+        # Only the path to the wanted pages was loaded, not the whole tree
+        assert getattr(reader, "flattened_pages", None) is None
+
+
+def test_page_range_falls_back_on_a_broken_tree(tmp_path):
+    pdf = tmp_path / "book.pdf"
+    write_pdf(pdf, page_texts(7), fanout=2)
+    data = pdf.read_bytes().replace(b"/Count 7 /Resources", b"/Count 9 /Resources")
+    pdf.write_bytes(data.replace(b"/Count 4 >>", b"/Count 1 >>", 1))
+    with open(pdf, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        pages = convert_pdf._page_range(reader, 2, 6)
+        assert [p.extract_text() for p in pages] == page_texts(7)[2:6]
+        assert reader.flattened_pages is not None
+
+
+def test_empty_pdf(tmp_path):
+    pdf = tmp_path / "empty.pdf"
+    write_pdf(pdf, [])
+    assert list(iter_pdf_pages(pdf)) == []
+
+
+def test_split_pdf_by_words(tmp_path, monkeypatch):
+    pdf = tmp_path / "book.pdf"
+    write_pdf(pdf, page_texts(10), fanout=3)
+    parts = split_pdf(pdf, max_words=6000, max_bytes=None)
+    assert parts == [pdf]
+    # 4 words a page: two pages fit a budget of 8
+    monkeypatch.setattr(convert_pdf, "MAX_WORDS_PER_PAGE", 4)
+    parts = split_pdf(pdf, max_words=8, max_bytes=None)
+    assert [p.name for p in parts] == [f"book_part{i}.pdf" for i in range(1, 6)]
+    texts = [[t for t, _ in iter_pdf_pages(p)] for p in parts]
+    assert texts == [page_texts(10)[i:i + 2] for i in range(0, 10, 2)]
@@ -0,0 +1,167 @@
+"""The content-addressed download store."""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from zlibrary_to_notebooklm.download_store import DownloadStore, _safe_name
+from zlibrary_to_notebooklm.upload import ZLibraryAutoUploader
+from zlibrary_to_notebooklm.upload_backends import FakeUploadBackend
+from benchmarks.corpus import write_markdown
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DownloadStore(tmp_path / "downloads")
+
+
+def stream(store, data: bytes, name: str, chunk: int = 7) -> dict:
+    incoming = store.incoming()
+    for i in range(0, len(data), chunk):
+        incoming.write(data[i:i + chunk])
+    return store.commit(incoming, name)
+
+
+def temp_files(store):
+    return list((store.root / "tmp").iterdir())
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Book.epub", "Book.epub"),
+    ("../../etc/Book.epub", "Book.epub"),
+    ("C:\\books\\Book.pdf", "Book.pdf"),
+    ("Bo\0ok.pdf", "Book.pdf"),
+    ("", "0123456789abcdef"),
+    ("..", "0123456789abcdef"),
+    ("work", "0123456789abcdef"),
+    ("dir/work", "0123456789abcdef"),
+])
+def test_safe_name(name, expected):
+    assert _safe_name(name, "0123456789abcdef" * 4) == expected
+
+
+def test_streamed_download_is_stored_by_hash(store):
+    data = b"an epub" * 100
+    entry = stream(store, data, "Book.epub")
+    digest = sha(data)
+    assert entry == {"path": store.root / digest[:2] / digest / "Book.epub", "sha256": digest,
+                     "size": len(data), "duplicate": False}
+    assert entry["path"].read_bytes() == data
+    assert store.find(digest) == entry["path"]
+    assert store.sha256_of(entry["path"]) == digest
+    assert temp_files(store) == []
+
+
+def test_same_bytes_are_stored_once(store):
+    first = stream(store, b"same book", "First Name.epub")
+    second = stream(store, b"same book", "Second Name.epub")
+    assert (second["path"], second["duplicate"]) == (first["path"], True)
+    assert temp_files(store) == []
+
+
+def test_same_name_different_books(store):
+    first = stream(store, b"one book", "Book.epub")
+    second = stream(store, b"another book", "Book.epub")
+    assert first["path"] != second["path"]
+    assert first["path"].read_bytes() == b"one book"
+    assert second["path"].read_bytes() == b"another book"
+
+
+def test_discarded_download_leaves_nothing(store):
+    incoming = store.incoming()
+    incoming.write(b"half a bo")
+    store.discard(incoming)
+    assert temp_files(store) == []
+    assert [p.name for p in store.root.iterdir()] == ["tmp"]
+
+
+def test_add_a_finished_file(store, tmp_path):
+    path = store.temp_path()
+    path.write_bytes(b"browser download")
+    entry = store.add(path, "Book.pdf")
+    assert entry["path"].name == "Book.pdf"
+    assert (entry["sha256"], entry["size"]) == (sha(b"browser download"), 16)
+    assert not path.exists()
+
+    again = tmp_path / "again.pdf"
+    again.write_bytes(b"browser download")
+    assert store.add(again)["duplicate"] is True
+    assert not again.exists()
+
+
+def test_files_outside_the_store_have_no_hash(store, tmp_path):
+    entry = stream(store, b"a book", "Book.epub")
+    outside = tmp_path / "Book.epub"
+    outside.write_bytes(b"a book")
+    assert store.sha256_of(outside) is None
+    assert store.work_dir(outside) is None
+    assert store.staging_dir(outside) is None
+    # Not the book itself, but a file in its work directory
+    assert store.sha256_of(store.work_dir(entry["path"]) / "Book.md") is None
+    assert store.find("f" * 64) is None
+
+
+def test_work_dir_is_per_book(store):
+    one = stream(store, b"one book", "Book.epub")["path"]
+    two = stream(store, b"another book", "Book.epub")["path"]
+    assert store.work_dir(one) == one.parent / "work"
+    assert store.work_dir(one) != store.work_dir(two)
+    # The work directory is not mistaken for a stored book
+    assert store.find(store.sha256_of(one)) == one
+
+
+def test_staged_files_are_published_into_the_work_dir(store):
+    book = stream(store, b"a book", "Book.epub")["path"]
+    work = store.work_dir(book)
+    (work / "Book_part1.md").write_text("old")
+    first, second = store.staging_dir(book), store.staging_dir(book)
+    assert first != second and first.parent == work == second.parent
+
+    parts = [first / "Book_part1.md", first / "Book_part2.md"]
+    for i, part in enumerate(parts, 1):
+        part.write_text(f"part {i}")
+    published = store.publish(first, parts)
+    assert published == [work / "Book_part1.md", work / "Book_part2.md"]
+    assert [p.read_text() for p in published] == ["part 1", "part 2"]
+    assert not first.exists()
+    # Paths outside the staging directory are returned as they are
+    assert store.publish(second, book) == book
+    assert sorted(p.name for p in work.iterdir()) == ["Book_part1.md", "Book_part2.md"]
+
+    third = store.staging_dir(book)
+    (third / "Book.md").write_text("half")
+    store.discard_staging(third)
+    assert sorted(p.name for p in work.iterdir()) == ["Book_part1.md", "Book_part2.md"]
+
+
+def convert_in_process(home: str, book: str, rounds: int) -> list[list[tuple[str, str]]]:
+    """Convert a stored book ``rounds`` times, hashing the parts as soon as
+    each conversion returns."""
+    os.environ["HOME"] = home
+    uploader = ZLibraryAutoUploader(upload_backend=FakeUploadBackend(latency=0), direct_download=False)
+    results = []
+    for _ in range(rounds):
+        parts = uploader.convert_to_txt(Path(book))
+        results.append([(p.name, sha(p.read_bytes())) for p in parts])
+    return results
+
+
+def test_processes_converting_the_same_book_do_not_clobber_each_other(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    source = write_markdown(tmp_path / "Big Book.md", 400_000)
+    book = DownloadStore(tmp_path / ".zlibrary" / "downloads").add(source)["path"]
+    expected = convert_in_process(str(tmp_path), str(book), 1)[0]
+    assert [name for name, _ in expected] == ["Big Book_part1.md", "Big Book_part2.md"]
+
+    with ProcessPoolExecutor(4) as pool:
+        runs = list(pool.map(convert_in_process, [str(tmp_path)] * 4, [str(book)] * 4, [4] * 4))
+    assert all(result == expected for run in runs for result in run)
+    # No staging directories are left behind
+    work = book.parent / "work"
+    assert sorted(p.name for p in work.iterdir()) == ["Big Book.md", "Big Book_part1.md", "Big Book_part2.md"]
@@ -0,0 +1,145 @@
+"""The minimal EPUB reader, on hand-built archives."""
+import zipfile
+
+import pytest
+
+from zlibrary_to_notebooklm.epub_reader import EpubError, EpubReader
+
+CONTAINER = (
+    '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+    '<rootfiles><rootfile full-path="{opf}" media-type="application/oebps-package+xml"/></rootfiles></container>'
+)
+XHTML = "application/xhtml+xml"
+
+
+def opf(items, spine=None, metadata='<dc:title>A Book</dc:title><dc:creator>An Author</dc:creator>',
+        namespaces=True):
+    """An OPF with manifest ``items`` [(id, href, media type)] and spine ``spine`` (ids)."""
+    manifest = "".join(f'<item id="{i}" href="{href}" media-type="{kind}"/>' for i, href, kind in items)
+    spine = "" if spine is None else "<spine>" + "".join(f'<itemref idref="{i}"/>' for i in spine) + "</spine>"
+    if not namespaces:
+        return f"<package><metadata>{metadata}</metadata><manifest>{manifest}</manifest>{spine}</package>"
+    return (
+        '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+        f'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">{metadata}</metadata>'
+        f'<manifest>{manifest}</manifest>{spine}</package>'
+    )
+
+
+def make_epub(path, files: dict, opf_path="OEBPS/content.opf", container=True):
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('mimetype', 'application/epub+zip')
+        if container:
+            z.writestr('META-INF/container.xml', CONTAINER.format(opf=opf_path))
+        for name, content in files.items():
+            z.writestr(name, content)
+    return path
+
+
+def chapter(n):
+    return f"<html><body><p>chapter {n}</p></body></html>".encode()
+
+
+def test_spine_order_and_metadata(tmp_path):
+    book = make_epub(tmp_path / "book.epub", {
+        "OEBPS/content.opf": opf(
+            [("c1", "one.xhtml", XHTML), ("c2", "two.xhtml", XHTML), ("c3", "text/three.html", "text/html"),
+             ("img", "cover.jpg", "image/jpeg"), ("css", "style.css", "text/css")],
+            spine=["c3", "img", "c1", "c2", "c1", "unknown"],
+        ),
+        "OEBPS/one.xhtml": chapter(1), "OEBPS/two.xhtml": chapter(2), "OEBPS/text/three.html": chapter(3),
+        "OEBPS/cover.jpg": b"\xff\xd8", "OEBPS/style.css": b"p {}",
+    })
+    with EpubReader(book) as reader:
+        assert (reader.title, reader.author) == ("A Book", "An Author")
+        assert reader.metadata == {"title": ["A Book"], "creator": ["An Author"]}
+        assert reader.opf_path == "OEBPS/content.opf"
+        # Documents only, each once, in spine order
+        assert reader.spine == ["OEBPS/text/three.html", "OEBPS/one.xhtml", "OEBPS/two.xhtml"]
+        assert list(reader.documents()) == [
+            ("OEBPS/text/three.html", chapter(3)), ("OEBPS/one.xhtml", chapter(1)), ("OEBPS/two.xhtml", chapter(2)),
+        ]
+        assert reader.missing == []
+
+
+def test_documents_are_read_lazily(tmp_path):
+    book = make_epub(tmp_path / "book.epub", {
+        "OEBPS/content.opf": opf([("c1", "one.xhtml", XHTML), ("c2", "two.xhtml", XHTML),
+                                  ("img", "big.png", "image/png")], spine=["c1", "c2"]),
+        "OEBPS/one.xhtml": chapter(1), "OEBPS/two.xhtml": chapter(2), "OEBPS/big.png": b"\0" * 100_000,
+    })
+    with EpubReader(book) as reader:
+        read = []
+        original = reader._zip.read
+        reader._zip.read = lambda name: read.append(name) or original(name)
+        documents = reader.documents()
+        assert read == []
+        next(documents)
+        assert read == ["OEBPS/one.xhtml"]
+        list(documents)
+        assert read == ["OEBPS/one.xhtml", "OEBPS/two.xhtml"]
+
+
+def test_hrefs_are_resolved_against_the_opf(tmp_path):
+    book = make_epub(tmp_path / "book.epub", {
+        "book/package.opf": opf(
+            [("a", "../shared/A%20Chapter.xhtml", XHTML), ("b", "Text/B.XHTML#start", XHTML),
+             ("c", "./Text/c.xhtml", XHTML), ("gone", "Text/missing.xhtml", XHTML)],
+            spine=["a", "b", "c", "gone"],
+        ),
+        "shared/A Chapter.xhtml": chapter(1), "book/Text/b.xhtml": chapter(2), "book/Text/c.xhtml": chapter(3),
+    }, opf_path="book/package.opf")
+    with EpubReader(book) as reader:
+        # Percent escapes, fragments, ./ and ../, and names differing only in case
+        assert reader.spine == ["shared/A Chapter.xhtml", "book/Text/b.xhtml", "book/Text/c.xhtml"]
+        assert reader.missing == ["Text/missing.xhtml"]
+
+
+def test_without_a_spine_the_manifest_order_is_used(tmp_path):
+    book = make_epub(tmp_path / "book.epub", {
+        "OEBPS/content.opf": opf([("c2", "two.xhtml", XHTML), ("c1", "one.xhtml", XHTML)]),
+        "OEBPS/one.xhtml": chapter(1), "OEBPS/two.xhtml": chapter(2),
+    })
+    with EpubReader(book) as reader:
+        assert reader.spine == ["OEBPS/two.xhtml", "OEBPS/one.xhtml"]
+
+
+def test_without_a_container_the_first_opf_is_used(tmp_path):
+    book = make_epub(tmp_path / "book.epub", {
+        "b.opf": opf([("c1", "one.xhtml", XHTML)], spine=["c1"], metadata="<title>Second</title>",
+                     namespaces=False),
+        "a.opf": opf([("c1", "one.xhtml", XHTML)], spine=["c1"], metadata="<title>First</title>",
+                     namespaces=False),
+        "one.xhtml": chapter(1),
+    }, container=False)
+    with EpubReader(book) as reader:
+        assert reader.opf_path == "a.opf"
+        # No namespaces, no creator
+        assert (reader.title, reader.author) == ("First", "Unknown Author")
+        assert reader.spine == ["one.xhtml"]
+
+
+@pytest.mark.parametrize("files, container, message", [
+    ({"one.xhtml": b""}, False, "no OPF package file"),
+    ({"OEBPS/content.opf": "<package><manifest>"}, True, "OEBPS/content.opf"),
+    ({"OEBPS/content.opf": "<package><spine/></package>"}, True, "no manifest"),
+    ({}, True, "OEBPS/content.opf"),
+])
+def test_unreadable_epubs(tmp_path, files, container, message):
+    book = make_epub(tmp_path / "book.epub", files, container=container)
+    with pytest.raises(EpubError, match=message):
+        EpubReader(book)
+
+
+def test_not_a_zip(tmp_path):
+    book = tmp_path / "book.epub"
+    book.write_bytes(b"not a zip")
+    with pytest.raises(zipfile.BadZipFile):
+        EpubReader(book)
+
+
+def test_close(tmp_path):
+    book = make_epub(tmp_path / "book.epub", {"OEBPS/content.opf": opf([])})
+    with EpubReader(book) as reader:
+        assert reader.spine == []
+    assert reader._zip.fp is None
@@ -0,0 +1,180 @@
+"""The lxml backend must give byte-identical Markdown to html.parser."""
+import random
+import zipfile
+
+import pytest
+
+from zlibrary_to_notebooklm.convert_epub import MarkdownBuilder, chapter_to_markdown, epub_to_markdown
+from zlibrary_to_notebooklm.epub_reader import EpubReader
+from zlibrary_to_notebooklm.html_parsers import BACKENDS, parse_html_parser, parse_lxml
+
+pytestmark = pytest.mark.skipif('lxml' not in BACKENDS, reason="lxml is not installed")
+
+
+def xhtml(body: str, head: str = "<title>t</title>") -> bytes:
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml">\n'
+        f"<head>{head}</head>\n<body>\n{body}\n</body>\n</html>\n"
+    ).encode('utf-8')
+
+
+# Well-formed XHTML the lxml backend converts itself.
+PLAIN = {
+    'headings': xhtml("<h1>Title</h1>\n<h2>Sub <em>title</em></h2>\n<h3>Three</h3><h4>Four</h4>"),
+    'inline': xhtml(
+        "<p>Some <b>bold</b>, <strong>strong</strong>, <i>italic</i>, <em>em</em> and "
+        "<code>code</code> with <a href=\"ch2.xhtml#x\">a <b>nested</b> link</a>.</p>"
+        "<p><span><i><b>deep</b></i></span> inline<br/>break <img src=\"a.png\" alt=\"x\"/> after</p>"
+    ),
+    'entities': xhtml(
+        "<p>Fish &amp; chips &lt;tag&gt; &quot;quoted&quot; &apos;apos&apos;</p>"
+        "<p>Numeric: &#169; &#x2014; &#8364; &#x4E2D;&#25991; &#127;</p>"
+    ),
+    'nested lists': xhtml(
+        "<ul><li>one</li><li>two<ul><li>two.a</li><li>two.b<ol><li>deep</li></ol></li></ul></li>"
+        "<li><p>para in item</p> tail</li></ul>\n"
+        "<ol>\n  <li>first</li>\n  <li><b>second</b> <a href=\"#n\">link</a></li>\n</ol>"
+    ),
+    'whitespace': xhtml(
+        "<div>\n\n   <p>  spaced    out\n text  </p>\n\t\n<p>\n</p>   </div>"
+        "<pre>  keep\n    this   </pre>\n<p> </p>"
+    ),
+    'skipped': xhtml(
+        "<!-- a comment --><p>before<!-- inline comment -->after</p>"
+        "<script>var x = 1 &lt; 2;</script><style>p { color: red }</style>"
+        "<nav><p>nav text</p></nav><p>end</p>"
+    ),
+    'cjk': xhtml("<h1>第一章</h1><p>中文 text 混排，<em>强调</em>。</p><ul><li>列表</li></ul>"),
+    'no text': xhtml(""),
+}
+
+# Markup html.parser and an XML parser read differently: the lxml backend
+# must hand these to html.parser (_NOT_PLAIN_XHTML).
+FALLBACK = {
+    'carriage return': xhtml("<p>line one\r\nline two</p>\r\n<p>three</p>"),
+    'cdata': xhtml("<p>before <![CDATA[raw <b>text</b>]]> after</p>"),
+    'named entity': xhtml("<p>non&nbsp;breaking &mdash; dash &eacute;t&eacute;</p>"),
+    'bare ampersand': xhtml("<p>AT&T and R & D</p>"),
+    'cp1252 reference': xhtml("<p>smart &#147;quotes&#148; and &#150; dash &#x80;</p>"),
+    'prefixed tag': xhtml(
+        "<p>figure:</p><svg:svg xmlns:svg=\"http://www.w3.org/2000/svg\">"
+        "<svg:title>Diagram</svg:title></svg:svg><p>after</p>"
+    ),
+}
+
+
+def html_parser_markdown(content: bytes) -> str:
+    return parse_html_parser(content, MarkdownBuilder())
+
+
+@pytest.mark.parametrize('name', PLAIN)
+def test_lxml_matches_html_parser(name):
+    content = PLAIN[name]
+    markdown = parse_lxml(content, MarkdownBuilder())
+    assert markdown is not None, "lxml backend fell back on plain XHTML"
+    assert markdown.encode('utf-8') == html_parser_markdown(content).encode('utf-8')
+
+
+@pytest.mark.parametrize('name', FALLBACK)
+def test_lxml_falls_back_on_non_plain_xhtml(name):
+    content = FALLBACK[name]
+    assert parse_lxml(content, MarkdownBuilder()) is None
+    assert chapter_to_markdown(content, 'lxml') == html_parser_markdown(content)
+
+
+@pytest.mark.parametrize('body', [
+    "<p>unclosed <b>bold</p>",         # malformed: XMLSyntaxError
+    "<p>text<br>more</p>",            # HTML void tag without /
+    "<p>x</p></body><body><p>y</p>",  # second body
+])
+def test_lxml_falls_back_on_malformed_markup(body):
+    content = xhtml(body)
+    assert chapter_to_markdown(content, 'lxml') == html_parser_markdown(content)
+
+
+def _random_body(rnd: random.Random, depth: int = 0) -> str:
+    words = ["alpha", "beta", "gamma", "&amp;", "&lt;x&gt;", "中文", "&#233;", " ", "\n", "  "]
+
+    def text():
+        return " ".join(rnd.choice(words) for _ in range(rnd.randint(0, 4)))
+
+    out = []
+    for _ in range(rnd.randint(1, 4)):
+        kind = rnd.random()
+        if depth < 4 and kind < 0.25:
+            tag = rnd.choice(["div", "section", "span", "blockquote"])
+            out.append(f"<{tag}>{text()}{_random_body(rnd, depth + 1)}</{tag}>")
+        elif depth < 4 and kind < 0.45:
+            tag = rnd.choice(["ul", "ol"])
+            items = "".join(
+                f"<li>{text()}{_random_body(rnd, depth + 1) if rnd.random() < 0.4 else ''}</li>"
+                for _ in range(rnd.randint(1, 3))
+            )
+            out.append(f"<{tag}>{items}</{tag}>")
+        elif kind < 0.7:
+            tag = rnd.choice(["b", "i", "em", "strong", "code"])
+            out.append(f"<p>{text()}<{tag}>{text()}</{tag}>{text()}</p>")
+        elif kind < 0.8:
+            level = rnd.randint(1, 6)
+            out.append(f"<h{level}>{text()}<i>{text()}</i></h{level}>")
+        elif kind < 0.9:
+            out.append(f'<a href="#{rnd.randint(0, 9)}">{text()}</a>{text()}')
+        else:
+            out.append(f"{text()}<br/>{text()}")
+    return "".join(out)
+
+
+def test_lxml_matches_html_parser_on_random_markup():
+    rnd = random.Random(1234)
+    converted = 0
+    for _ in range(300):
+        content = xhtml(_random_body(rnd))
+        markdown = parse_lxml(content, MarkdownBuilder())
+        expected = html_parser_markdown(content)
+        if markdown is not None:
+            converted += 1
+            assert markdown.encode('utf-8') == expected.encode('utf-8'), content
+    assert converted == 300
+
+
+def write_fixture_epub(path, chapters: dict[str, bytes]):
+    manifest = "".join(
+        f'<item id="c{i}" href="{i}.xhtml" media-type="application/xhtml+xml"/>' for i in range(len(chapters))
+    )
+    spine = "".join(f'<itemref idref="c{i}"/>' for i in range(len(chapters)))
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('mimetype', 'application/epub+zip')
+        z.writestr('META-INF/container.xml', (
+            '<?xml version="1.0"?>'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            '</rootfiles></container>'
+        ))
+        for i, content in enumerate(chapters.values()):
+            z.writestr(f'OEBPS/{i}.xhtml', content)
+        z.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            '<dc:identifier id="id">fixture</dc:identifier><dc:title>Fixture</dc:title>'
+            '<dc:creator>Tests</dc:creator></metadata>'
+            f'<manifest>{manifest}</manifest><spine>{spine}</spine></package>'
+        ))
+    return path
+
+
+def test_epub_converts_identically_with_both_parsers(tmp_path, capsys):
+    epub = write_fixture_epub(tmp_path / 'fixture.epub', {**PLAIN, **FALLBACK})
+
+    with EpubReader(epub) as book:
+        for name, content in book.documents():
+            assert chapter_to_markdown(content, 'lxml') == chapter_to_markdown(content, 'html.parser'), name
+
+    outputs = {}
+    for parser in ('lxml', 'html.parser'):
+        output = tmp_path / f'{parser}.md'
+        assert epub_to_markdown(epub, output, parser=parser) is not None
+        outputs[parser] = output.read_bytes()
+    assert outputs['lxml'] == outputs['html.parser']
+    assert "HTML parser: lxml → html.parser" in capsys.readouterr().out
@@ -0,0 +1,191 @@
+"""Direct HTTP downloads against a local http.server."""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from zlibrary_to_notebooklm.download_store import DownloadStore
+from zlibrary_to_notebooklm.http_download import HTTPDownloader, HTTPDownloadError, TransientHTTPError
+from zlibrary_to_notebooklm.resilience import Resilience, RetryPolicy
+from zlibrary_to_notebooklm.upload import ZLibraryAutoUploader
+from zlibrary_to_notebooklm.upload_backends import FakeUploadBackend
+
+BOOK = b"PK\x03\x04 an epub, more or less " * 1000
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers), self.client_address[1]))
+        status, headers, body = self.server.routes[self.path]
+        self.send_response(status)
+        headers = {"Content-Length": str(len(body)), **headers}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        if headers["Content-Length"] != str(len(body)):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """A local server answering ``server.routes[path] = (status, headers, body)``;
+    ``server.url`` is its base URL, ``server.requests`` what it was sent."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.routes = {}
+    httpd.requests = []
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def storage_state(tmp_path):
+    path = tmp_path / "storage_state.json"
+    path.write_text(json.dumps({"cookies": [
+        {"name": "remix_userid", "value": "42", "domain": "127.0.0.1", "path": "/", "expires": -1},
+        {"name": "other", "value": "x", "domain": "example.org", "path": "/", "expires": -1},
+    ]}))
+    return path
+
+
+@pytest.fixture
+def http(storage_state):
+    downloader = HTTPDownloader(storage_state, timeout=10)
+    yield downloader
+    downloader.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DownloadStore(tmp_path / "downloads")
+
+
+def leftover_temp_files(store):
+    tmp = store.root / "tmp"
+    return list(tmp.iterdir()) if tmp.exists() else []
+
+
+def page(*links, convert=False):
+    anchors = "".join(f'<a href="{href}">get</a>' for href in links)
+    if convert:
+        anchors += '<a data-convert_to="pdf" href="#">convert</a>'
+    return 200, {"Content-Type": "text/html; charset=utf-8"}, f"<html><body>{anchors}</body></html>".encode()
+
+
+def test_download_link_prefers_pdf(server, http):
+    server.routes["/book/1"] = page("/dl/1/epub", "/dl/1/pdf", "/other")
+    server.routes["/book/2"] = page("/dl/2/mobi")
+    server.routes["/book/3"] = page("/dl/3/epub", convert=True)
+    server.routes["/book/4"] = page("/about")
+    found = [asyncio.run(http.find_download_link(f"{server.url}/book/{i}")) for i in (1, 2, 3, 4)]
+    assert found == [f"{server.url}/dl/1/pdf", f"{server.url}/dl/2/mobi", None, None]
+    # Only the cookie for this host is sent, on every request
+    assert all(headers["Cookie"] == "remix_userid=42" for _, headers, _ in server.requests)
+
+
+def test_download_named_by_content_disposition(server, http, store):
+    server.routes["/dl/1"] = (200, {"Content-Type": "application/epub+zip",
+                                    "Content-Disposition": 'attachment; filename="A Book.epub"'}, BOOK)
+    entry = asyncio.run(http.download(f"{server.url}/dl/1", store, referer=f"{server.url}/book/1"))
+    assert entry["path"].name == "A Book.epub"
+    assert entry["path"].read_bytes() == BOOK
+    assert (entry["size"], entry["duplicate"]) == (len(BOOK), False)
+    assert server.requests[0][1]["Referer"] == f"{server.url}/book/1"
+    assert leftover_temp_files(store) == []
+
+    # The same bytes again: the stored copy is reused, over the same connection
+    again = asyncio.run(http.download(f"{server.url}/dl/1", store))
+    assert (again["path"], again["duplicate"]) == (entry["path"], True)
+    assert server.requests[0][2] == server.requests[1][2]
+
+
+def test_redirect_is_followed(server, http, store):
+    server.routes["/dl/1"] = (302, {"Location": "/files/Some%20Book.pdf"}, b"")
+    server.routes["/files/Some%20Book.pdf"] = (200, {"Content-Type": "application/pdf"}, BOOK)
+    entry = asyncio.run(http.download(f"{server.url}/dl/1", store))
+    # Named after the final URL, and the redirect is the referer
+    assert entry["path"].name == "Some Book.pdf"
+    assert entry["path"].read_bytes() == BOOK
+    assert [path for path, _, _ in server.requests] == ["/dl/1", "/files/Some%20Book.pdf"]
+    assert server.requests[1][1]["Referer"] == f"{server.url}/dl/1"
+
+
+def test_redirect_loop_is_refused(server, http, store):
+    server.routes["/dl/1"] = (302, {"Location": "/dl/1"}, b"")
+    with pytest.raises(HTTPDownloadError, match="重定向次数过多"):
+        asyncio.run(http.download(f"{server.url}/dl/1", store))
+
+
+def test_truncated_body_is_discarded(server, http, store):
+    server.routes["/dl/1"] = (200, {"Content-Type": "application/pdf",
+                                    "Content-Length": str(len(BOOK) + 100)}, BOOK)
+    # The server promises more bytes than it sends, then hangs up
+    with pytest.raises(TransientHTTPError, match=f"下载不完整: {len(BOOK)}/{len(BOOK) + 100}"):
+        asyncio.run(http.download(f"{server.url}/dl/1", store))
+    assert leftover_temp_files(store) == []
+    # Nothing reached the store itself
+    assert [p.name for p in store.root.iterdir()] == ["tmp"]
+
+
+@pytest.mark.parametrize("status, error", [(404, HTTPDownloadError), (403, HTTPDownloadError),
+                                           (429, TransientHTTPError), (503, TransientHTTPError)])
+def test_error_status(server, http, store, status, error):
+    server.routes["/dl/1"] = (status, {"Content-Type": "text/plain"}, b"nope")
+    with pytest.raises(error, match=f"HTTP {status}") as raised:
+        asyncio.run(http.download(f"{server.url}/dl/1", store))
+    assert (raised.type is TransientHTTPError) == (error is TransientHTTPError)
+    assert leftover_temp_files(store) == []
+
+
+def test_login_page_instead_of_file(server, http, store):
+    server.routes["/dl/1"] = page()
+    with pytest.raises(HTTPDownloadError, match="网页"):
+        asyncio.run(http.download(f"{server.url}/dl/1", store))
+
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch, storage_state):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    resilience = Resilience(
+        policies={name: RetryPolicy(attempts=2, base_delay=0) for name in ("navigate", "download")},
+        breaker_threshold=10, seed=0,
+    )
+    uploader = ZLibraryAutoUploader(upload_backend=FakeUploadBackend(latency=0, resilience=resilience))
+    uploader.http = HTTPDownloader(storage_state, timeout=10)
+    yield uploader
+    uploader.http.close()
+
+
+def test_direct_download_through_the_uploader(server, uploader):
+    server.routes["/book/1"] = page("/dl/1/epub")
+    server.routes["/dl/1/epub"] = (200, {"Content-Type": "application/epub+zip",
+                                         "Content-Disposition": 'attachment; filename="A Book.epub"'}, BOOK)
+    path, fmt = asyncio.run(uploader._download_direct(f"{server.url}/book/1"))
+    assert (path.name, fmt) == ("A Book.epub", "epub")
+    assert uploader.store.sha256_of(path) is not None
+
+
+@pytest.mark.parametrize("status, attempts", [(404, 1), (503, 2)])
+def test_failed_direct_download_falls_back_to_the_browser(server, uploader, status, attempts):
+    server.routes["/book/1"] = page("/dl/1/epub")
+    server.routes["/dl/1/epub"] = (status, {"Content-Type": "text/plain"}, b"nope")
+    assert asyncio.run(uploader._download_direct(f"{server.url}/book/1")) == (None, None)
+    # Transient errors were retried, permanent ones were not
+    assert [path for path, _, _ in server.requests] == ["/book/1"] + ["/dl/1/epub"] * attempts
+
+
+def test_page_without_direct_link_falls_back_to_the_browser(server, uploader):
+    server.routes["/book/1"] = page("/dl/1/epub", convert=True)
+    assert asyncio.run(uploader._download_direct(f"{server.url}/book/1")) == (None, None)
+    assert [path for path, _, _ in server.requests] == ["/book/1"]
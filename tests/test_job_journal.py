@@ -0,0 +1,177 @@
+"""The resumable job journal, and an interrupted upload picking up where it stopped."""
+import asyncio
+import threading
+
+import pytest
+
+from zlibrary_to_notebooklm.job_journal import JobJournal
+from zlibrary_to_notebooklm.resilience import Resilience, RetryPolicy
+from zlibrary_to_notebooklm.upload import ZLibraryAutoUploader
+from zlibrary_to_notebooklm.upload_backends import FakeUploadBackend, NotebookLMError
+
+URL = "https://z-library.test/book/1"
+SHA = "a" * 64
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    yield journal
+    journal.close()
+
+
+def finished(journal, url=URL, sha256=SHA, parts=("p1.md", "p2.md")):
+    journal.record_download(url, f"/books/{url[-1]}.epub", sha256, "epub")
+    journal.record_conversion(url, list(parts))
+    journal.record_notebook(url, "nb-1", "Book")
+    for i in range(1, len(parts) + 1):
+        journal.record_source(url, i, f"src-{i}")
+    journal.mark_completed(url)
+
+
+def test_unknown_url(journal):
+    assert journal.get(URL) is None
+    assert journal.forget(URL) is False
+    assert journal.jobs() == []
+
+
+def test_records_each_step(journal):
+    journal.record_download(URL, "/books/1.epub", SHA, "epub")
+    job = journal.get(URL)
+    assert (job["file"], job["sha256"], job["format"], job["parts"], job["completed"]) == \
+        ("/books/1.epub", SHA, "epub", None, False)
+
+    journal.record_conversion(URL, ["p1.md", "p2.md", "p3.md"])
+    journal.record_notebook(URL, "nb-1", "Book")
+    journal.record_source(URL, 2, "src-2")
+    journal.record_source(URL, 1, "src-1")
+    job = journal.get(URL)
+    assert job["parts"] == ["p1.md", "p2.md", "p3.md"]
+    assert (job["notebook_id"], job["title"]) == ("nb-1", "Book")
+    assert job["sources"] == {1: "src-1", 2: "src-2"}
+
+    journal.mark_completed(URL)
+    assert journal.get(URL)["completed"] is True
+
+
+def test_survives_reopening(tmp_path):
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    finished(journal)
+    journal.close()
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    job = journal.get(URL)
+    assert job["completed"] and job["sources"] == {1: "src-1", 2: "src-2"}
+    journal.close()
+
+
+def test_same_download_keeps_progress(journal):
+    finished(journal)
+    journal.record_download(URL, "/elsewhere/1.epub", SHA, "epub")
+    job = journal.get(URL)
+    assert (job["file"], job["parts"], job["notebook_id"], job["completed"]) == \
+        ("/elsewhere/1.epub", ["p1.md", "p2.md"], "nb-1", True)
+
+
+def test_changed_download_resets_conversion_and_upload(journal):
+    finished(journal)
+    journal.record_download(URL, "/books/1.epub", "b" * 64, "epub")
+    job = journal.get(URL)
+    assert (job["parts"], job["notebook_id"], job["title"], job["sources"], job["completed"]) == \
+        (None, None, None, {}, False)
+
+
+def test_changed_parts_reset_upload(journal):
+    finished(journal)
+    journal.record_conversion(URL, ["p1.md", "p2.md"])
+    assert journal.get(URL)["sources"] == {1: "src-1", 2: "src-2"}
+    journal.record_conversion(URL, ["q1.md", "q2.md", "q3.md"])
+    job = journal.get(URL)
+    assert (job["parts"], job["notebook_id"], job["sources"], job["completed"]) == \
+        (["q1.md", "q2.md", "q3.md"], None, {}, False)
+
+
+def test_same_content_adopts_a_completed_job(journal):
+    finished(journal)
+    other = "https://z-library.test/book/2"
+    journal.record_download(other, "/books/2.epub", "c" * 64, "epub")
+    assert journal.adopt_completed(other, "c" * 64) is None
+    assert journal.adopt_completed(URL, SHA) is None  # not from itself
+
+    journal.record_download(other, "/books/2.epub", SHA, "epub")
+    assert journal.adopt_completed(other, SHA) == URL
+    job = journal.get(other)
+    assert (job["parts"], job["notebook_id"], job["title"], job["completed"]) == \
+        (["p1.md", "p2.md"], "nb-1", "Book", True)
+    assert job["sources"] == {1: "src-1", 2: "src-2"}
+    # Forgetting one leaves the other
+    assert journal.forget(URL) is True
+    assert journal.get(URL) is None
+    assert journal.get(other)["sources"] == {1: "src-1", 2: "src-2"}
+
+
+def test_jobs_in_update_order(journal):
+    for i in (3, 1, 2):
+        journal.record_download(f"https://z-library.test/book/{i}", f"/books/{i}.epub", SHA, "epub")
+    assert [job["url"][-1] for job in journal.jobs()] == ["3", "1", "2"]
+
+
+def test_concurrent_writers(journal):
+    def upload(book):
+        url = f"https://z-library.test/book/{book}"
+        journal.record_conversion(url, [f"{book}-{i}.md" for i in range(20)])
+        for part in range(1, 21):
+            journal.record_source(url, part, f"src-{book}-{part}")
+        journal.mark_completed(url)
+
+    threads = [threading.Thread(target=upload, args=(book,)) for book in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    jobs = journal.jobs()
+    assert len(jobs) == 8
+    assert all(job["completed"] and len(job["sources"]) == 20 for job in jobs)
+
+
+class FailingBackend(FakeUploadBackend):
+    """Fails every upload of the files named in ``failing``."""
+
+    def __init__(self, failing=(), **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.failing = set(failing)
+
+    async def add_source(self, notebook_id, file_path):
+        if file_path.name in self.failing:
+            raise NotebookLMError(f"upload of {file_path.name} failed")
+        return await super().add_source(notebook_id, file_path)
+
+
+def test_interrupted_upload_resumes_with_the_missing_parts(tmp_path, monkeypatch, journal):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    parts = []
+    for i in range(1, 8):
+        parts.append(tmp_path / f"book_part{i}.md")
+        parts[-1].write_text(f"part {i}")
+    resilience = Resilience(policies={"upload": RetryPolicy(attempts=1)}, breaker_threshold=100)
+    backend = FailingBackend(failing={"book_part4.md", "book_part6.md"}, resilience=resilience)
+    uploader = ZLibraryAutoUploader(upload_backend=backend, journal=journal, direct_download=False)
+    journal.record_conversion(URL, parts)
+
+    result = asyncio.run(uploader.upload_to_notebooklm_async(parts, "Book", url=URL))
+    assert (result["success"], result["failed_parts"]) == (False, [4, 6])
+    job = journal.get(URL)
+    assert not job["completed"] and sorted(job["sources"]) == [1, 2, 3, 5, 7]
+    assert uploader.completed_result(URL) is None
+
+    # The rerun uploads only parts 4 and 6, to the same notebook
+    backend.failing.clear()
+    result = asyncio.run(uploader.upload_to_notebooklm_async(parts, url=URL))
+    assert result["success"] and result["notebook_id"] == job["notebook_id"]
+    assert len(backend.notebooks) == 1
+    notebook = backend.notebooks[job["notebook_id"]]
+    assert [s["path"] for s in notebook["sources"]] == [str(parts[i - 1]) for i in (1, 2, 3, 5, 7, 4, 6)]
+    assert backend.calls == {"create": 1, "source add": 7}
+
+    done = uploader.completed_result(URL)
+    assert (done["notebook_id"], done["title"], done["chunks"]) == (job["notebook_id"], "Book", 7)
+    assert done["source_ids"] == [journal.get(URL)["sources"][i] for i in range(1, 8)]
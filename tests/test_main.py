@@ -0,0 +1,201 @@
+"""The ingestion service, end to end through FastAPI's TestClient."""
+import asyncio
+import json
+import time
+
+import pytest
+
+fastapi = pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.corpus import write_epub  # noqa: E402
+
+
+def _no_cache():
+    """Pool initializer for the tests: convert without the user's caches."""
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """A function starting the service with the given settings; returns a TestClient."""
+    monkeypatch.setattr(main, "_init_ingest_worker", _no_cache)
+    clients = []
+
+    def start(workers=1, queue_size=4, keep_jobs=10, max_upload_mb=5):
+        monkeypatch.setattr(main, "INGEST_DIR", tmp_path / "ingest")
+        monkeypatch.setattr(main, "INGEST_WORKERS", workers)
+        monkeypatch.setattr(main, "INGEST_QUEUE_SIZE", queue_size)
+        monkeypatch.setattr(main, "INGEST_KEEP_JOBS", keep_jobs)
+        monkeypatch.setattr(main, "INGEST_MAX_UPLOAD_MB", max_upload_mb)
+        client = TestClient(main.app)
+        clients.append(client.__enter__())
+        return client
+
+    yield start
+    for client in clients:
+        client.__exit__(None, None, None)
+
+
+@pytest.fixture(scope="module")
+def book(tmp_path_factory):
+    """A 12k-word EPUB, as bytes."""
+    return write_epub(tmp_path_factory.mktemp("books") / "book.epub", 12_000).read_bytes()
+
+
+def job_dirs(client) -> list[str]:
+    return sorted(p.name for p in client.app.state.ingestion.root.iterdir())
+
+
+def wait_finished(client, job_id: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        assert time.monotonic() < deadline, f"job still {job['status']}"
+        time.sleep(0.05)
+
+
+def test_submitted_book_is_converted_and_split(service, book):
+    client = service()
+    r = client.post("/jobs/file", params={"filename": "My Book.epub", "max_words": 5000}, content=book)
+    assert r.status_code == 202
+    job = r.json()
+    assert (job["status"], job["source"], job["max_words"]) == ("queued", "My Book.epub", 5000)
+
+    job = wait_finished(client, job["id"])
+    assert job["status"] == "done", job["error"]
+    result = job["result"]
+    assert "_paths" not in result
+    parts = result["parts"]
+    assert len(parts) == 3
+    assert [p["index"] for p in parts] == [1, 2, 3]
+    assert all(p["words"] <= 5000 for p in parts)
+    assert sum(p["words"] for p in parts) == result["words"] > 12_000
+
+    texts = []
+    for part in parts:
+        r = client.get(part["url"])
+        assert r.status_code == 200
+        assert r.headers["content-type"] == "text/markdown; charset=utf-8"
+        assert len(r.content) == part["bytes"]
+        texts.append(r.text)
+    assert texts[0].startswith("# Benchmark latin 12k")
+    assert len("".join(texts)) == result["characters"]
+
+    assert client.get(f"/jobs/{job['id']}/parts/4").status_code == 404
+    assert client.get(f"/jobs/{job['id']}/parts/0").status_code == 404
+    assert [j["id"] for j in client.get("/jobs").json()] == [job["id"]]
+
+
+def test_book_within_budget_is_one_part(service, book):
+    client = service()
+    job_id = client.post("/jobs/file", params={"filename": "book.epub"}, content=book).json()["id"]
+    job = wait_finished(client, job_id)
+    assert [p["name"] for p in job["result"]["parts"]] == ["book.md"]
+
+
+def test_events_stream_status_changes_until_done(service, book):
+    client = service()
+    job_id = client.post("/jobs/file", params={"filename": "book.epub"}, content=book).json()["id"]
+    statuses = []
+    with client.stream("GET", f"/jobs/{job_id}/events") as stream:
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        for line in stream.iter_lines():
+            if line.startswith("data: "):
+                statuses.append(json.loads(line[6:])["status"])
+    assert statuses[-1] == "done"
+    assert set(statuses) <= {"queued", "running", "done"}
+    assert len(statuses) == len(set(statuses))
+    # A finished job sends its final state once and ends the stream
+    with client.stream("GET", f"/jobs/{job_id}/events") as stream:
+        assert [json.loads(line[6:])["status"] for line in stream.iter_lines() if line] == ["done"]
+
+
+def test_failed_conversion_is_reported(service):
+    client = service()
+    job_id = client.post("/jobs/file", params={"filename": "bad.epub"}, content=b"not a zip").json()["id"]
+    job = wait_finished(client, job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "RuntimeError: conversion failed"
+    assert client.get(f"/jobs/{job_id}/parts/1").status_code == 409
+
+
+def test_url_job_downloads_then_converts(service, book, monkeypatch):
+    async def download(self, url, job_dir):
+        target = job_dir / "downloaded.epub"
+        target.write_bytes(book)
+        return target
+
+    monkeypatch.setattr(main.Ingestion, "_download", download)
+    client = service()
+    r = client.post("/jobs/url", json={"url": "https://z-library.test/book/1", "max_words": 5000})
+    assert r.status_code == 202
+    job = wait_finished(client, r.json()["id"])
+    assert job["status"] == "done", job["error"]
+    assert job["source"] == "https://z-library.test/book/1"
+    assert [p["name"] for p in job["result"]["parts"]] == [f"downloaded_part{i}.md" for i in (1, 2, 3)]
+
+
+def test_full_queue_is_refused_with_429(service, book, monkeypatch):
+    async def stalled_worker(self):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(main.Ingestion, "_worker", stalled_worker)
+    client = service(queue_size=2)
+    codes = [client.post("/jobs/file", params={"filename": "book.epub"}, content=book).status_code
+             for _ in range(3)]
+    assert codes == [202, 202, 429]
+    r = client.post("/jobs/url", json={"url": "https://z-library.test/book/1"})
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "30"
+    assert client.get("/health").json() == {"queued": 2, "queue_size": 2, "running": 0, "workers": 1}
+    # Refused submissions leave no job behind
+    assert len(client.get("/jobs").json()) == 2
+    assert job_dirs(client) == sorted(j["id"] for j in client.get("/jobs").json())
+
+
+def test_invalid_submissions(service, book):
+    client = service(max_upload_mb=1)
+    r = client.post("/jobs/file", params={"filename": "book.txt"}, content=book)
+    assert r.status_code == 415
+    r = client.post("/jobs/file", params={"filename": "book.epub", "max_words": 0}, content=book)
+    assert r.status_code == 422
+    assert r.json()["detail"] == "max_words must be at least 1"
+    assert client.post("/jobs/file", content=book).status_code == 422  # no filename
+    assert client.post("/jobs/url", json={"max_words": 10}).status_code == 422  # no url
+    assert client.post("/jobs/url", json={"url": "u", "max_words": -1}).status_code == 422
+    r = client.post("/jobs/file", params={"filename": "book.epub"}, content=b"")
+    assert r.status_code == 400
+    r = client.post("/jobs/file", params={"filename": "book.epub"}, content=b"x" * (2 << 20))
+    assert r.status_code == 413
+    assert client.get("/jobs/0123456789ab").status_code == 404
+    assert client.get("/jobs/0123456789ab/events").status_code == 404
+    # Nothing was queued or left on disk
+    assert client.get("/jobs").json() == []
+    assert job_dirs(client) == []
+
+
+def test_upload_name_cannot_escape_the_job_directory(service, book, tmp_path):
+    client = service()
+    r = client.post("/jobs/file", params={"filename": "../../evil.epub"}, content=book)
+    assert r.status_code == 202
+    assert r.json()["source"] == "evil.epub"
+    job = wait_finished(client, r.json()["id"])
+    assert [p["name"] for p in job["result"]["parts"]] == ["evil.md"]
+    assert (client.app.state.ingestion.root / job["id"] / "evil.epub").exists()
+    assert not list(tmp_path.glob("evil.*"))
+
+
+def test_finished_jobs_are_evicted(service, book):
+    client = service(keep_jobs=2)
+    ids = [client.post("/jobs/file", params={"filename": f"b{i}.epub"}, content=book).json()["id"]
+           for i in range(4)]
+    deadline = time.monotonic() + 60
+    while any(client.get(f"/jobs/{i}").json().get("status") in ("queued", "running") for i in ids):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert [j["id"] for j in client.get("/jobs").json()] == ids[2:]
+    assert job_dirs(client) == sorted(ids[2:])
+    assert client.get(f"/jobs/{ids[0]}").status_code == 404
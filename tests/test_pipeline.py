@@ -0,0 +1,184 @@
+"""The download → convert → upload pipeline, run against fake stages."""
+import asyncio
+import hashlib
+import random
+
+import pytest
+
+from zlibrary_to_notebooklm.pipeline import Pipeline
+
+
+class StageCrash(BaseException):
+    """An error no stage handles (escapes the per-book error handling)."""
+
+
+class FakeUploader:
+    """Stands in for ZLibraryAutoUploader: downloads write the URL (up to
+    any '#') as the book's content, conversion (in the pool) prefixes it,
+    uploads echo it back."""
+
+    pdf_split = "pdf"
+    journal = None
+
+    def __init__(self, root=None, seed=0, fail_download=()):
+        self.root = root
+        self.store = self
+        self.fail_download = set(fail_download)
+        self.random = random.Random(seed)
+        self.fetched = []
+        self.uploaded = []
+        self.upload_gate = None
+
+    def completed_result(self, url):
+        return None
+
+    def journaled_conversion(self, url):
+        return None
+
+    def record_conversion(self, url, final_file):
+        pass
+
+    async def fetch_book(self, url):
+        self.fetched.append(url)
+        path = self.root / f"{len(self.fetched)}.epub"
+        await asyncio.sleep(self.random.uniform(0, 0.02))
+        if url in self.fail_download:
+            return None, None
+        path.write_text(url.partition("#")[0])
+        return path, "epub"
+
+    def sha256_of(self, path):
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
+    def convert_to_txt(self, file_path, file_format=None):
+        text = file_path.read_text()
+        if "bad-book" in text:
+            raise ValueError("cannot convert")
+        md_file = file_path.with_suffix(".md")
+        md_file.write_text(f"converted {text}")
+        return md_file
+
+    async def upload_to_notebooklm_async(self, file_path, title=None, url=None):
+        if self.upload_gate is not None:
+            await self.upload_gate.wait()
+        await asyncio.sleep(self.random.uniform(0, 0.02))
+        self.uploaded.append(url)
+        return {"success": True, "notebook_id": f"nb-{len(self.uploaded)}", "source_ids": [file_path.read_text()]}
+
+
+def make_pipeline(uploader, **options):
+    options = {"download_workers": 3, "convert_workers": 2, "upload_workers": 2, "queue_size": 2,
+               "host_interval": 0, **options}
+    return Pipeline(uploader, **options)
+
+
+def other_tasks():
+    return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+
+def test_results_follow_input_order(tmp_path):
+    urls = [f"https://z-library.test/book/{i}" for i in range(12)]
+    uploader = FakeUploader(tmp_path, seed=1)
+    pipeline = make_pipeline(uploader)
+    jobs = asyncio.run(pipeline.run(urls))
+
+    assert [job["url"] for job in jobs] == urls
+    assert all(job["success"] for job in jobs)
+    assert [job["source_ids"] for job in jobs] == [[f"converted {url}"] for url in urls]
+    assert all(set(job["timings"]) == {"download", "convert", "upload"} for job in jobs)
+    # Uploads finish in whatever order they finish, each once
+    assert sorted(uploader.uploaded) == sorted(urls)
+    report = pipeline.report()
+    assert [report[s]["done"] for s in ("download", "convert", "upload")] == [12, 12, 12]
+
+
+def test_failed_books_stop_at_their_stage(tmp_path):
+    urls = ["https://a.test/1", "https://a.test/missing", "https://a.test/bad-book", "https://b.test/2"]
+    uploader = FakeUploader(tmp_path, fail_download={"https://a.test/missing"})
+    pipeline = make_pipeline(uploader)
+    jobs = asyncio.run(pipeline.run(urls))
+
+    assert [job["success"] for job in jobs] == [True, False, False, True]
+    assert jobs[1]["error"] == "下载失败" and "convert" not in jobs[1]["timings"]
+    assert jobs[2]["error"] == "ValueError: cannot convert" and "upload" not in jobs[2]["timings"]
+    assert sorted(uploader.uploaded) == ["https://a.test/1", "https://b.test/2"]
+    report = pipeline.report()
+    assert (report["download"]["failed"], report["convert"]["failed"], report["upload"]["done"]) == (1, 1, 2)
+
+
+def test_duplicate_content_is_converted_and_uploaded_once(tmp_path):
+    urls = ["https://a.test/same#1", "https://a.test/other", "https://a.test/same#2"]
+    uploader = FakeUploader(tmp_path)
+    jobs = asyncio.run(make_pipeline(uploader, download_workers=1).run(urls))
+
+    assert sorted(uploader.uploaded) == sorted(urls[:2])
+    assert jobs[2]["short_circuit"] == "duplicate"
+    assert jobs[2]["duplicate_of"] == urls[0]
+    assert (jobs[2]["success"], jobs[2]["notebook_id"]) == (True, jobs[0]["notebook_id"])
+
+
+@pytest.mark.parametrize("queue_size, download_workers, convert_workers, upload_workers",
+                         [(1, 1, 1, 1), (2, 3, 2, 1), (3, 2, 1, 2)])
+def test_queues_bound_the_books_in_flight(tmp_path, queue_size, download_workers, convert_workers,
+                                          upload_workers):
+    urls = [f"https://z-library.test/book/{i}" for i in range(30)]
+    uploader = FakeUploader(tmp_path)
+    pipeline = make_pipeline(uploader, queue_size=queue_size, download_workers=download_workers,
+                             convert_workers=convert_workers, upload_workers=upload_workers)
+    # Each stage holds one book per worker (blocked handing it on), each
+    # queue holds queue_size: no more can be downloaded while uploads stall
+    bound = upload_workers + queue_size + convert_workers + queue_size + download_workers
+
+    async def main():
+        uploader.upload_gate = asyncio.Event()
+        run = asyncio.create_task(pipeline.run(urls))
+        fetched = -1
+        while fetched != len(uploader.fetched):
+            fetched = len(uploader.fetched)
+            await asyncio.sleep(0.3)
+        assert fetched == bound
+        assert uploader.uploaded == []
+        uploader.upload_gate.set()
+        return await run
+
+    jobs = asyncio.run(main())
+    assert all(job["success"] for job in jobs)
+    assert len(uploader.fetched) == len(urls)
+
+
+def test_a_crashed_stage_cancels_the_others(tmp_path):
+    urls = [f"https://z-library.test/book/{i}" for i in range(20)]
+    uploader = FakeUploader(tmp_path)
+    pipeline = make_pipeline(uploader, queue_size=1)
+
+    async def crash(index, job):
+        raise StageCrash()
+
+    pipeline._upload = crash
+
+    async def main():
+        with pytest.raises(StageCrash):
+            await asyncio.wait_for(pipeline.run(urls), timeout=30)
+        # No stage is left running (or blocked on a queue) behind the error
+        assert other_tasks() == []
+        fetched = len(uploader.fetched)
+        await asyncio.sleep(0.2)
+        assert len(uploader.fetched) == fetched < len(urls)
+
+    asyncio.run(main())
+
+
+def test_cancelling_the_run_cancels_every_stage(tmp_path):
+    urls = [f"https://z-library.test/book/{i}" for i in range(20)]
+    uploader = FakeUploader(tmp_path)
+
+    async def main():
+        uploader.upload_gate = asyncio.Event()
+        run = asyncio.create_task(make_pipeline(uploader).run(urls))
+        await asyncio.sleep(0.3)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        assert other_tasks() == []
+
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""Retries with backoff and the per-host circuit breaker."""
+import asyncio
+import random
+
+import pytest
+
+from zlibrary_to_notebooklm import resilience
+from zlibrary_to_notebooklm.resilience import CircuitBreaker, CircuitOpenError, Resilience, RetryPolicy
+
+
+class Flaky(Exception):
+    pass
+
+
+class Clock:
+    """Stands in for time.monotonic in the resilience module."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The delays call() slept for (without sleeping)."""
+    slept = []
+
+    async def sleep(delay):
+        slept.append(delay)
+
+    monkeypatch.setattr(resilience.asyncio, "sleep", sleep)
+    return slept
+
+
+def steps(*outcomes):
+    """A step returning/raising each outcome in turn; ``step.calls`` counts calls."""
+    outcomes = list(outcomes)
+
+    async def step():
+        step.calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    step.calls = 0
+    return step
+
+
+def call(r, step, operation="navigate", host="z-library.test", retry_on=(Flaky,)):
+    return asyncio.run(r.call(operation, host, step, retry_on=retry_on))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_delays_are_full_jitter_under_the_cap(seed):
+    policy = RetryPolicy(attempts=10, base_delay=1.0, max_delay=8.0)
+    rng = random.Random(seed)
+    for retry in range(1, 10):
+        assert 0 <= policy.delay(retry, rng) <= min(8.0, 2 ** (retry - 1))
+
+
+def test_retries_until_success(sleeps):
+    r = Resilience(policies={"navigate": RetryPolicy(attempts=3, base_delay=1.0)}, seed=0)
+    step = steps(Flaky("1"), Flaky("2"), "page")
+    assert call(r, step) == "page"
+    assert step.calls == 3
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+    report = r.report()
+    assert report["operations"]["navigate"] == {"calls": 1, "retries": 2, "recovered": 1, "failed": 0, "rejected": 0}
+    assert report["circuits"]["z-library.test"] == {"state": "closed", "failures": 0, "trips": 0}
+
+
+def test_last_error_is_raised_when_retries_run_out(sleeps):
+    r = Resilience(policies={"download": RetryPolicy(attempts=2, base_delay=0)}, seed=0)
+    step = steps(Flaky("first"), Flaky("second"))
+    with pytest.raises(Flaky, match="second"):
+        call(r, step, "download")
+    assert r.report()["operations"]["download"]["failed"] == 1
+    assert r.breaker("z-library.test").failures == 2
+
+
+def test_other_errors_are_not_retried_or_counted(sleeps):
+    r = Resilience(seed=0)
+    step = steps(KeyError("bug"))
+    with pytest.raises(KeyError):
+        call(r, step)
+    assert step.calls == 1 and sleeps == []
+    assert r.breaker("z-library.test").failures == 0
+
+
+def test_unknown_operation_uses_the_default_policy(sleeps):
+    r = Resilience(seed=0)
+    step = steps(Flaky(), Flaky(), Flaky())
+    with pytest.raises(Flaky):
+        call(r, step, "something-else")
+    assert step.calls == RetryPolicy().attempts
+
+
+def test_breaker_opens_after_threshold_and_rejects(clock, sleeps):
+    r = Resilience(policies={"navigate": RetryPolicy(attempts=1)}, breaker_threshold=3, breaker_reset=60, seed=0)
+    for _ in range(3):
+        with pytest.raises(Flaky):
+            call(r, steps(Flaky()))
+    step = steps("page")
+    with pytest.raises(CircuitOpenError):
+        call(r, step)
+    assert step.calls == 0
+    # Other hosts are unaffected
+    assert call(r, steps("page"), host="other.test") == "page"
+    report = r.report()
+    assert report["operations"]["navigate"]["rejected"] == 1
+    assert report["circuits"]["z-library.test"] == {"state": "open", "failures": 3, "trips": 1}
+    assert report["circuits"]["other.test"]["state"] == "closed"
+
+
+def test_retries_stop_once_the_breaker_opens(sleeps):
+    r = Resilience(policies={"navigate": RetryPolicy(attempts=5, base_delay=0)}, breaker_threshold=2, seed=0)
+    step = steps(Flaky(), Flaky(), "never")
+    with pytest.raises(CircuitOpenError):
+        call(r, step)
+    assert step.calls == 2
+
+
+def test_half_open_probe_closes_or_reopens(clock, sleeps):
+    r = Resilience(policies={"navigate": RetryPolicy(attempts=1)}, breaker_threshold=1, breaker_reset=60, seed=0)
+    with pytest.raises(Flaky):
+        call(r, steps(Flaky()))
+    breaker = r.breaker("z-library.test")
+    clock.now += 59
+    assert breaker.state == "open"
+    clock.now += 1
+    assert breaker.state == "half-open"
+
+    # A failed probe opens the circuit again, for another full period
+    with pytest.raises(Flaky):
+        call(r, steps(Flaky()))
+    assert (breaker.state, breaker.trips) == ("open", 2)
+    clock.now += 60
+    assert call(r, steps("page")) == "page"
+    assert (breaker.state, breaker.failures, breaker.trips) == ("closed", 0, 2)
+
+
+def test_only_one_probe_at_a_time(clock):
+    breaker = CircuitBreaker(threshold=1, reset_after=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.release()
+    assert breaker.allow() is True
+
+
+@pytest.mark.parametrize("error", [KeyError("bug"), asyncio.CancelledError()])
+def test_probe_ending_without_a_verdict_frees_the_circuit(clock, sleeps, error):
+    r = Resilience(policies={"navigate": RetryPolicy(attempts=1)}, breaker_threshold=1, breaker_reset=60, seed=0)
+    with pytest.raises(Flaky):
+        call(r, steps(Flaky()))
+    clock.now += 60
+    with pytest.raises(type(error)):
+        call(r, steps(error))
+    # Neither a success nor a site failure: the next request may probe
+    breaker = r.breaker("z-library.test")
+    assert (breaker.state, breaker.trips) == ("half-open", 1)
+    assert call(r, steps("page")) == "page"
+    assert breaker.state == "closed"
@@ -0,0 +1,71 @@
+"""ZLibraryAutoUploader against fake pages (no browser, no network)."""
+import asyncio
+
+import pytest
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from zlibrary_to_notebooklm.resilience import Resilience, RetryPolicy
+from zlibrary_to_notebooklm.upload import ZLibraryAutoUploader
+from zlibrary_to_notebooklm.upload_backends import FakeUploadBackend
+
+URL = "https://z-library.test/book/1"
+
+
+class FakePage:
+    """A page whose goto fails ``goto_failures`` times and whose download UI
+    never shows up unless ``has_ui``."""
+
+    def __init__(self, goto_failures: int = 0, has_ui: bool = False):
+        self.goto_failures = goto_failures
+        self.has_ui = has_ui
+        self.gotos = 0
+        self.waits = 0
+
+    async def goto(self, url, **kwargs):
+        self.gotos += 1
+        if self.goto_failures:
+            self.goto_failures -= 1
+            raise PlaywrightError("net::ERR_CONNECTION_RESET")
+
+    async def wait_for_selector(self, selector, **kwargs):
+        self.waits += 1
+        if not self.has_ui:
+            raise PlaywrightTimeoutError("Timeout 60000ms exceeded.")
+
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    resilience = Resilience(
+        policies={"navigate": RetryPolicy(attempts=3, base_delay=0)}, breaker_threshold=3, seed=0,
+    )
+    uploader = ZLibraryAutoUploader(
+        upload_backend=FakeUploadBackend(latency=0, resilience=resilience), direct_download=False,
+    )
+    uploader.lookups = 0
+
+    async def find_download_link(page):
+        uploader.lookups += 1
+        return None, None
+
+    uploader._find_download_link = find_download_link
+    return uploader
+
+
+def test_missing_download_ui_is_not_retried_or_counted(uploader):
+    # Several books whose pages load but show no download UI: each page is
+    # opened once, the link lookup still runs, and the host never trips
+    for _ in range(5):
+        page = FakePage(has_ui=False)
+        assert asyncio.run(uploader._download_book(page, URL)) == (None, None)
+        assert (page.gotos, page.waits) == (1, 1)
+    assert uploader.lookups == 5
+    circuit = uploader.resilience.report()["circuits"]["z-library.test"]
+    assert circuit == {"state": "closed", "failures": 0, "trips": 0}
+
+
+def test_failed_navigation_is_retried(uploader):
+    page = FakePage(goto_failures=2, has_ui=True)
+    assert asyncio.run(uploader._download_book(page, URL)) == (None, None)
+    assert (page.gotos, page.waits) == (3, 1)
+    assert uploader.resilience.report()["operations"]["navigate"]["recovered"] == 1
@@ -0,0 +1,158 @@
+"""Upload backends: the notebooklm CLI client (against a fake CLI) and the local fake."""
+import asyncio
+import json
+import sys
+
+import pytest
+
+from zlibrary_to_notebooklm.resilience import Resilience, RetryPolicy
+from zlibrary_to_notebooklm.upload_backends import (
+    CLIUploadBackend, FakeUploadBackend, NotebookLMError, make_upload_backend,
+)
+
+# A stand-in for the notebooklm CLI. Like the real one, "use" sets the
+# current notebook for later commands; "source add" takes no --notebook and
+# fails if the current notebook changes while it uploads.
+FAKE_CLI = '''#!{python}
+import json, sys, time
+from pathlib import Path
+
+state = Path({state!r})
+current = state / "current"
+args = sys.argv[1:]
+if "--notebook" in args:
+    sys.exit("Error: No such option: --notebook")
+if args[0] == "create":
+    print(json.dumps({{"notebook": {{"id": "nb-" + args[1]}}}}))
+elif args[0] == "use":
+    current.write_text(args[1])
+elif args[:2] == ["source", "add"]:
+    name = Path(args[2]).name
+    notebook = current.read_text() if current.exists() else None
+    if "slow" in name:
+        time.sleep(5)
+    if "fail" in name:
+        sys.exit("upload rejected: " + name)
+    time.sleep(0.05)
+    if notebook is None or current.read_text() != notebook:
+        sys.exit("current notebook changed during upload")
+    with open(state / "log.jsonl", "a") as log:
+        log.write(json.dumps([notebook, name]) + "\\n")
+    print(json.dumps({{"source": {{"id": "src-" + name}}}}))
+else:
+    sys.exit("unknown command")
+'''
+
+
+@pytest.fixture
+def cli(tmp_path):
+    executable = tmp_path / "notebooklm"
+    executable.write_text(FAKE_CLI.format(python=sys.executable, state=str(tmp_path)))
+    executable.chmod(0o755)
+    return executable
+
+
+def make_backend(cli, **options):
+    resilience = Resilience(policies={"upload": RetryPolicy(attempts=1)}, breaker_threshold=100)
+    return CLIUploadBackend(executable=str(cli), resilience=resilience, **options)
+
+
+def uploaded(tmp_path) -> list[list[str]]:
+    log = tmp_path / "log.jsonl"
+    return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+
+def book(tmp_path, title, parts):
+    files = []
+    for i in range(1, parts + 1):
+        files.append(tmp_path / f"{title}_part{i}.md")
+        files[-1].write_text(f"{title} {i}")
+    return files
+
+
+def test_book_is_uploaded_to_the_current_notebook(cli, tmp_path):
+    backend = make_backend(cli)
+    files = book(tmp_path, "alpha", 5)
+    result = asyncio.run(backend.upload(files, "alpha"))
+    assert result["success"], result
+    assert result["notebook_id"] == "nb-alpha"
+    assert result["source_ids"] == [f"src-alpha_part{i}.md" for i in range(1, 6)]
+    assert sorted(uploaded(tmp_path)) == [["nb-alpha", f.name] for f in files]
+    assert (tmp_path / "current").read_text() == "nb-alpha"
+
+
+def test_books_uploading_at_once_keep_to_their_notebooks(cli, tmp_path):
+    backend = make_backend(cli, concurrency=3)
+    books = {title: book(tmp_path, title, 4) for title in ("alpha", "beta", "gamma")}
+
+    async def main():
+        return await asyncio.gather(*(backend.upload(files, title) for title, files in books.items()))
+
+    results = asyncio.run(main())
+    assert all(r["success"] for r in results), [r.get("error") for r in results]
+    assert sorted(uploaded(tmp_path)) == sorted(
+        [f"nb-{title}", f.name] for title, files in books.items() for f in files
+    )
+
+
+def test_resumed_upload_switches_to_its_notebook(cli, tmp_path):
+    backend = make_backend(cli)
+    alpha, beta = book(tmp_path, "alpha", 3), book(tmp_path, "beta", 2)
+    # One event loop per call, as the synchronous upload_to_notebooklm does
+    assert asyncio.run(backend.upload(beta, "beta"))["success"]
+    result = asyncio.run(backend.upload(alpha, "alpha", notebook_id="nb-alpha", uploaded={1: "src-old"}))
+    assert result["source_ids"] == ["src-old", "src-alpha_part2.md", "src-alpha_part3.md"]
+    # Parts 2 and 3 upload concurrently, in either order
+    assert sorted(uploaded(tmp_path)[-2:]) == [["nb-alpha", "alpha_part2.md"], ["nb-alpha", "alpha_part3.md"]]
+
+
+def test_failed_part_is_reported(cli, tmp_path):
+    backend = make_backend(cli)
+    files = book(tmp_path, "alpha", 2) + book(tmp_path, "fail", 1)
+    result = asyncio.run(backend.upload(files, "alpha"))
+    assert (result["success"], result["failed_parts"]) == (False, [3])
+    assert result["errors"] == ["upload rejected: fail_part1.md"]
+    assert result["source_ids"] == ["src-alpha_part1.md", "src-alpha_part2.md"]
+
+
+def test_slow_command_times_out(cli, tmp_path):
+    backend = make_backend(cli, timeout=0.5)
+    with pytest.raises(NotebookLMError, match="超时"):
+        asyncio.run(backend.add_source("nb-alpha", book(tmp_path, "slow", 1)[0]))
+
+
+def test_missing_executable(tmp_path):
+    backend = make_backend(tmp_path / "missing")
+    result = asyncio.run(backend.upload(book(tmp_path, "alpha", 1), "alpha"))
+    assert result["success"] is False and "无法运行" in result["error"]
+
+
+def test_unparseable_output(tmp_path):
+    executable = tmp_path / "notebooklm"
+    executable.write_text(f"#!{sys.executable}\nprint('not json')\n")
+    executable.chmod(0o755)
+    with pytest.raises(NotebookLMError, match="无法解析输出"):
+        asyncio.run(make_backend(executable).create_notebook("alpha"))
+
+
+def test_fake_backend_records_and_retries(tmp_path):
+    resilience = Resilience(policies={"upload": RetryPolicy(attempts=10, base_delay=0)}, breaker_threshold=100)
+    backend = FakeUploadBackend(latency=0, failure_rate=0.3, seed=1, resilience=resilience)
+    files = book(tmp_path, "alpha", 6)
+    result = asyncio.run(backend.upload(files, "alpha"))
+    assert result["success"]
+    notebook = backend.notebooks[result["notebook_id"]]
+    assert sorted(s["path"] for s in notebook["sources"]) == sorted(str(f) for f in files)
+    assert backend.report()["sources"] == 6
+    assert resilience.report()["operations"]["upload"]["retries"] > 0
+
+
+@pytest.mark.parametrize("rate", [-0.1, 1.5])
+def test_fake_backend_rejects_bad_failure_rate(rate):
+    with pytest.raises(ValueError):
+        FakeUploadBackend(failure_rate=rate)
+
+
+def test_make_upload_backend():
+    assert isinstance(make_upload_backend("cli"), CLIUploadBackend)
+    assert isinstance(make_upload_backend("fake", latency=0), FakeUploadBackend)
@@ -0,0 +1,67 @@
+"""
+批量模式：并发下载多本书，每本下载完成后立即转换并上传
+
+下载并发数由下载协程数限制，同一站点另有并发数和请求间隔限制
+（pipeline.HostLimiter）。下载、转换、上传分阶段并行推进（见 pipeline），
+每本书的结果、各阶段吞吐量和重试统计（见 resilience）写入汇总 JSON。
+
+    python3 upload.py --batch urls.txt --concurrency 4 --summary summary.json
+    cat urls.txt | python3 upload.py --batch - --headless
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+try:
+    from .pipeline import Pipeline
+except ImportError:
+    from pipeline import Pipeline
+
+
+def read_urls(source: str) -> list[str]:
+    """从文件（或 "-" 表示标准输入）读取 URL，忽略空行和 # 注释，去重保序"""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = Path(source).read_text(encoding='utf-8').splitlines()
+    urls = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line and line not in urls:
+            urls.append(line)
+    return urls
+
+
+async def run_batch(uploader, urls: list[str], concurrency: int = 3, per_host: int = 2,
+                    host_interval: float = 1.0, convert_workers: int = 0,
+                    queue_size: int = 2) -> tuple[list[dict], dict]:
+    """用流水线（见 pipeline）并发处理 urls，返回 (每本书结果, 各阶段统计)"""
+    pipeline = Pipeline(
+        uploader,
+        download_workers=concurrency,
+        convert_workers=convert_workers,
+        queue_size=queue_size,
+        per_host=per_host,
+        host_interval=host_interval,
+    )
+    results = await pipeline.run(urls)
+    pipeline.print_report()
+    return results, pipeline.report()
+
+
+def write_summary(results: list[dict], summary_path: Path, started: float, stages: dict | None = None,
+                  resilience: dict | None = None) -> dict:
+    """写入批量处理汇总 JSON（含各阶段统计和重试统计），并返回汇总内容"""
+    summary = {
+        "started": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        "elapsed_seconds": round(time.time() - started, 2),
+        "total": len(results),
+        "succeeded": sum(1 for r in results if r["success"]),
+        "failed": sum(1 for r in results if not r["success"]),
+        "stages": stages or {},
+        "resilience": resilience or {},
+        "jobs": results,
+    }
+    summary_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    return summary
@@ -0,0 +1,164 @@
+"""
+Long-lived Chromium contexts shared across downloads.
+
+Starting Chromium and loading the profile costs seconds per book, so the
+pool starts the browser once and hands out pages:
+
+    async with BrowserPool(profile_dir) as pool:
+        async with pool.page() as page:
+            await page.goto(url)
+
+With a ``storage_state`` file (see login.py) the pool launches one browser
+and opens ``contexts`` contexts from that saved session. Without one it
+opens a single persistent context on ``profile_dir``, like the original
+one-shot download did. Each context serves up to ``pages_per_context``
+pages at once. A page is closed and replaced after ``max_page_uses`` jobs,
+after a crash, or when the job using it raised; a closed context is
+reopened.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+
+BROWSER_ARGS = ['--disable-blink-features=AutomationControlled']
+
+
+class _Slot:
+    """One page of the pool: its context, the page itself and its history."""
+
+    def __init__(self, context_index: int):
+        self.context_index = context_index
+        self.page = None
+        self.uses = 0
+        self.crashed = False
+
+
+class BrowserPool:
+    """Pages handed out over one or more long-lived Chromium contexts."""
+
+    def __init__(self, profile_dir: Path, storage_state: Path | None = None, contexts: int = 1,
+                 pages_per_context: int = 1, max_page_uses: int = 20, headless: bool = False):
+        if storage_state is None and contexts != 1:
+            raise ValueError("several contexts need a storage_state to share the login")
+        if contexts < 1 or pages_per_context < 1 or max_page_uses < 1:
+            raise ValueError("contexts, pages_per_context and max_page_uses must be at least 1")
+        self.profile_dir = Path(profile_dir)
+        self.storage_state = storage_state
+        self.contexts = contexts
+        self.pages_per_context = pages_per_context
+        self.max_page_uses = max_page_uses
+        self.headless = headless
+        self._playwright = None
+        self._browser = None
+        self._contexts = []
+        self._idle = None
+        self._pages = set()  # pages currently owned by a slot
+        self._lock = asyncio.Lock()
+        self.pages_opened = 0
+
+    @property
+    def size(self) -> int:
+        """Pages that can be in use at the same time."""
+        return self.contexts * self.pages_per_context
+
+    async def start(self):
+        self._playwright = await async_playwright().start()
+        if self.storage_state is not None:
+            self._browser = await self._playwright.chromium.launch(headless=self.headless, args=BROWSER_ARGS)
+        self._contexts = [None] * self.contexts
+        self._idle = asyncio.Queue()
+        for i in range(self.contexts):
+            for _ in range(self.pages_per_context):
+                self._idle.put_nowait(_Slot(i))
+        return self
+
+    async def close(self):
+        for context in self._contexts:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+        self._contexts = []
+        self._pages.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _context(self, index: int):
+        """Context ``index``, (re)opened if it is not running."""
+        async with self._lock:
+            context = self._contexts[index]
+            if context is None:
+                if self._browser is not None:
+                    context = await self._browser.new_context(
+                        storage_state=str(self.storage_state), accept_downloads=True
+                    )
+                else:
+                    context = await self._playwright.chromium.launch_persistent_context(
+                        user_data_dir=str(self.profile_dir),
+                        headless=self.headless,
+                        accept_downloads=True,
+                        args=BROWSER_ARGS,
+                    )
+                context.on('close', lambda _: self._forget(index, context))
+                self._contexts[index] = context
+            return context
+
+    def _forget(self, index: int, context):
+        if index < len(self._contexts) and self._contexts[index] is context:
+            self._contexts[index] = None
+
+    async def _open_page(self, slot: _Slot):
+        context = await self._context(slot.context_index)
+        # A persistent context opens with a blank page; use it first.
+        spare = [p for p in context.pages if p not in self._pages and not p.is_closed()]
+        page = spare[0] if spare else await context.new_page()
+        self._pages.add(page)
+        slot.page, slot.uses, slot.crashed = page, 0, False
+        page.on('crash', lambda _: setattr(slot, 'crashed', True))
+        self.pages_opened += 1
+
+    async def _retire(self, slot: _Slot):
+        if slot.page is not None:
+            self._pages.discard(slot.page)
+            try:
+                await slot.page.close()
+            except Exception:
+                pass
+        slot.page = None
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a page for one job, waiting while all pages are busy."""
+        slot = await self._idle.get()
+        try:
+            if slot.page is None or slot.page.is_closed():
+                await self._open_page(slot)
+            slot.uses += 1
+            ok = False
+            try:
+                yield slot.page
+                ok = True
+            finally:
+                if not ok or slot.crashed or slot.uses >= self.max_page_uses or slot.page.is_closed():
+                    await self._retire(slot)
+                else:
+                    try:
+                        await slot.page.goto('about:blank')  # drop the last book's page
+                    except Exception:
+                        await self._retire(slot)
+        finally:
+            self._idle.put_nowait(slot)
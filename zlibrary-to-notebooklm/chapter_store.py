@@ -0,0 +1,141 @@
+"""
+SQLite memo of converted chapters.
+
+Every XHTML document of an EPUB is keyed by the SHA-256 of its raw bytes
+and the converter version, and its Markdown (zlib-compressed) and word count
+are kept in one SQLite file. Converting a book again, or a revision of it,
+then only parses the chapters whose bytes changed.
+
+    with ChapterStore(path) as memo:
+        stats = epub_to_markdown(epub_file, md_file, memo=memo)
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+try:
+    from .convert_epub import CONVERTER_VERSION
+except ImportError:
+    from convert_epub import CONVERTER_VERSION
+
+
+DEFAULT_STORE_PATH = Path.home() / ".zlibrary" / "cache" / "chapters.sqlite3"
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB of compressed Markdown
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    digest    TEXT NOT NULL,
+    converter INTEGER NOT NULL,
+    markdown  BLOB NOT NULL,
+    words     INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (digest, converter)
+) WITHOUT ROWID
+"""
+
+
+class ChapterStore:
+    """Chapter Markdown and word counts by content hash, in one SQLite file.
+
+    New chapters and last-used times are buffered and written in a single
+    transaction by flush() (or on leaving the ``with`` block), so a book's
+    worth of lookups costs one commit. The database runs in WAL mode so
+    several processes can share it; within a process the store may be used
+    from any thread.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STORE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._new = []
+        self._used = []
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        """Key of a chapter: the SHA-256 of its raw XHTML."""
+        return hashlib.sha256(content).hexdigest()
+
+    def get(self, digest: str) -> tuple[str, int] | None:
+        """(markdown, words) of the chapter with this digest, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT markdown, words FROM chapters WHERE digest = ? AND converter = ?",
+                (digest, CONVERTER_VERSION),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used.append((time.time(), digest, CONVERTER_VERSION))
+        return zlib.decompress(row[0]).decode('utf-8'), row[1]
+
+    def put(self, digest: str, markdown: str, words: int) -> None:
+        row = (digest, CONVERTER_VERSION, zlib.compress(markdown.encode('utf-8'), 1), words, time.time())
+        with self._lock:
+            self._new.append(row)
+
+    def flush(self) -> None:
+        """Write buffered chapters and last-used times, then enforce the size limit."""
+        with self._lock:
+            if not self._new and not self._used:
+                return
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?)", self._new)
+                self._db.executemany(
+                    "UPDATE chapters SET last_used = ? WHERE digest = ? AND converter = ?", self._used
+                )
+            grew = bool(self._new)
+            self._new, self._used = [], []
+            if grew:
+                self.prune()
+
+    def size(self) -> tuple[int, int]:
+        """(chapters, bytes of compressed Markdown) in the store."""
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(markdown)), 0) FROM chapters"
+            ).fetchone()
+        return count, size
+
+    def prune(self, max_bytes: int | None = None) -> int:
+        """Drop least recently used chapters (and those of older converter
+        versions) until the store fits in ``max_bytes``; returns how many went."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        with self._lock, self._db:
+            removed = self._db.execute(
+                "DELETE FROM chapters WHERE converter != ?", (CONVERTER_VERSION,)
+            ).rowcount
+            total = self.size()[1]
+            if total <= max_bytes:
+                return removed
+            doomed = []
+            for digest, converter, size in self._db.execute(
+                "SELECT digest, converter, LENGTH(markdown) FROM chapters ORDER BY last_used"
+            ):
+                if total <= max_bytes:
+                    break
+                doomed.append((digest, converter))
+                total -= size
+            self._db.executemany("DELETE FROM chapters WHERE digest = ? AND converter = ?", doomed)
+        return removed + len(doomed)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
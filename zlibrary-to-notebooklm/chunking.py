@@ -0,0 +1,271 @@
+"""
+Split large Markdown files into NotebookLM-sized parts.
+
+The file is indexed once into chapters (cut before level 1-3 headings by
+default); chapters over budget are cut further at blank lines. Parts are
+then packed from those segments, fewest parts first and optionally balanced
+in size, and written by copying ranges of the file, so the parts always
+concatenate back to the original text.
+
+    parts = plan_parts(md_file, ChunkPolicy(max_words=350000, balance=True))
+    files = write_parts(md_file, parts)
+"""
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple
+
+try:
+    from .utils import _stream_cut, count_words
+except ImportError:
+    from utils import _stream_cut, count_words
+
+
+# NotebookLM CLI limit per source.
+MAX_WORDS = 350000
+
+# Characters read at a time when indexing or copying a file.
+_BLOCK_SIZE = 1 << 20
+
+
+def estimate_tokens(words: float, chars: float) -> float:
+    """Rough LLM token count: ~0.75 words or ~4 characters per token,
+    whichever gives more."""
+    return max(words * 4 / 3, chars / 4)
+
+
+@dataclass(frozen=True)
+class ChunkPolicy:
+    """How a Markdown file is split into parts.
+
+    max_words:          word budget per part
+    max_chars:          optional character budget per part
+    max_tokens:         optional budget in estimated tokens per part
+    heading_levels:     cut before headings of level 1..heading_levels
+    paragraph_fallback: cut chapters over the budget at blank lines
+                        (otherwise such a chapter becomes one oversized part)
+    target_parts:       aim for this many parts by lowering the word budget
+                        to total_words / target_parts (never above max_words)
+    balance:            keep the minimum number of parts but even out their
+                        sizes instead of filling each part to the budget
+    """
+    max_words: int = MAX_WORDS
+    max_chars: int | None = None
+    max_tokens: int | None = None
+    heading_levels: int = 3
+    paragraph_fallback: bool = True
+    target_parts: int | None = None
+    balance: bool = False
+
+    def __post_init__(self):
+        for name in ('max_words', 'max_chars', 'max_tokens', 'target_parts'):
+            value = getattr(self, name)
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1")
+        if not 1 <= self.heading_levels <= 6:
+            raise ValueError("heading_levels must be between 1 and 6")
+
+    def fits(self, words: int, chars: int) -> bool:
+        """Whether a text of this size can go up as a single part."""
+        return (
+            words <= self.max_words
+            and (self.max_chars is None or chars <= self.max_chars)
+            and (self.max_tokens is None or estimate_tokens(words, chars) <= self.max_tokens)
+        )
+
+
+class Part(NamedTuple):
+    """A character range [start, end) of a file and its word count."""
+    start: int
+    end: int
+    words: int
+
+
+@lru_cache(maxsize=None)
+def _chapter_break(heading_levels: int) -> re.Pattern:
+    return re.compile(r'\n(?=#{1,%d}\s)' % heading_levels)
+
+
+def index_chapters(file_path: Path, heading_levels: int = 3) -> list[Part]:
+    """Index the chapters of a Markdown file in one streaming pass.
+
+    A chapter runs up to and including the newline in front of the next
+    level 1..heading_levels heading, so the chapters tile the whole file.
+    Offsets count characters of the file as read in text mode.
+    """
+    chapter_break = _chapter_break(heading_levels)
+    index = []
+    start = words = 0
+    base = 0  # file offset of text[0]
+    text = ""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(_BLOCK_SIZE)
+            text += block
+            # Scan up to the last newline so no heading marker or word is
+            # cut in half; the rest waits for the next block. Without one
+            # (a file with no line breaks) there is no heading to find, so
+            # cut at a word boundary to keep the carry short; a single word
+            # longer than a block is cut at the block end (and may count
+            # as two).
+            cut = text.rfind('\n') if block else len(text)
+            if cut <= 0 and block:
+                cut = _stream_cut(text) or len(text)
+            pos = 0
+            for m in chapter_break.finditer(text):
+                if m.start() >= cut:
+                    break
+                words += count_words(text[pos:m.end()])
+                pos = m.end()
+                index.append(Part(start, base + pos, words))
+                start, words = base + pos, 0
+            words += count_words(text[pos:cut])
+            base += cut
+            text = text[cut:]
+            if not block:
+                break
+    index.append(Part(start, base, words))
+    return index
+
+
+def read_ranges(file_path: Path, ranges: list[tuple[int, int]]) -> Iterator[str]:
+    """Yield the text of each (start, end) range of file_path, in file order.
+
+    Only one range is held in memory at a time.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        pos = 0
+        for start, end in ranges:
+            f.read(start - pos)
+            yield f.read(end - start)
+            pos = end
+
+
+def split_paragraphs(text: str, offset: int = 0) -> list[Part]:
+    """Cut text after every blank line ("\\n\\n"), offsets shifted by offset."""
+    parts = []
+    pos = 0
+    while pos < len(text):
+        cut = text.find('\n\n', pos)
+        cut = len(text) if cut < 0 else cut + 2
+        parts.append(Part(offset + pos, offset + cut, count_words(text[pos:cut])))
+        pos = cut
+    return parts
+
+
+def word_budget(total_words: int, policy: ChunkPolicy) -> int:
+    """Largest number of words a part may hold under policy."""
+    if policy.target_parts:
+        return max(1, min(policy.max_words, math.ceil(total_words / policy.target_parts)))
+    return policy.max_words
+
+
+def _budgets(total_words: int, policy: ChunkPolicy) -> list[tuple[float, Callable[[Part], float]]]:
+    """(limit, measure) for every budget the policy sets."""
+    budgets = [(word_budget(total_words, policy), lambda p: p.words)]
+    if policy.max_chars is not None:
+        budgets.append((policy.max_chars, lambda p: p.end - p.start))
+    if policy.max_tokens is not None:
+        budgets.append((policy.max_tokens, lambda p: estimate_tokens(p.words, p.end - p.start)))
+    return budgets
+
+
+def _pack(sizes: list[tuple[float, ...]], limits: tuple[float, ...], max_parts: int | None = None) -> list[int] | None:
+    """Greedily pack segment sizes under limits; returns the index of the
+    first segment of each part, or None once more than max_parts are needed.
+
+    A segment too big for any part gets a part of its own.
+    """
+    starts = [0]
+    totals = [0] * len(limits)
+    for i, size in enumerate(sizes):
+        if i > starts[-1] and any(t + s > l for t, s, l in zip(totals, size, limits)):
+            starts.append(i)
+            if max_parts is not None and len(starts) > max_parts:
+                return None
+            totals = list(size)
+        else:
+            totals = [t + s for t, s in zip(totals, size)]
+    return starts
+
+
+def _balanced_limits(sizes: list[tuple[float, ...]], limits: tuple[float, ...], parts: int) -> tuple[float, ...]:
+    """Smallest scaling of limits that still packs sizes into ``parts`` parts.
+
+    Binary search on the scale (the linear-partition problem: minimize the
+    largest part over contiguous splits into a fixed number of parts).
+    """
+    lo, hi = 0.0, 1.0
+    while hi - lo > 1e-4:
+        mid = (lo + hi) / 2
+        if _pack(sizes, tuple(l * mid for l in limits), parts) is None:
+            lo = mid
+        else:
+            hi = mid
+    return tuple(l * hi for l in limits)
+
+
+def plan_parts(file_path: Path, policy: ChunkPolicy = ChunkPolicy()) -> list[Part]:
+    """Decide where file_path is cut; returns the parts in file order.
+
+    Parts are packed greedily: a segment that would push the current part
+    over a budget starts a new one, which gives the fewest parts possible.
+    With policy.balance the same number of parts is then spread as evenly
+    as the segment boundaries allow. Only a single chapter or paragraph
+    that is over budget on its own can make a part exceed it.
+    """
+    chapters = index_chapters(file_path, policy.heading_levels)
+    budgets = _budgets(sum(c.words for c in chapters), policy)
+
+    def oversized(part):
+        return any(measure(part) > limit for limit, measure in budgets)
+
+    segments = chapters
+    if policy.paragraph_fallback:
+        big = [c for c in chapters if oversized(c)]
+        if big:
+            texts = read_ranges(file_path, [(c.start, c.end) for c in big])
+            segments = []
+            for chapter in chapters:
+                if oversized(chapter):
+                    segments.extend(split_paragraphs(next(texts), chapter.start))
+                else:
+                    segments.append(chapter)
+    segments = [s for s in segments if s.end > s.start]
+    if not segments:
+        return []
+
+    limits = tuple(limit for limit, _ in budgets)
+    sizes = [tuple(measure(s) for _, measure in budgets) for s in segments]
+    starts = _pack(sizes, limits)
+    if policy.balance and len(starts) > 1:
+        starts = _pack(sizes, _balanced_limits(sizes, limits, len(starts)))
+
+    parts = []
+    for first, last in zip(starts, starts[1:] + [len(segments)]):
+        group = segments[first:last]
+        parts.append(Part(group[0].start, group[-1].end, sum(s.words for s in group)))
+    return parts
+
+
+def write_parts(file_path: Path, parts: list[Part]) -> list[Path]:
+    """Write each part of file_path to <stem>_part<N>.md next to it."""
+    part_files = [file_path.parent / f"{file_path.stem}_part{i}.md" for i in range(1, len(parts) + 1)]
+    with open(file_path, 'r', encoding='utf-8') as src:
+        pos = 0
+        for part, part_file in zip(parts, part_files):
+            src.read(part.start - pos)
+            pos = part.start
+            with open(part_file, 'w', encoding='utf-8') as dst:
+                while pos < part.end:
+                    block = src.read(min(_BLOCK_SIZE, part.end - pos))
+                    dst.write(block)
+                    pos += len(block)
+    return part_files
+
+
+def split_markdown_file(file_path: Path, policy: ChunkPolicy = ChunkPolicy()) -> list[Path]:
+    """Split file_path into parts under policy; returns the part files."""
+    return write_parts(file_path, plan_parts(file_path, policy))
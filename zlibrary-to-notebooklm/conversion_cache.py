@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed cache of EPUB -> Markdown conversions.
+
+Entries are keyed by the SHA-256 of the input file plus the converter
+version and conversion options, so a book that comes through again is
+served from disk whatever its file name. Each entry holds the Markdown, its
+stats (words, characters, chapters) and the split layouts already planned
+for it; the least recently used entries are evicted once the cache grows
+past its size limit.
+
+    cache = ConversionCache()
+    stats = cache.epub_to_markdown(epub_file, md_file)
+    parts = cache.plan_parts(stats["key"], md_file, policy)
+
+On a miss the book is converted through the cache's chapter memo, if it
+has one (see chapter_store), so only chapters never seen before are parsed.
+
+Inspect or prune it from the command line:
+
+    python3 conversion_cache.py stats
+    python3 conversion_cache.py list
+    python3 conversion_cache.py prune --max-mb 500
+    python3 conversion_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+try:
+    from .convert_epub import CONVERTER_VERSION, epub_to_markdown
+    from .chunking import ChunkPolicy, Part, plan_parts
+    from .chapter_store import DEFAULT_STORE_PATH, ChapterStore
+except ImportError:
+    from convert_epub import CONVERTER_VERSION, epub_to_markdown
+    from chunking import ChunkPolicy, Part, plan_parts
+    from chapter_store import DEFAULT_STORE_PATH, ChapterStore
+
+
+DEFAULT_CACHE_DIR = Path.home() / ".zlibrary" / "cache" / "conversions"
+DEFAULT_MAX_BYTES = 2 << 30  # 2 GiB
+
+_OUTPUT = "output.md"
+_META = "meta.json"
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(file_hash: str, options: dict | None = None) -> str:
+    """Cache key for an input file hash and the options that shape the output.
+
+    The parser backend and worker count are not options in this sense: every
+    backend and any number of workers produce the same Markdown.
+    """
+    spec = json.dumps(
+        {"sha256": file_hash, "converter": CONVERTER_VERSION, "options": options or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+
+def policy_key(policy: ChunkPolicy) -> str:
+    """Stable string naming a split policy inside a cache entry."""
+    return json.dumps(asdict(policy), sort_keys=True)
+
+
+class ConversionCache:
+    """On-disk conversion cache under ``cache_dir``, at most ``max_bytes`` big.
+
+    Every entry is a directory ``<key[:2]>/<key>/`` holding the Markdown
+    and a meta.json; the meta.json mtime records when the entry was last
+    used. Entries are written to a temporary directory and renamed into
+    place, so concurrent runs never see a half-written entry.
+
+    ``chapters`` is an optional ChapterStore used for conversions on a miss.
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 chapters: ChapterStore | None = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.chapters = chapters
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def lookup(self, key: str) -> dict | None:
+        """Metadata of the entry for ``key`` (marking it as used), or None."""
+        meta_file = self._entry(key) / _META
+        try:
+            meta = json.loads(meta_file.read_text(encoding='utf-8'))
+            os.utime(meta_file)
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def epub_to_markdown(self, epub_path, output_path, workers=1, parser=None, options=None):
+        """convert_epub.epub_to_markdown, served from the cache when possible.
+
+        Returns the same stats dict, plus the entry ``key`` and whether the
+        result was ``cached``, or None if the conversion failed.
+        """
+        key = cache_key(file_sha256(epub_path), options)
+        output_path = Path(str(output_path).replace('.txt', '.md'))
+
+        meta = self.lookup(key)
+        if meta is not None:
+            try:
+                shutil.copyfile(self._entry(key) / _OUTPUT, output_path)
+            except FileNotFoundError:
+                meta = None  # evicted by another process meanwhile
+        if meta is not None:
+            print(f"⚡ Cache hit: {epub_path} ({meta['words']:,} words)")
+            return {
+                "output_path": output_path,
+                "words": meta["words"],
+                "characters": meta["characters"],
+                "chapters": meta["chapters"],
+                "key": key,
+                "cached": True,
+            }
+
+        stats = epub_to_markdown(epub_path, output_path, workers=workers, parser=parser, memo=self.chapters)
+        if stats:
+            self.store(key, stats, source=Path(epub_path).name)
+            stats.update(key=key, cached=False)
+        return stats
+
+    def store(self, key: str, stats: dict, source: str = "") -> None:
+        """Add the conversion described by ``stats`` under ``key``."""
+        entry = self._entry(key)
+        if entry.exists():
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=entry.parent))
+        try:
+            shutil.copyfile(stats["output_path"], tmp / _OUTPUT)
+            meta = {
+                "source": source,
+                "converter": CONVERTER_VERSION,
+                "words": stats["words"],
+                "characters": stats["characters"],
+                "chapters": stats["chapters"],
+                "size": (tmp / _OUTPUT).stat().st_size,
+                "created": time.time(),
+                "parts": {},
+            }
+            (tmp / _META).write_text(json.dumps(meta), encoding='utf-8')
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # lost a race, or disk trouble
+            return
+        self.prune()
+
+    def plan_parts(self, key: str, file_path: Path, policy: ChunkPolicy = ChunkPolicy()) -> list[Part]:
+        """chunking.plan_parts for the entry ``key``, using its stored layout
+        for this policy when there is one and storing it otherwise."""
+        meta = self.lookup(key)
+        name = policy_key(policy)
+        if meta is not None and name in meta["parts"]:
+            return [Part(*part) for part in meta["parts"][name]]
+
+        parts = plan_parts(file_path, policy)
+        if meta is not None:
+            meta["parts"][name] = [list(part) for part in parts]
+            meta_file = self._entry(key) / _META
+            tmp = meta_file.with_name(f".{_META}.{os.getpid()}")
+            try:
+                tmp.write_text(json.dumps(meta), encoding='utf-8')
+                os.replace(tmp, meta_file)
+            except OSError:
+                pass
+        return parts
+
+    def entries(self) -> list[dict]:
+        """All entries, least recently used first."""
+        entries = []
+        for meta_file in self.cache_dir.glob(f"??/*/{_META}"):
+            if meta_file.parent.name.startswith('.'):
+                continue  # still being written
+            try:
+                meta = json.loads(meta_file.read_text(encoding='utf-8'))
+                meta["key"] = meta_file.parent.name
+                meta["last_used"] = meta_file.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append(meta)
+        entries.sort(key=lambda e: e["last_used"])
+        return entries
+
+    def remove(self, key: str) -> None:
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def prune(self, max_bytes: int | None = None) -> int:
+        """Evict least recently used entries until the cache fits in
+        ``max_bytes`` (default: the cache's limit); returns how many went."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.entries()
+        total = sum(e["size"] for e in entries)
+        removed = 0
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            self.remove(entry["key"])
+            total -= entry["size"]
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Remove every entry; returns how many there were."""
+        return self.prune(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the EPUB conversion cache")
+    parser.add_argument("--dir", type=Path, default=DEFAULT_CACHE_DIR, help="cache directory")
+    parser.add_argument("--chapters", type=Path, default=DEFAULT_STORE_PATH, help="chapter memo database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show entry count and size")
+    commands.add_parser("list", help="list entries, least recently used first")
+    prune = commands.add_parser("prune", help="evict least recently used entries")
+    prune.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                       help="size to shrink the cache to, in MiB")
+    prune.add_argument("--chapters-mb", type=float,
+                       help="size to shrink the chapter memo to, in MiB")
+    commands.add_parser("clear", help="remove every entry")
+    args = parser.parse_args()
+
+    cache = ConversionCache(args.dir, chapters=ChapterStore(args.chapters))
+    if args.command == "stats":
+        entries = cache.entries()
+        total = sum(e["size"] for e in entries)
+        chapters, chapter_bytes = cache.chapters.size()
+        print(f"📁 Cache: {cache.cache_dir}")
+        print(f"📚 Entries: {len(entries)}")
+        print(f"💾 Size: {total / (1 << 20):.1f} MiB (limit {cache.max_bytes / (1 << 20):.0f} MiB)")
+        print(f"📄 Chapter memo: {chapters:,} chapters, {chapter_bytes / (1 << 20):.1f} MiB "
+              f"(limit {cache.chapters.max_bytes / (1 << 20):.0f} MiB)")
+    elif args.command == "list":
+        for e in cache.entries():
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(e["last_used"]))
+            print(f"{e['key'][:12]}  {used}  {e['size'] / (1 << 20):7.1f} MiB  "
+                  f"{e['words']:>9,} words  {len(e['parts'])} layouts  {e['source']}")
+    elif args.command == "prune":
+        removed = cache.prune(int(args.max_mb * (1 << 20)))
+        print(f"🧹 Removed {removed} entries")
+        if args.chapters_mb is not None:
+            removed = cache.chapters.prune(int(args.chapters_mb * (1 << 20)))
+            print(f"🧹 Removed {removed} memoized chapters")
+    elif args.command == "clear":
+        print(f"🧹 Removed {cache.clear()} entries")
+        print(f"🧹 Removed {cache.chapters.prune(0)} memoized chapters")
+    cache.chapters.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,195 +1,383 @@
 #!/usr/bin/env python3
 """
 Convert EPUB to Markdown for NotebookLM upload.
-Uses BeautifulSoup for robust HTML parsing.
+Uses lxml for well-formed XHTML when installed, BeautifulSoup otherwise.
+Chapters are read in spine order by epub_reader, which never inflates
+images, fonts or other non-text assets.
 """
+import argparse
+import os
 import sys
 import re
-from ebooklib import epub
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from bs4 import BeautifulSoup
 
-
-def html_to_markdown(soup):
-    """Convert BeautifulSoup object to Markdown."""
-    markdown_parts = []
-
-    def process_element(element):
-        """Recursively process HTML elements."""
-        if element.name is None:
-            # Text node
-            text = str(element).strip()
-            if text:
-                return text
-            return ""
-
-        # Skip certain tags
-        if element.name in ['script', 'style', 'nav', 'footer', 'svg']:
-            return ""
-
-        # Headings
-        if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            level = int(element.name[1])
-            text = element.get_text().strip()
-            if text:
-                return f"\n\n{'#' * level} {text}\n\n"
-            return ""
-
-        # Paragraphs
-        if element.name == 'p':
-            text = element.get_text().strip()
+try:
+    from .epub_reader import EpubReader
+    from .html_parsers import backend_chain, backend_name, feed_soup
+    from .utils import count_words
+except ImportError:
+    from epub_reader import EpubReader
+    from html_parsers import backend_chain, backend_name, feed_soup
+    from utils import count_words
+
+
+# Bump whenever a change alters the Markdown produced for the same EPUB, so
+# cached conversions (see conversion_cache) are not reused across versions.
+CONVERTER_VERSION = 2
+
+CHAPTER_SEPARATOR = "\n\n---\n\n"
+
+# Tags whose whole subtree is dropped from the output.
+SKIP_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'svg'])
+
+HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+
+# Inline tags rendered as a single run of text wrapped in Markdown markers.
+INLINE_MARKERS = {
+    'b': '**',
+    'strong': '**',
+    'i': '*',
+    'em': '*',
+    'code': '`',
+}
+
+_NEWLINE_RUN = re.compile(r'\n{4,}')
+_SPACE_RUN = re.compile(r' +')
+
+# Builder modes
+_FLOW = 0      # walking ordinary container elements
+_SKIP = 1      # inside a SKIP_TAGS element
+_CAPTURE = 2   # collecting the text of a heading/paragraph/inline/link/br
+_LIST = 3      # inside <ul>/<ol>, collecting the text of direct <li> children
+
+
+def _normalize_whitespace(text):
+    """Collapse 4+ newlines to 3 and runs of spaces to one."""
+    if '\n\n\n\n' in text:
+        text = _NEWLINE_RUN.sub('\n\n\n', text)
+    if '  ' in text:
+        text = _SPACE_RUN.sub(' ', text)
+    return text
+
+
+class MarkdownBuffer:
+    """Collect Markdown fragments, normalizing whitespace as they arrive.
+
+    Trailing whitespace of each fragment is held back until the next
+    non-blank fragment shows up, so runs that straddle fragment boundaries
+    collapse exactly as if the whole document were normalized at once, and
+    the final result comes out stripped.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._pending = ""
+
+    def write(self, fragment):
+        text = self._pending + fragment
+        body = text.rstrip()
+        tail = text[len(body):]
+        if not self._parts:
+            # Nothing written yet: leading whitespace is stripped away.
+            body = body.lstrip()
+            if not body:
+                self._pending = ""
+                return
+        self._pending = _normalize_whitespace(tail)
+        if body:
+            self._parts.append(_normalize_whitespace(body))
+
+    def getvalue(self):
+        return "".join(self._parts)
+
+
+class MarkdownBuilder:
+    """Turn a stream of start/end/data events into Markdown.
+
+    The events follow lxml's parser-target protocol (``start(tag, attrs)``,
+    ``end(tag)``, ``data(text)``, ``close()``), with an extra ``is_text``
+    flag on ``data`` telling whether the string would show up in
+    ``get_text()``.  Nothing is recursive, so arbitrarily deep markup is
+    fine, and every node is visited exactly once.
+    """
+
+    def __init__(self):
+        self._out = MarkdownBuffer()
+        self._mode = _FLOW
+        self._depth = 0      # open elements below the current skip/capture/list element
+        self._tag = None
+        self._href = ''
+        self._text = []
+        self._items = []
+        self._item = None    # text of the <li> being collected, if any
+
+    def start(self, tag, attrs):
+        if self._mode != _FLOW:
+            self._depth += 1
+            if self._mode == _LIST and self._depth == 1 and tag == 'li':
+                self._item = []
+            return
+
+        if tag in SKIP_TAGS:
+            self._mode = _SKIP
+        elif tag in HEADING_TAGS or tag in INLINE_MARKERS or tag in ('p', 'a', 'br'):
+            self._mode = _CAPTURE
+            self._href = attrs.get('href', '') if tag == 'a' else ''
+            self._text = []
+        elif tag in ('ul', 'ol'):
+            self._mode = _LIST
+            self._items = []
+            self._item = None
+        else:
+            return
+        self._tag = tag
+        self._depth = 0
+
+    def end(self, tag):
+        if self._mode == _FLOW:
+            return
+        if self._depth:
+            self._depth -= 1
+            if self._mode == _LIST and self._depth == 0 and self._item is not None:
+                self._items.append("".join(self._item).strip())
+                self._item = None
+            return
+
+        if self._mode == _CAPTURE:
+            self._emit_capture()
+        elif self._mode == _LIST:
+            self._emit_list()
+        self._mode = _FLOW
+        self._tag = None
+
+    def data(self, text, is_text=True):
+        if self._mode == _FLOW:
+            text = text.strip()
             if text:
-                return f"\n\n{text}\n\n"
-            return ""
-
-        # Bold
-        if element.name in ['b', 'strong']:
-            text = element.get_text().strip()
-            if text:
-                return f"**{text}**"
-            return ""
-
-        # Italic
-        if element.name in ['i', 'em']:
-            text = element.get_text().strip()
+                self._out.write(text)
+        elif not is_text:
+            return
+        elif self._mode == _CAPTURE:
+            self._text.append(text)
+        elif self._mode == _LIST and self._item is not None:
+            self._item.append(text)
+
+    def close(self):
+        return self._out.getvalue()
+
+    def _emit_capture(self):
+        tag = self._tag
+        if tag == 'br':
+            self._out.write("\n")
+            return
+
+        text = "".join(self._text).strip()
+        self._text = []
+        if tag == 'a':
+            if self._href and text:
+                text = f"[{text}]({self._href})"
+        elif not text:
+            return
+        elif tag in HEADING_TAGS:
+            text = f"\n\n{'#' * int(tag[1])} {text}\n\n"
+        elif tag == 'p':
+            text = f"\n\n{text}\n\n"
+        else:
+            marker = INLINE_MARKERS[tag]
+            text = f"{marker}{text}{marker}"
+        if text:
+            self._out.write(text)
+
+    def _emit_list(self):
+        lines = ["\n\n"]
+        for i, text in enumerate(self._items, 1):
             if text:
-                return f"*{text}*"
-            return ""
+                prefix = "-" if self._tag == 'ul' else f"{i}."
+                lines.append(f"{prefix} {text}\n")
+        lines.append("\n")
+        self._items = []
+        self._out.write("".join(lines))
 
-        # Code
-        if element.name == 'code':
-            text = element.get_text().strip()
-            if text:
-                return f"`{text}`"
-            return ""
-
-        # Links
-        if element.name == 'a':
-            href = element.get('href', '')
-            text = element.get_text().strip()
-            if href and text:
-                return f"[{text}]({href})"
-            return element.get_text().strip()
-
-        # Lists
-        if element.name == 'ul':
-            items = element.find_all('li', recursive=False)
-            result = "\n\n"
-            for li in items:
-                text = li.get_text().strip()
-                if text:
-                    result += f"- {text}\n"
-            return result + "\n"
-
-        if element.name == 'ol':
-            items = element.find_all('li', recursive=False)
-            result = "\n\n"
-            for i, li in enumerate(items, 1):
-                text = li.get_text().strip()
-                if text:
-                    result += f"{i}. {text}\n"
-            return result + "\n"
-
-        # Line breaks
-        if element.name == 'br':
-            return "\n"
-
-        # Default: process children and concatenate
-        if element.contents:
-            result = ""
-            for child in element.contents:
-                result += process_element(child)
-            return result
-
-        return ""
 
+def html_to_markdown(soup):
+    """Convert BeautifulSoup object to Markdown."""
     # Process body content
     body = soup.find('body')
-    if body:
-        markdown = process_element(body)
-    else:
-        markdown = process_element(soup)
+    builder = MarkdownBuilder()
+    feed_soup(body if body else soup, builder)
+    return builder.close()
 
-    # Clean up whitespace
-    markdown = re.sub(r'\n{4,}', '\n\n\n', markdown)
-    markdown = re.sub(r' +', ' ', markdown)
-    markdown = markdown.strip()
 
-    return markdown
+def chapter_to_markdown(content, parser=None):
+    """Convert one XHTML document (raw bytes) to Markdown.
 
+    ``parser`` names the HTML parser backend (see html_parsers); by default
+    the fastest installed one is used, falling back to html.parser for
+    documents it cannot handle exactly.
+    """
+    for parse in backend_chain(parser):
+        markdown = parse(content, MarkdownBuilder())
+        if markdown is not None:
+            return markdown
 
-def epub_to_markdown(epub_path, output_path):
-    """Convert EPUB to Markdown file."""
-    print(f"📖 Reading EPUB: {epub_path}")
 
+def _chapter_result(content, parser=None):
+    """Convert one chapter, returning (markdown, words, error)."""
     try:
-        book = epub.read_epub(epub_path)
+        markdown = chapter_to_markdown(content, parser)
+        return markdown, count_words(markdown), None
+    except Exception as e:
+        return None, 0, e
+
+
+def convert_chapters(contents, workers=1, parser=None, memo=None):
+    """Yield (markdown, words, error) for each document in ``contents``, in order.
+
+    With ``workers`` > 1 the documents are converted in a process pool; at
+    most ``2 * workers`` of them are in flight at once so memory stays
+    bounded, and results are still yielded in the original order.
+    ``workers`` = 0 uses one process per CPU.
+
+    ``memo`` (a chapter_store.ChapterStore) is checked before converting a
+    document and given every new conversion, so unchanged chapters are
+    never parsed twice.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+
+    def remembered(content):
+        """(digest, memoized result or None) for a document."""
+        if memo is None:
+            return None, None
+        digest = memo.digest(content)
+        hit = memo.get(digest)
+        return digest, (hit[0], hit[1], None) if hit is not None else None
+
+    def remember(digest, result):
+        if digest is not None and result[2] is None:
+            memo.put(digest, result[0], result[1])
+        return result
+
+    if workers <= 1:
+        for content in contents:
+            digest, result = remembered(content)
+            yield result or remember(digest, _chapter_result(content, parser))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for content in contents:
+            digest, result = remembered(content)
+            pending.append((digest, result or pool.submit(_chapter_result, content, parser)))
+            if len(pending) >= 2 * workers:
+                digest, result = pending.popleft()
+                yield result if isinstance(result, tuple) else remember(digest, result.result())
+        while pending:
+            digest, result = pending.popleft()
+            yield result if isinstance(result, tuple) else remember(digest, result.result())
+
+
+def epub_to_markdown(epub_path, output_path, workers=1, parser=None, memo=None):
+    """Convert EPUB to Markdown file.
+
+    Chapters are written to the output file as soon as they are converted,
+    so only one chapter is held in memory at a time. ``workers`` > 1
+    converts chapters in parallel (see convert_chapters) and ``parser``
+    picks the HTML parser backend (see chapter_to_markdown). With a
+    ``memo`` (chapter_store.ChapterStore) chapters converted before are
+    reused instead of parsed. Returns a dict with the output path and the
+    running totals (words, characters, chapters), or None if the
+    conversion failed.
+    """
+    print(f"📖 Reading EPUB: {epub_path}")
 
-        # Get metadata
-        title = book.get_metadata('DC', 'title')[0][0] if book.get_metadata('DC', 'title') else "Unknown Title"
-        author = book.get_metadata('DC', 'creator')[0][0] if book.get_metadata('DC', 'creator') else "Unknown Author"
+    try:
+        chain = backend_chain(parser)  # reject an unknown parser name up front
+        print(f"🔧 HTML parser: {' → '.join(map(backend_name, chain))}")
+        book = EpubReader(epub_path)
+        title, author = book.title, book.author
 
         print(f"📚 Title: {title}")
         print(f"✍️  Author: {author}")
         print(f"📄 Processing chapters...")
+        for href in book.missing:
+            print(f"⚠️  Missing from archive: {href}")
 
-        # Start markdown with metadata
-        markdown_content = f"# {title}\n\n"
-        markdown_content += f"**Author:** {author}\n\n"
-        markdown_content += "---\n\n"
-
-        # Extract content from all items
-        chapter_count = 0
-        for item in book.get_items():
-            if item.get_type() == 9:  # ITEM_DOCUMENT = 9
-                try:
-                    content = item.get_content().decode('utf-8')
-
-                    # Parse HTML with BeautifulSoup
-                    soup = BeautifulSoup(content, 'html.parser')
-                    chapter_md = html_to_markdown(soup)
-
-                    # Only add substantial content
-                    if len(chapter_md.strip()) > 100:
-                        markdown_content += chapter_md
-                        markdown_content += "\n\n---\n\n"
-                        chapter_count += 1
-
-                except Exception as e:
-                    print(f"⚠️  Error processing item: {e}")
-                    continue
+        if memo is not None:
+            memo_hits, memo_misses = memo.hits, memo.misses
 
-        # Write to file
         output_path = str(output_path).replace('.txt', '.md')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
+        stats = {
+            "output_path": Path(output_path),
+            "words": 0,
+            "characters": 0,
+            "chapters": 0,
+        }
+
+        with book, open(output_path, 'w', encoding='utf-8') as f:
+            def write(text, words=None):
+                f.write(text)
+                stats["words"] += count_words(text) if words is None else words
+                stats["characters"] += len(text)
+
+            # Start markdown with metadata
+            write(f"# {title}\n\n**Author:** {author}\n\n---\n\n")
+
+            # Documents in reading order, inflated one at a time
+            documents = (content for _, content in book.documents())
+            for chapter_md, words, error in convert_chapters(documents, workers, parser, memo):
+                if error is not None:
+                    print(f"⚠️  Error processing item: {error}")
+                    continue
+
+                # Only add substantial content
+                if len(chapter_md.strip()) > 100:
+                    write(chapter_md, words)
+                    write(CHAPTER_SEPARATOR)
+                    stats["chapters"] += 1
 
-        file_size = len(markdown_content)
         print(f"\n✅ Conversion successful!")
         print(f"📁 Output: {output_path}")
-        print(f"📊 Characters: {file_size:,}")
-        print(f"📖 Chapters: {chapter_count}")
+        print(f"📊 Characters: {stats['characters']:,}")
+        print(f"📖 Chapters: {stats['chapters']}")
+        if memo is not None:
+            memo.flush()
+            print(f"♻️  Chapters reused: {memo.hits - memo_hits}, converted: {memo.misses - memo_misses}")
         print(f"📝 Format: Markdown")
 
-        return True
+        return stats
 
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 convert_epub.py <epub_file> [output_md]")
-        sys.exit(1)
-
-    epub_file = sys.argv[1]
-    if len(sys.argv) >= 3:
-        md_file = sys.argv[2]
-    else:
-        md_file = Path(epub_file).stem + ".md"
-
-    success = epub_to_markdown(epub_file, md_file)
+    parser = argparse.ArgumentParser(description="Convert EPUB to Markdown")
+    parser.add_argument("epub_file")
+    parser.add_argument("output_md", nargs="?")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="processes used to convert chapters (0 = one per CPU)")
+    parser.add_argument("--parser", default="auto",
+                        help="HTML parser backend: auto, lxml or html.parser")
+    parser.add_argument("--memo", type=Path,
+                        help="SQLite chapter memo to reuse converted chapters from (see chapter_store)")
+    args = parser.parse_args()
+
+    md_file = args.output_md or Path(args.epub_file).stem + ".md"
+
+    memo = None
+    if args.memo:
+        try:
+            from .chapter_store import ChapterStore
+        except ImportError:
+            from chapter_store import ChapterStore
+        memo = ChapterStore(args.memo)
+    success = epub_to_markdown(args.epub_file, md_file, workers=args.workers, parser=args.parser, memo=memo)
+    if memo is not None:
+        memo.close()
     sys.exit(0 if success else 1)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Extract the text of a PDF page by page for NotebookLM upload.
+
+Pages are read with pypdf (see requirements.txt) in ranges of a few
+pages, each by a fresh reader; with workers > 1 the ranges are extracted
+in a process pool with only a few in flight at a time. Memory therefore
+depends on the range and pool size, not on the length of the PDF.
+The text goes to a Markdown file with the same layout as the EPUB
+converter's, so it is counted and split by the same code (see chunking).
+
+A PDF can also be split as a PDF (split_pdf): pages are packed into
+page-range parts under a word and/or byte budget, and each part is
+written by a fresh reader that copies only that range's objects.
+"""
+import argparse
+import gc
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+try:
+    from pypdf import PageObject, PdfReader, PdfWriter
+    from pypdf.generic import IndirectObject, NameObject
+except ImportError:
+    PdfReader = PdfWriter = None
+
+try:
+    from .utils import count_words
+except ImportError:
+    from utils import count_words
+
+
+# Pages read per range (one reader, and one pool task, per range); only
+# 2 * workers tasks are in flight.
+PAGES_PER_TASK = 64
+
+# Opening a reader costs time in proportion to the whole document, so a
+# long PDF gets longer ranges rather than more than this many.
+MAX_RANGES = 64
+
+# Generous upper bound on the words on one page: a PDF with no more than
+# budget / MAX_WORDS_PER_PAGE pages cannot be over a word budget, so its
+# text need not be extracted to find out.
+MAX_WORDS_PER_PAGE = 2000
+
+# Page attributes a page inherits from its ancestors in the page tree.
+_INHERITED = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+# NotebookLM limit per uploaded file.
+MAX_SOURCE_BYTES = 200 * 1024 * 1024
+
+# Blank line between pages, so the paragraph fallback of chunking can cut
+# a heading-less PDF at page boundaries.
+PAGE_SEPARATOR = "\n\n"
+
+_TRAILING_SPACE = re.compile(r'[ \t]+\n')
+_NEWLINE_RUN = re.compile(r'\n{3,}')
+
+
+# Readers are always given an open file: from a path pypdf reads the whole
+# document into memory, from a file object it seeks to each object lazily.
+
+def _require_pypdf():
+    if PdfReader is None:
+        raise ImportError("PDF text extraction needs pypdf: pip install pypdf")
+
+
+def _clean(text: str) -> str:
+    """Strip trailing spaces and collapse runs of blank lines."""
+    text = _TRAILING_SPACE.sub('\n', text.replace('\r\n', '\n'))
+    return _NEWLINE_RUN.sub('\n\n', text).strip()
+
+
+def _page_text(page) -> tuple[str, int]:
+    """Text and word count of one page; an unreadable page comes back empty."""
+    try:
+        text = _clean(page.extract_text() or "")
+    except Exception:
+        text = ""
+    return text, count_words(text)
+
+
+def _page_range(reader, start: int, end: int) -> list:
+    """The pages [start, end) of reader.
+
+    reader.pages loads every page object of the document; this walks the
+    page tree by /Count and loads only the nodes above the wanted pages.
+    A tree whose counts do not add up goes through reader.pages instead.
+    """
+    pages = []
+
+    def visit(node, ref, inherited, first):
+        if '/Kids' in node:
+            inherited = {**inherited, **{NameObject(k): node[k] for k in _INHERITED if k in node}}
+            kids = node['/Kids']
+            if int(node.get('/Count', -1)) == len(kids):
+                # One page per kid (a flat tree): index the wanted ones directly
+                for i in range(max(start - first, 0), min(end - first, len(kids))):
+                    visit(kids[i].get_object(), kids[i], inherited, first + i)
+                return
+            for kid in kids:
+                if first >= end:
+                    break
+                kid_node = kid.get_object()
+                count = int(kid_node['/Count']) if '/Kids' in kid_node else 1
+                if first + count > start:
+                    visit(kid_node, kid, inherited, first)
+                first += count
+        elif start <= first < end:
+            page = PageObject(reader, ref if isinstance(ref, IndirectObject) else None)
+            page.update(node)
+            for key, value in inherited.items():
+                if key not in page:
+                    page[key] = value
+            pages.append(page)
+
+    try:
+        visit(reader.trailer['/Root']['/Pages'].get_object(), None, {}, 0)
+    except Exception:
+        pages = None
+    if pages is None or len(pages) != end - start:
+        pages = [reader.pages[i] for i in range(start, end)]
+    return pages
+
+
+def _extract_range(pdf_path: str, start: int, end: int) -> list[tuple[str, int]]:
+    """(text, words) of pages [start, end).
+
+    A fresh reader is opened for every range (as in write_page_range):
+    pypdf keeps every object it resolves, so one reader kept across ranges
+    would grow with the document.
+    """
+    with open(pdf_path, 'rb') as f:
+        pages = [_page_text(page) for page in _page_range(PdfReader(f), start, end)]
+    # pypdf objects point back at their reader, so only the cycle collector
+    # frees it; run it now rather than letting several readers pile up
+    gc.collect()
+    return pages
+
+
+def page_count(pdf_path) -> int:
+    _require_pypdf()
+    with open(pdf_path, 'rb') as f:
+        return len(PdfReader(f).pages)
+
+
+def iter_pdf_pages(pdf_path, workers=1, pages_per_task=PAGES_PER_TASK) -> Iterator[tuple[str, int]]:
+    """Yield (text, words) for each page of ``pdf_path``, in order.
+
+    Pages are read in ranges of ``pages_per_task`` (more for PDFs of over
+    MAX_RANGES ranges), each by its own reader.
+    With ``workers`` > 1 the ranges are extracted in a process pool, at
+    most ``2 * workers`` at once; ``workers`` = 0 uses one process per CPU.
+    Pages without a text layer (scans) yield empty text.
+    """
+    _require_pypdf()
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    pdf_path = str(pdf_path)
+    pages = page_count(pdf_path)
+    pages_per_task = max(pages_per_task, -(-pages // MAX_RANGES))
+    ranges = ((start, min(start + pages_per_task, pages)) for start in range(0, pages, pages_per_task))
+
+    if workers <= 1 or pages <= pages_per_task:
+        for start, end in ranges:
+            yield from _extract_range(pdf_path, start, end)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.submit(_extract_range, pdf_path, start, end))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def pdf_metadata(pdf_path) -> tuple[str, str]:
+    """(title, author) from the PDF's document info, falling back to the file name."""
+    _require_pypdf()
+    with open(pdf_path, 'rb') as f:
+        info = PdfReader(f).metadata or {}
+    title = (info.get('/Title') or "").strip() or Path(pdf_path).stem
+    author = (info.get('/Author') or "").strip() or "Unknown Author"
+    return title, author
+
+
+def pdf_to_markdown(pdf_path, output_path, workers=1):
+    """Extract a PDF's text to a Markdown file.
+
+    Pages are written as soon as they are extracted (see iter_pdf_pages).
+    Returns a dict with the output path and the running totals (words,
+    characters, pages, empty_pages), or None if the extraction failed.
+    """
+    print(f"📖 Reading PDF: {pdf_path}")
+
+    try:
+        title, author = pdf_metadata(pdf_path)
+        print(f"📚 Title: {title}")
+        print(f"✍️  Author: {author}")
+        print("📄 Extracting pages...")
+
+        stats = {
+            "output_path": Path(output_path),
+            "words": 0,
+            "characters": 0,
+            "pages": 0,
+            "empty_pages": 0,
+        }
+
+        with open(output_path, 'w', encoding='utf-8') as f:
+            def write(text, words=None):
+                f.write(text)
+                stats["words"] += count_words(text) if words is None else words
+                stats["characters"] += len(text)
+
+            write(f"# {title}\n\n**Author:** {author}\n\n---\n\n")
+            for text, words in iter_pdf_pages(pdf_path, workers):
+                stats["pages"] += 1
+                if not text:
+                    stats["empty_pages"] += 1
+                    continue
+                write(text, words)
+                write(PAGE_SEPARATOR)
+
+        print("\n✅ Extraction successful!")
+        print(f"📁 Output: {output_path}")
+        print(f"📊 Characters: {stats['characters']:,}")
+        print(f"📖 Pages: {stats['pages']}")
+        if stats["empty_pages"]:
+            print(f"⚠️  Pages without text (scanned?): {stats['empty_pages']}")
+        print("📝 Format: Markdown")
+
+        return stats
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def plan_page_ranges(page_words: list[int], page_bytes: float, max_words: int | None = None,
+                     max_bytes: int | None = None) -> list[tuple[int, int]]:
+    """Pack pages, in order, into ranges [start, end) under the budgets.
+
+    A page starts a new range when adding it would push the current one
+    over max_words or max_bytes (every page is taken to weigh page_bytes);
+    only a single page over budget on its own can make a range exceed it.
+    """
+    ranges = []
+    start = words = size = 0
+    for i, page in enumerate(page_words):
+        over = ((max_words is not None and words + page > max_words)
+                or (max_bytes is not None and size + page_bytes > max_bytes))
+        if over and i > start:
+            ranges.append((start, i))
+            start, words, size = i, 0, 0
+        words += page
+        size += page_bytes
+    if len(page_words) > start:
+        ranges.append((start, len(page_words)))
+    return ranges
+
+
+def write_page_range(pdf_path, start: int, end: int, output_path) -> Path:
+    """Write pages [start, end) of pdf_path to output_path.
+
+    A fresh reader is opened for every range, so the objects it loads
+    (page content, images, fonts) are only those of this range and are
+    dropped once the part is written.
+    """
+    _require_pypdf()
+    with open(pdf_path, 'rb') as src, open(output_path, 'wb') as dst:
+        reader = PdfReader(src)
+        writer = PdfWriter()
+        for i in range(start, end):
+            writer.add_page(reader.pages[i])
+        writer.write(dst)
+    return Path(output_path)
+
+
+def split_pdf(pdf_path, output_dir=None, max_words: int | None = None,
+              max_bytes: int | None = MAX_SOURCE_BYTES, workers=1) -> list[Path]:
+    """Split a PDF into page-range parts ``<stem>_part<N>.pdf``.
+
+    Page word counts come from iter_pdf_pages (``workers`` processes), and
+    only when the PDF has enough pages to exceed max_words at all; page
+    sizes are estimated as an even share of the file. A written part that
+    still comes out over max_bytes is halved and written again. Returns
+    ``[pdf_path]`` when the whole PDF is within the budgets.
+    """
+    _require_pypdf()
+    pdf_path = Path(pdf_path)
+    output_dir = Path(output_dir or pdf_path.parent)
+    file_bytes = pdf_path.stat().st_size
+    pages = page_count(pdf_path)
+
+    if max_words is None or pages * MAX_WORDS_PER_PAGE <= max_words:
+        page_words = [0] * pages
+    else:
+        page_words = [words for _, words in iter_pdf_pages(pdf_path, workers)]
+    if ((max_words is None or sum(page_words) <= max_words)
+            and (max_bytes is None or file_bytes <= max_bytes)):
+        return [pdf_path]
+
+    pending = deque(plan_page_ranges(page_words, file_bytes / max(pages, 1), max_words, max_bytes))
+    written = []
+    while pending:
+        start, end = pending.popleft()
+        part = write_page_range(pdf_path, start, end, output_dir / f".{pdf_path.stem}_{start}-{end}.pdf")
+        if max_bytes is not None and part.stat().st_size > max_bytes and end - start > 1:
+            part.unlink()
+            mid = (start + end) // 2
+            pending.extendleft([(mid, end), (start, mid)])
+            continue
+        written.append(part)
+
+    parts = []
+    for i, part in enumerate(written, 1):
+        parts.append(part.replace(output_dir / f"{pdf_path.stem}_part{i}.pdf"))
+    return parts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract PDF text to Markdown, or split a PDF into parts")
+    parser.add_argument("pdf_file")
+    parser.add_argument("output_md", nargs="?")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="processes used to extract pages (0 = one per CPU)")
+    parser.add_argument("--split", action="store_true",
+                        help="split into <stem>_part<N>.pdf page ranges instead of extracting text")
+    parser.add_argument("--max-words", type=int, help="word budget per part (with --split)")
+    parser.add_argument("--max-mb", type=float, default=MAX_SOURCE_BYTES / 2**20,
+                        help="size budget per part in MiB (with --split)")
+    args = parser.parse_args()
+
+    if args.split:
+        parts = split_pdf(args.pdf_file, max_words=args.max_words, max_bytes=int(args.max_mb * 2**20),
+                          workers=args.workers)
+        for part in parts:
+            print(f" - {part} ({part.stat().st_size / 2**20:.1f} MiB)")
+        sys.exit(0)
+
+    md_file = args.output_md or Path(args.pdf_file).stem + ".md"
+    success = pdf_to_markdown(args.pdf_file, md_file, workers=args.workers)
+    sys.exit(0 if success else 1)
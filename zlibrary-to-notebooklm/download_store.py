@@ -0,0 +1,170 @@
+"""
+Content-addressed store for downloaded books.
+
+Every download is written to a private temp file inside the store while
+its SHA-256 is computed, then moved to ``<root>/<sha[:2]>/<sha>/<name>``.
+The file keeps its server-suggested name (notebook titles are derived
+from it), but two different books never share a path and concurrent
+downloads never overwrite each other. Downloading bytes the store
+already holds drops the new copy and returns the existing file.
+
+Converted Markdown and split parts go to the entry's ``work`` directory
+(see work_dir), so they are unique per book as well. Each conversion
+writes into its own staging directory there and moves the finished files
+into place with os.replace (see staging_dir), so two processes converting
+the same book never see each other's half-written files.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    from .conversion_cache import file_sha256
+except ImportError:
+    from conversion_cache import file_sha256
+
+
+DEFAULT_STORE_DIR = Path.home() / ".zlibrary" / "downloads"
+_TMP = "tmp"
+_WORK = "work"
+_STAGING = ".staging-"
+
+
+def _safe_name(name: str, sha256: str) -> str:
+    """The last component of a server-suggested name, or a hash-based name
+    when that is empty, ``.``/``..`` or the work directory's name."""
+    base = Path(name.replace('\\', '/').replace('\0', '')).name if name else ""
+    if base in ("", ".", "..", _WORK):
+        return f"{sha256[:16]}{Path(base).suffix}"
+    return base
+
+
+class IncomingFile:
+    """A temp file in the store that hashes bytes as they are written."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+
+class DownloadStore:
+    """Downloaded books keyed by content hash."""
+
+    def __init__(self, root: Path = DEFAULT_STORE_DIR):
+        self.root = Path(root)
+
+    def _tmp_dir(self) -> Path:
+        tmp = self.root / _TMP
+        tmp.mkdir(parents=True, exist_ok=True)
+        return tmp
+
+    def entry_dir(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def find(self, sha256: str) -> Path | None:
+        """The stored book with this hash, if any."""
+        entry = self.entry_dir(sha256)
+        if not entry.is_dir():
+            return None
+        books = sorted(p for p in entry.iterdir() if p.is_file())
+        return books[0] if books else None
+
+    def sha256_of(self, path: Path) -> str | None:
+        """Hash of a book stored here (read from its location), or None."""
+        path = Path(path)
+        entry = path.parent
+        if entry.parent.parent != self.root or entry.parent.name != entry.name[:2] or len(entry.name) != 64:
+            return None
+        return entry.name
+
+    def work_dir(self, path: Path) -> Path | None:
+        """Directory for files derived from a stored book, or None if it is not stored here."""
+        sha256 = self.sha256_of(path)
+        if sha256 is None:
+            return None
+        work = self.entry_dir(sha256) / _WORK
+        work.mkdir(exist_ok=True)
+        return work
+
+    def staging_dir(self, path: Path) -> Path | None:
+        """A new private directory in the work directory of a stored book to
+        write derived files into; finish with publish() or discard_staging().
+        None if the book is not stored here."""
+        work = self.work_dir(path)
+        if work is None:
+            return None
+        return Path(tempfile.mkdtemp(dir=work, prefix=_STAGING))
+
+    def publish(self, staging: Path, result: Path | list[Path]) -> Path | list[Path]:
+        """Move the files written in staging into the work directory, each
+        with os.replace (a concurrent reader sees the old file or the new one,
+        never a partial one), and remove staging. Returns result with the
+        staged paths mapped to where they now are."""
+        staging = Path(staging)
+        for staged in staging.iterdir():
+            os.replace(staged, staging.parent / staged.name)
+        staging.rmdir()
+
+        def moved(path: Path) -> Path:
+            return staging.parent / path.name if path.parent == staging else path
+
+        return [moved(p) for p in result] if isinstance(result, list) else moved(result)
+
+    def discard_staging(self, staging: Path):
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def incoming(self) -> IncomingFile:
+        """A new temp file to stream a download into; finish with commit() or discard()."""
+        fd, tmp = tempfile.mkstemp(dir=self._tmp_dir(), suffix='.part')
+        os.close(fd)
+        return IncomingFile(Path(tmp))
+
+    def temp_path(self) -> Path:
+        """A unique path for writers that cannot stream (browser downloads); finish with add()."""
+        fd, tmp = tempfile.mkstemp(dir=self._tmp_dir(), suffix='.part')
+        os.close(fd)
+        return Path(tmp)
+
+    def discard(self, incoming: IncomingFile):
+        incoming.close()
+        incoming.path.unlink(missing_ok=True)
+
+    def commit(self, incoming: IncomingFile, name: str) -> dict:
+        """Move a finished streamed download into place (see _place)."""
+        incoming.close()
+        return self._place(incoming.path, incoming.sha256, incoming.size, name)
+
+    def add(self, file_path: Path, name: str | None = None) -> dict:
+        """Hash a finished file and move it into the store (see _place)."""
+        file_path = Path(file_path)
+        return self._place(file_path, file_sha256(file_path), file_path.stat().st_size, name or file_path.name)
+
+    def _place(self, tmp: Path, sha256: str, size: int, name: str) -> dict:
+        """Returns ``path``, ``sha256``, ``size`` and ``duplicate`` (True when
+        the store already held these bytes and the new copy was dropped)."""
+        existing = self.find(sha256)
+        if existing is not None:
+            tmp.unlink(missing_ok=True)
+            return {"path": existing, "sha256": sha256, "size": size, "duplicate": True}
+
+        entry = self.entry_dir(sha256)
+        entry.mkdir(parents=True, exist_ok=True)
+        path = entry / _safe_name(name, sha256)
+        os.replace(tmp, path)
+        return {"path": path, "sha256": sha256, "size": size, "duplicate": False}
@@ -0,0 +1,135 @@
+"""
+Minimal EPUB reader: metadata and XHTML documents in reading order.
+
+An EPUB is a zip archive whose OPF package file lists the manifest (every
+file in the book) and the spine (the reading order). EpubReader parses
+only META-INF/container.xml and the OPF, then inflates the spine's XHTML
+documents one at a time as they are iterated. Images, fonts, audio and
+other assets are never read, so memory does not depend on how much of
+the archive they take up.
+
+    with EpubReader("book.epub") as book:
+        print(book.title, book.author)
+        for name, content in book.documents():
+            ...
+"""
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+
+CONTAINER_PATH = "META-INF/container.xml"
+
+# Manifest media types read as chapters.
+DOCUMENT_TYPES = frozenset(['application/xhtml+xml', 'text/html'])
+
+
+class EpubError(ValueError):
+    """The file is not a readable EPUB (no container, OPF or spine)."""
+
+
+def _local(tag: str) -> str:
+    """Tag name without its namespace (OPFs in the wild are loose about them)."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _children(element, name: str) -> list:
+    return [child for child in element if _local(child.tag) == name]
+
+
+class EpubReader:
+    """An open EPUB archive; use as a context manager or call close()."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._zip = zipfile.ZipFile(self.path)
+        try:
+            self._names = set(self._zip.namelist())
+            self._folded = {name.casefold(): name for name in self._names}
+            self.opf_path = self._rootfile()
+            self._parse_package(self._read_xml(self.opf_path))
+        except BaseException:
+            self._zip.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def _read_xml(self, name: str):
+        try:
+            return ElementTree.fromstring(self._zip.read(name))
+        except (KeyError, ElementTree.ParseError) as e:
+            raise EpubError(f"{name}: {e}") from e
+
+    def _rootfile(self) -> str:
+        """Path of the OPF named by the container (or the first .opf in the archive)."""
+        if CONTAINER_PATH in self._names:
+            for element in self._read_xml(CONTAINER_PATH).iter():
+                if _local(element.tag) == 'rootfile' and element.get('full-path'):
+                    return element.get('full-path')
+        opfs = sorted(name for name in self._names if name.lower().endswith('.opf'))
+        if not opfs:
+            raise EpubError("no OPF package file")
+        return opfs[0]
+
+    def _resolve(self, href: str) -> str | None:
+        """Archive name of a manifest href (relative to the OPF), or None if missing."""
+        href = unquote(href.split('#', 1)[0])
+        name = posixpath.normpath(posixpath.join(posixpath.dirname(self.opf_path), href))
+        if name in self._names:
+            return name
+        return self._folded.get(name.casefold())
+
+    def _parse_package(self, package):
+        sections = {_local(child.tag): child for child in package}
+        metadata = sections.get('metadata')
+        manifest = sections.get('manifest')
+        spine = sections.get('spine')
+        if manifest is None:
+            raise EpubError(f"{self.opf_path}: no manifest")
+
+        self.metadata = {}
+        if metadata is not None:
+            for element in metadata:
+                text = (element.text or "").strip()
+                if text:
+                    self.metadata.setdefault(_local(element.tag), []).append(text)
+        self.title = self.metadata.get('title', ["Unknown Title"])[0]
+        self.author = self.metadata.get('creator', ["Unknown Author"])[0]
+
+        items = {}
+        order = []
+        for item in _children(manifest, 'item'):
+            if item.get('id') and item.get('href'):
+                items[item.get('id')] = item
+                order.append(item.get('id'))
+        ids = [ref.get('idref') for ref in _children(spine, 'itemref')] if spine is not None else []
+        if not ids:
+            # No usable spine: fall back to the manifest's order
+            ids = order
+
+        self.spine = []
+        self.missing = []
+        for item_id in ids:
+            item = items.get(item_id)
+            if item is None or item.get('media-type') not in DOCUMENT_TYPES:
+                continue
+            name = self._resolve(item.get('href'))
+            if name is None:
+                self.missing.append(item.get('href'))
+            elif name not in self.spine:
+                self.spine.append(name)
+
+    def documents(self) -> Iterator[tuple[str, bytes]]:
+        """Yield (archive name, raw bytes) of each spine document, inflating one at a time."""
+        for name in self.spine:
+            yield name, self._zip.read(name)
@@ -0,0 +1,232 @@
+"""
+HTML parser backends for the EPUB converter.
+
+A backend parses one XHTML document and replays its <body> as
+start/end/data events on a target (convert_epub.MarkdownBuilder), then
+returns ``target.close()``. Backends must produce exactly the Markdown the
+reference ``html.parser`` backend produces; a fast backend that cannot
+guarantee that for a given document returns None and the next backend in
+the chain takes over.
+
+Available backends, fastest first:
+    lxml         libxml2's XML parser, for well-formed XHTML (needs lxml)
+    html.parser  BeautifulSoup with Python's html.parser (always available)
+"""
+import re
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup, CData, NavigableString
+from bs4.builder import HTMLTreeBuilder
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+# Only these string types count as text inside a heading, paragraph, inline
+# tag or list item (comments, processing instructions etc. are ignored, the
+# same rule as BeautifulSoup's get_text()).
+TEXT_STRING_TYPES = (NavigableString, CData)
+
+
+def feed_soup(root, target):
+    """Replay the children of a BeautifulSoup node as builder events."""
+    start, end, data = target.start, target.end, target.data
+    stack = [(None, iter(root.contents))]
+    while stack:
+        tag, children = stack[-1]
+        for node in children:
+            if isinstance(node, NavigableString):
+                data(str(node), type(node) in TEXT_STRING_TYPES)
+            else:
+                start(node.name, node.attrs)
+                stack.append((node.name, iter(node.contents)))
+                break
+        else:
+            stack.pop()
+            if tag is not None:
+                end(tag)
+
+
+def parse_html_parser(content, target):
+    """Reference backend: BeautifulSoup + html.parser."""
+    soup = BeautifulSoup(content.decode('utf-8'), 'html.parser')
+    body = soup.find('body')
+    feed_soup(body if body else soup, target)
+    return target.close()
+
+
+# Markup that html.parser and an XML parser read differently. Documents
+# containing any of it go to the next backend.
+_NOT_PLAIN_XHTML = re.compile(
+    rb'\r'                                    # XML folds CR/CRLF into LF
+    rb'|<!\[CDATA\['                          # html.parser keeps CDATA as its own node
+    rb'|&(?!(?:amp|lt|gt|quot|apos|#[0-9]+|#x[0-9a-fA-F]+);)'  # HTML named entities, bare &
+    rb'|&#(?:0*1(?:2[89]|[34][0-9]|5[0-9])|x0*[89][0-9a-fA-F]);'  # &#128;-&#159; map to cp1252
+    rb'|</?[A-Za-z_][\w.-]*:'                 # html.parser keeps tag prefixes (svg:svg)
+)
+
+# Tags html.parser never lets have children, tags whose strings are not
+# plain NavigableStrings (and so are left out of get_text()), and tags inside
+# which BeautifulSoup keeps whitespace-only strings as they are.
+_VOID_TAGS = frozenset(HTMLTreeBuilder.empty_element_tags)
+_STRING_CONTAINERS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+_PRESERVE_WHITESPACE_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS)
+
+# html.parser reads the content of these as raw text, not markup.
+_RAW_TEXT_TAGS = frozenset(HTMLParser.CDATA_CONTENT_ELEMENTS)
+
+
+class _Fallback(Exception):
+    """The document needs the html.parser backend."""
+
+
+class _XHTMLBodyTarget:
+    """lxml parser target forwarding the first <body> to a Markdown target.
+
+    Tag names are reduced to lower-case local names (as html.parser reports
+    them), adjacent text is merged into one data event, and whitespace-only
+    text is collapsed to a single space or newline, all as BeautifulSoup
+    does when it builds its tree.
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self._depth = None      # None before <body>, -1 after it
+        self._text = []
+        self._containers = 0
+        self._preserve = 0
+        self._void = False      # just opened a void tag
+        self._raw_text = False  # inside <script>/<style>
+
+    def _flush(self):
+        if self._void:
+            raise _Fallback("void element with content")
+        if self._text:
+            text = "".join(self._text)
+            self._text = []
+            if not self._preserve and not text.strip(BeautifulSoup.ASCII_SPACES):
+                text = '\n' if '\n' in text else ' '
+            self._target.data(text, self._containers == 0)
+
+    def start(self, tag, attrib):
+        name = tag.rpartition('}')[2].lower()
+        if self._depth is None:
+            if name == 'body':
+                self._depth = 0
+            return
+        if self._depth < 0:
+            return
+        if self._raw_text:
+            raise _Fallback("element inside raw text element")
+        self._flush()
+        self._depth += 1
+        self._raw_text = name in _RAW_TEXT_TAGS
+        if name in _STRING_CONTAINERS:
+            self._containers += 1
+        if name in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve += 1
+        self._void = name in _VOID_TAGS
+        self._target.start(name, attrib)
+
+    def end(self, tag):
+        if self._depth is None or self._depth < 0:
+            return
+        name = tag.rpartition('}')[2].lower()
+        self._void = False
+        self._raw_text = False
+        self._flush()
+        if self._depth == 0:
+            self._depth = -1
+            return
+        self._depth -= 1
+        if name in _STRING_CONTAINERS:
+            self._containers -= 1
+        if name in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve -= 1
+        self._target.end(name)
+
+    def data(self, text):
+        if self._depth is not None and self._depth >= 0:
+            if self._void:
+                raise _Fallback("void element with content")
+            self._text.append(text)
+
+    def comment(self, text):
+        if self._depth is not None and self._depth >= 0:
+            self._flush()
+            self._target.data(text, False)
+
+    def pi(self, target, data=None):
+        if self._depth is not None and self._depth >= 0:
+            raise _Fallback("processing instruction in body")
+
+    def close(self):
+        if self._depth is None:
+            raise _Fallback("no <body>")
+        return self._target.close()
+
+
+def parse_lxml(content, target):
+    """Fast backend: stream well-formed XHTML through lxml's XML parser.
+
+    Returns None for documents it cannot convert exactly like html.parser
+    (HTML entities, CDATA, CR line endings, malformed markup, ...).
+    """
+    if _NOT_PLAIN_XHTML.search(content):
+        return None
+    parser = etree.XMLParser(
+        target=_XHTMLBodyTarget(target),
+        encoding='utf-8',
+        resolve_entities=False,
+        load_dtd=False,
+        no_network=True,
+        huge_tree=True,
+    )
+    try:
+        return etree.fromstring(content, parser)
+    except (_Fallback, etree.XMLSyntaxError):
+        return None
+
+
+BACKENDS = {'html.parser': parse_html_parser}
+if etree is not None:
+    BACKENDS['lxml'] = parse_lxml
+
+# Tried in this order when no backend is requested.
+DEFAULT_ORDER = ['lxml', 'html.parser']
+
+
+def available_backends():
+    """Names of the backends usable in this environment, fastest first."""
+    return [name for name in DEFAULT_ORDER if name in BACKENDS]
+
+
+def backend_chain(name=None):
+    """Parse functions to try, in order, for backend ``name`` (None = auto).
+
+    html.parser always comes last so every document converts.
+    """
+    if name in (None, 'auto'):
+        names = available_backends()
+    elif name not in BACKENDS:
+        raise ValueError(
+            f"Unknown or unavailable HTML parser: {name} "
+            f"(available: {', '.join(available_backends())})"
+        )
+    else:
+        names = [name, 'html.parser']
+    chain = []
+    for n in names:
+        if BACKENDS[n] not in chain:
+            chain.append(BACKENDS[n])
+    return chain
+
+
+def backend_name(parse):
+    """Name of a parse function from backend_chain()."""
+    for name, fn in BACKENDS.items():
+        if fn is parse:
+            return name
+    return getattr(parse, '__name__', repr(parse))
@@ -0,0 +1,254 @@
+"""
+直接 HTTP 下载（不启动浏览器）
+
+用 login.py 保存的会话状态（storage_state.json）中的 cookie 请求书籍页面，
+页面中已有 /dl/ 直接下载链接时，用连接池中的 HTTP 连接把文件分块写入
+下载库（见 download_store）的临时文件，边写边计算 SHA-256，完成后原子地
+移入下载库。需要 JS 格式转换的页面
+（带 data-convert_to 按钮）或没有直接链接的页面仍交给浏览器处理。
+
+    http = HTTPDownloader(Path.home() / ".zlibrary" / "storage_state.json")
+    link = await http.find_download_link(book_url)
+    if link:
+        entry = await http.download(link, store)
+"""
+import asyncio
+import http.client
+import json
+import threading
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import unquote, urljoin, urlsplit
+
+
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+CHUNK_SIZE = 1024 * 1024
+MAX_REDIRECTS = 5
+
+
+class HTTPDownloadError(Exception):
+    """直接下载失败（需要改用浏览器）"""
+
+
+class TransientHTTPError(HTTPDownloadError):
+    """网络错误、5xx、429 等可以重试的失败"""
+
+
+class _LinkParser(HTMLParser):
+    """收集页面中的 /dl/ 链接，并记录是否有格式转换按钮"""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self.needs_conversion = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        attrs = dict(attrs)
+        if attrs.get('data-convert_to'):
+            self.needs_conversion = True
+        href = attrs.get('href')
+        if href and '/dl/' in href:
+            self.links.append(href)
+
+
+def _domain_matches(host: str, domain: str) -> bool:
+    domain = domain.lstrip('.').lower()
+    return host == domain or host.endswith('.' + domain)
+
+
+class HTTPDownloader:
+    """带连接池的直接下载器（阻塞 I/O 在线程中执行，可同时下载多本书）"""
+
+    def __init__(self, storage_state: Path, timeout: float = 60, max_idle_per_host: int = 4):
+        self.storage_state = Path(storage_state)
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._cookies = []
+        self._cookies_mtime = None
+
+    # ---- cookie ----
+
+    def cookies(self) -> list[dict]:
+        """storage_state.json 中的 cookie（文件更新后重新读取）"""
+        try:
+            mtime = self.storage_state.stat().st_mtime
+            if mtime != self._cookies_mtime:
+                state = json.loads(self.storage_state.read_text(encoding='utf-8'))
+                self._cookies = state.get('cookies', [])
+                self._cookies_mtime = mtime
+        except (OSError, ValueError):
+            return []
+        return self._cookies
+
+    def cookie_header(self, url: str) -> str | None:
+        """按域名、路径、secure 和过期时间挑出发往 url 的 cookie"""
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        path = parts.path or '/'
+        now = time.time()
+        pairs = []
+        for cookie in self.cookies():
+            if not _domain_matches(host, cookie.get('domain', '')):
+                continue
+            if not path.startswith(cookie.get('path') or '/'):
+                continue
+            if cookie.get('secure') and parts.scheme != 'https':
+                continue
+            expires = cookie.get('expires', -1)
+            if expires not in (None, -1) and expires < now:
+                continue
+            pairs.append(f"{cookie['name']}={cookie['value']}")
+        return '; '.join(pairs) or None
+
+    # ---- 连接池 ----
+
+    def _acquire(self, scheme: str, netloc: str, reuse: bool = True) -> http.client.HTTPConnection:
+        if reuse:
+            with self._lock:
+                idle = self._idle.get((scheme, netloc))
+                if idle:
+                    return idle.pop()
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _release(self, scheme: str, netloc: str, conn: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _open(self, url: str, referer: str | None = None):
+        """GET url（跟随重定向），返回 (最终 URL, 响应, release)
+
+        读完响应后调用 release() 把连接放回连接池；出错时调用
+        release(False) 关闭连接。
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise HTTPDownloadError(f"不支持的地址: {url}")
+            headers = {"User-Agent": USER_AGENT, "Accept": "*/*"}
+            cookie = self.cookie_header(url)
+            if cookie:
+                headers["Cookie"] = cookie
+            if referer:
+                headers["Referer"] = referer
+            target = parts.path or '/'
+            if parts.query:
+                target += '?' + parts.query
+
+            # 连接池中的连接可能已被服务器关闭，失败时用新连接再试一次
+            for reuse in (True, False):
+                conn = self._acquire(parts.scheme, parts.netloc, reuse)
+                try:
+                    conn.request("GET", target, headers=headers)
+                    response = conn.getresponse()
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    if not reuse:
+                        raise TransientHTTPError(f"{parts.netloc}: {e}") from e
+
+            def release(reusable=True, conn=conn, response=response, scheme=parts.scheme, netloc=parts.netloc):
+                if reusable and not response.will_close:
+                    self._release(scheme, netloc, conn)
+                else:
+                    response.close()
+                    conn.close()
+
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.getheader('Location')
+                response.read()
+                release()
+                if not location:
+                    raise HTTPDownloadError(f"重定向缺少 Location: {url}")
+                referer, url = url, urljoin(url, location)
+                continue
+            if response.status != 200:
+                response.read()
+                release()
+                error = TransientHTTPError if response.status == 429 or response.status >= 500 else HTTPDownloadError
+                raise error(f"HTTP {response.status}: {url}")
+            return url, response, release
+        raise HTTPDownloadError(f"重定向次数过多: {url}")
+
+    # ---- 页面与下载 ----
+
+    def _find_download_link(self, page_url: str) -> str | None:
+        _, response, release = self._open(page_url)
+        try:
+            html = response.read().decode('utf-8', 'replace')
+        except (OSError, http.client.HTTPException) as e:
+            release(False)
+            raise TransientHTTPError(str(e)) from e
+        release()
+
+        parser = _LinkParser()
+        parser.feed(html)
+        if parser.needs_conversion or not parser.links:
+            return None
+        # 与浏览器路径一致：优先 PDF，然后 EPUB
+        for fmt in ('pdf', 'epub'):
+            for href in parser.links:
+                if fmt in href.lower():
+                    return urljoin(page_url, href)
+        return urljoin(page_url, parser.links[0])
+
+    def _download(self, url: str, store, referer: str | None = None,
+                  deadline: float | None = None) -> dict:
+        final_url, response, release = self._open(url, referer)
+        if response.getheader('Content-Type', '').startswith('text/html'):
+            release(False)
+            raise HTTPDownloadError("返回的是网页而不是文件（可能需要重新登录）")
+
+        name = response.headers.get_filename() or unquote(Path(urlsplit(final_url).path).name)
+        expected = response.getheader('Content-Length')
+
+        # 分块写入下载库中的临时文件并同时计算 SHA-256，完整后原子地移入
+        incoming = store.incoming()
+        end = time.monotonic() + deadline if deadline else None
+        try:
+            while True:
+                try:
+                    chunk = response.read(CHUNK_SIZE)
+                except (OSError, http.client.HTTPException) as e:
+                    raise TransientHTTPError(f"下载中断: {e}") from e
+                if not chunk:
+                    break
+                incoming.write(chunk)
+                if end is not None and time.monotonic() > end:
+                    raise HTTPDownloadError(f"下载未在 {deadline:.0f} 秒内完成")
+            if expected is not None and incoming.size != int(expected):
+                raise TransientHTTPError(f"下载不完整: {incoming.size}/{expected} 字节")
+        except BaseException:
+            release(False)
+            store.discard(incoming)
+            raise
+        release()
+        return store.commit(incoming, name)
+
+    async def find_download_link(self, page_url: str) -> str | None:
+        """书籍页面中的直接下载链接（绝对地址）；需要格式转换或没有链接时返回 None"""
+        return await asyncio.to_thread(self._find_download_link, page_url)
+
+    async def download(self, url: str, store, referer: str | None = None,
+                       deadline: float | None = None) -> dict:
+        """下载 url 到下载库 store（文件名取自 Content-Disposition 或 URL），
+        返回 store.commit 的结果（path、sha256、size、duplicate）"""
+        return await asyncio.to_thread(self._download, url, store, referer, deadline)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+任务日志：记录每本书各阶段的结果，重跑时从中断处继续
+
+按书籍 URL 记录：下载的文件及其 SHA-256、转换得到的分块文件、笔记本 ID，
+以及每个分块的来源 ID。每一步完成后立即写入 SQLite，因此上传在第 4/7
+块中断时，重跑只会上传第 4-7 块，不会重新下载、转换或新建笔记本。
+
+    python3 job_journal.py list
+    python3 job_journal.py show <URL>
+    python3 job_journal.py forget <URL>
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+DEFAULT_JOURNAL_PATH = Path.home() / ".zlibrary" / "jobs.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url         TEXT PRIMARY KEY,
+    file        TEXT,
+    sha256      TEXT,
+    format      TEXT,
+    parts       TEXT,
+    notebook_id TEXT,
+    title       TEXT,
+    completed   INTEGER NOT NULL DEFAULT 0,
+    updated     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    url       TEXT NOT NULL,
+    part      INTEGER NOT NULL,
+    source_id TEXT NOT NULL,
+    PRIMARY KEY (url, part)
+);
+"""
+
+
+class JobJournal:
+    """每本书一条记录的任务日志（SQLite，WAL 模式，可跨线程使用）"""
+
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+
+    def get(self, url: str) -> dict | None:
+        """一本书的记录：file、sha256、format、parts（分块路径列表）、
+        notebook_id、title、completed，以及 sources（分块序号 -> 来源 ID）"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["parts"] = json.loads(job["parts"]) if job["parts"] else None
+            job["completed"] = bool(job["completed"])
+            job["sources"] = dict(self._db.execute(
+                "SELECT part, source_id FROM sources WHERE url = ? ORDER BY part", (url,)
+            ).fetchall())
+        return job
+
+    def _update(self, url: str, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO jobs (url, updated) VALUES (?, ?)", (url, fields["updated"]))
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE url = ?", (*fields.values(), url))
+
+    def _reset_upload(self, url: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sources WHERE url = ?", (url,))
+            self._db.execute("UPDATE jobs SET notebook_id = NULL, title = NULL, completed = 0 WHERE url = ?", (url,))
+
+    def record_download(self, url: str, file: Path, sha256: str, file_format: str | None):
+        """记录下载结果；文件内容变了时，之前的转换和上传记录作废"""
+        job = self.get(url)
+        if job and job["sha256"] != sha256:
+            self._reset_upload(url)
+            self._update(url, parts=None)
+        self._update(url, file=str(file), sha256=sha256, format=file_format)
+
+    def record_conversion(self, url: str, parts: list[Path]):
+        """记录转换得到的分块；分块与之前不同时，之前的上传记录作废"""
+        parts = [str(p) for p in parts]
+        job = self.get(url)
+        if job and job["parts"] is not None and job["parts"] != parts:
+            self._reset_upload(url)
+        self._update(url, parts=json.dumps(parts))
+
+    def record_notebook(self, url: str, notebook_id: str, title: str):
+        self._update(url, notebook_id=notebook_id, title=title)
+
+    def record_source(self, url: str, part: int, source_id: str):
+        """记录第 part 块（从 1 开始）的来源 ID"""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (url, part, source_id))
+
+    def mark_completed(self, url: str):
+        self._update(url, completed=1)
+
+    def adopt_completed(self, url: str, sha256: str) -> str | None:
+        """另一个 URL 下载到相同内容（sha256）且已完成时，把那次的转换、
+        笔记本和来源记录复制给 url 并标记完成，返回那个 URL；否则 None"""
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT url, parts, notebook_id, title FROM jobs"
+                " WHERE sha256 = ? AND completed = 1 AND url != ? ORDER BY updated DESC LIMIT 1",
+                (sha256, url),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM sources WHERE url = ?", (url,))
+            self._db.execute(
+                "INSERT INTO sources SELECT ?, part, source_id FROM sources WHERE url = ?", (url, row["url"])
+            )
+        self._update(url, parts=row["parts"], notebook_id=row["notebook_id"], title=row["title"], completed=1)
+        return row["url"]
+
+    def forget(self, url: str) -> bool:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sources WHERE url = ?", (url,))
+            return self._db.execute("DELETE FROM jobs WHERE url = ?", (url,)).rowcount > 0
+
+    def jobs(self) -> list[dict]:
+        with self._lock:
+            urls = [row[0] for row in self._db.execute("SELECT url FROM jobs ORDER BY updated")]
+        return [self.get(url) for url in urls]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看和管理任务日志")
+    parser.add_argument("--path", type=Path, default=DEFAULT_JOURNAL_PATH, help="日志数据库路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出所有任务")
+    show = commands.add_parser("show", help="显示一个任务的详细记录")
+    show.add_argument("url")
+    forget = commands.add_parser("forget", help="删除一个任务的记录（下次从头处理）")
+    forget.add_argument("url")
+    args = parser.parse_args()
+
+    journal = JobJournal(args.path)
+    if args.command == "list":
+        for job in journal.jobs():
+            parts = len(job["parts"]) if job["parts"] else 0
+            state = "✅ 完成" if job["completed"] else f"⏳ {len(job['sources'])}/{parts} 块已上传"
+            print(f"{state}  {job['title'] or '-'}  {job['url']}")
+    elif args.command == "show":
+        job = journal.get(args.url)
+        if job is None:
+            print("❌ 没有这个任务的记录")
+            return 1
+        print(json.dumps(job, ensure_ascii=False, indent=2))
+    elif args.command == "forget":
+        print("🧹 已删除" if journal.forget(args.url) else "❌ 没有这个任务的记录")
+    journal.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+三段式流水线：下载 → 转换 → 上传
+
+三个阶段由有界 asyncio 队列连接：下载（异步 I/O）、转换（进程池，CPU
+密集）、上传（异步，见 upload_backends），因此第 N+1 本书下载时，第 N 本在转换，第
+N-1 本在上传。队列满时上游阶段暂停，内存占用随队列长度而不是书的数量
+增长。每个阶段统计处理数量、忙碌时间和吞吐量。
+
+    pipeline = Pipeline(uploader, download_workers=3, convert_workers=2)
+    results = await pipeline.run(urls)
+    pipeline.print_report()
+"""
+import asyncio
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+class HostLimiter:
+    """按站点限制并发数，并保证同一站点两次请求开始之间至少间隔 interval 秒"""
+
+    def __init__(self, concurrency: int = 2, interval: float = 1.0):
+        self.interval = interval
+        self._slots = defaultdict(lambda: asyncio.Semaphore(concurrency))
+        self._next_start = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        async with self._slots[host]:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+# 转换进程中的上传器实例（各进程独立的转换缓存和章节缓存）
+_worker_uploader = None
+
+
+def _init_convert_worker(uploader_class, pdf_split):
+    global _worker_uploader
+    _worker_uploader = uploader_class()
+    _worker_uploader.pdf_split = pdf_split
+    # 转换本身已经分散在多个进程中，PDF 不再另开进程池
+    _worker_uploader.pdf_workers = 1
+
+
+def _convert_in_worker(file_path, file_format):
+    return _worker_uploader.convert_to_txt(file_path, file_format)
+
+
+async def _gather_or_cancel(tasks):
+    """等待全部任务；一个任务异常退出（或自身被取消）时取消其余任务，
+    否则它们会一直等在队列上"""
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class StageStats:
+    """一个阶段的计数与耗时"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.done = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start: float, end: float, ok: bool):
+        if self.first_start is None:
+            self.first_start = start
+        self.last_end = end
+        self.busy += end - start
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def as_dict(self) -> dict:
+        wall = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy, 2),
+            "wall_seconds": round(wall, 2),
+            "per_minute": round(self.done / wall * 60, 2) if wall > 0 else None,
+        }
+
+
+class Pipeline:
+    """下载、转换、上传三个阶段并行推进的批处理流水线"""
+
+    def __init__(self, uploader, download_workers: int = 3, convert_workers: int = 0,
+                 upload_workers: int = 2, queue_size: int = 2,
+                 per_host: int = 2, host_interval: float = 1.0):
+        self.uploader = uploader
+        self.download_workers = download_workers
+        self.convert_workers = convert_workers or os.cpu_count() or 1
+        self.upload_workers = upload_workers
+        self.queue_size = queue_size
+        self.hosts = HostLimiter(per_host, host_interval)
+        self.stats = {name: StageStats(name) for name in ("download", "convert", "upload")}
+
+    async def run(self, urls: list[str]) -> list[dict]:
+        """处理 urls，返回与之顺序一致的每本书结果"""
+        jobs = [{"url": url, "success": False, "timings": {}} for url in urls]
+        self._total = len(jobs)
+        self._in_flight = {}
+
+        pending = asyncio.Queue()
+        for index, job in enumerate(jobs, 1):
+            pending.put_nowait((index, job))
+        for _ in range(self.download_workers):
+            pending.put_nowait(None)
+        # 有界队列：下游跟不上时上游等待（背压）
+        to_convert = asyncio.Queue(maxsize=self.queue_size)
+        to_upload = asyncio.Queue(maxsize=self.queue_size)
+
+        with ProcessPoolExecutor(
+            max_workers=self.convert_workers,
+            initializer=_init_convert_worker,
+            initargs=(type(self.uploader), self.uploader.pdf_split),
+        ) as convert_pool:
+            self._convert_pool = convert_pool
+            stages = [
+                asyncio.create_task(self._stage("download", pending, to_convert, self.download_workers,
+                                                self.convert_workers, self._download)),
+                asyncio.create_task(self._stage("convert", to_convert, to_upload, self.convert_workers,
+                                                self.upload_workers, self._convert)),
+                asyncio.create_task(self._stage("upload", to_upload, None, self.upload_workers, 0, self._upload)),
+            ]
+            await _gather_or_cancel(stages)
+
+        by_url = {job["url"]: job for job in jobs}
+        for job in jobs:
+            if job.get("short_circuit") == "duplicate":
+                original = by_url[job["duplicate_of"]]
+                for key in ("success", "notebook_id", "source_ids", "source_id", "chunks", "title", "error"):
+                    if key in original:
+                        job[key] = original[key]
+                if self.uploader.journal is not None:
+                    self.uploader.journal.adopt_completed(job["url"], job["sha256"])
+        return jobs
+
+    async def _stage(self, name, inbox, outbox, workers, next_workers, handle):
+        """运行一个阶段的 workers 个协程；全部结束后通知下一阶段"""
+        stats = self.stats[name]
+        loop = asyncio.get_running_loop()
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is None:
+                    return
+                index, job = item
+                start = loop.time()
+                try:
+                    ok = await handle(index, job)
+                except Exception as e:
+                    job["error"] = f"{type(e).__name__}: {e}"
+                    print(f"❌ [{index}/{self._total}] {name}: {job['error']}")
+                    ok = False
+                end = loop.time()
+                job["timings"][name] = round(end - start, 2)
+                stats.record(start, end, ok)
+                if ok and outbox is not None and "short_circuit" not in job:
+                    await outbox.put(item)
+
+        await _gather_or_cancel([asyncio.create_task(worker()) for _ in range(workers)])
+        if outbox is not None:
+            for _ in range(next_workers):
+                await outbox.put(None)
+
+    async def _download(self, index, job) -> bool:
+        url = job["url"]
+        result = self.uploader.completed_result(url)
+        if result is not None:
+            # 任务日志中已全部完成：不再进入后续阶段
+            job.update(result, short_circuit="journal")
+            return True
+        async with self.hosts.slot(urlparse(url).netloc):
+            print(f"⬇️  [{index}/{self._total}] 开始下载: {url}")
+            downloaded_file, file_format = await self.uploader.fetch_book(url)
+        if not downloaded_file or not downloaded_file.exists():
+            job["error"] = "下载失败"
+            return False
+        job["file"] = str(downloaded_file)
+        job["format"] = file_format
+
+        # 与已完成的书内容相同（见 fetch_book）
+        result = self.uploader.completed_result(url)
+        if result is not None:
+            job.update(result, short_circuit="journal")
+            return True
+        # 与这批中正在处理的另一本书内容相同：等那本完成后沿用它的结果
+        sha256 = self.uploader.store.sha256_of(downloaded_file)
+        if sha256 is not None:
+            if sha256 in self._in_flight:
+                job.update(short_circuit="duplicate", duplicate_of=self._in_flight[sha256], sha256=sha256)
+                print(f"♻️  [{index}/{self._total}] 与 {job['duplicate_of']} 内容相同，跳过转换和上传")
+                return True
+            self._in_flight[sha256] = url
+        return True
+
+    async def _convert(self, index, job) -> bool:
+        final_file = self.uploader.journaled_conversion(job["url"])
+        if final_file is None:
+            loop = asyncio.get_running_loop()
+            final_file = await loop.run_in_executor(
+                self._convert_pool, _convert_in_worker, Path(job["file"]), job["format"]
+            )
+            self.uploader.record_conversion(job["url"], final_file)
+        job["upload_input"] = final_file
+        files = final_file if isinstance(final_file, list) else [final_file]
+        job["parts"] = [str(f) for f in files]
+        return True
+
+    async def _upload(self, index, job) -> bool:
+        result = await self.uploader.upload_to_notebooklm_async(job.pop("upload_input"), url=job["url"])
+        job.update(result)
+        print(f"{'✅' if result['success'] else '❌'} [{index}/{self._total}] {job['url']}")
+        return result["success"]
+
+    def report(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def print_report(self):
+        print("📈 各阶段吞吐量:")
+        for name, s in self.report().items():
+            rate = f"{s['per_minute']:.1f} 本/分钟" if s['per_minute'] else "-"
+            print(f"   {name:<8} 完成 {s['done']:>3}  失败 {s['failed']:>3}  "
+                  f"忙碌 {s['busy_seconds']:>7.1f} 秒  {rate}")
@@ -0,0 +1,157 @@
+"""
+重试与熔断
+
+按操作类型（navigate、download、upload）使用带随机抖动的指数退避重试，
+按站点维护熔断器：同一站点连续失败 threshold 次后熔断 reset_after 秒，
+期间的请求立即失败；之后放行一次试探请求，成功即恢复。
+
+重试只重复失败的那一步（打开页面、开始下载、上传某一个分块），
+不会让整本书从头再来。每种操作的调用、重试、失败次数见 report()。
+
+    resilience = Resilience()
+    source_id = await resilience.call(
+        "upload", "notebooklm", lambda: backend.add_source(notebook_id, path),
+        retry_on=(NotebookLMError,),
+    )
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+
+
+class CircuitOpenError(Exception):
+    """站点处于熔断状态，请求未发出"""
+
+
+@dataclass
+class RetryPolicy:
+    """一种操作的重试策略：最多 attempts 次，第 n 次重试前等待
+    0 ~ min(max_delay, base_delay * 2^(n-1)) 秒（full jitter）"""
+    attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def delay(self, retry: int, rng: random.Random) -> float:
+        return rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+DEFAULT_POLICIES = {
+    "navigate": RetryPolicy(attempts=3, base_delay=2.0, max_delay=30.0),
+    "download": RetryPolicy(attempts=3, base_delay=5.0, max_delay=60.0),
+    "upload": RetryPolicy(attempts=4, base_delay=1.0, max_delay=30.0),
+}
+
+
+class CircuitBreaker:
+    """一个站点的熔断器（closed → open → half-open → closed）"""
+
+    def __init__(self, threshold: int = 5, reset_after: float = 60.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """是否放行一次请求；half-open 状态下同时只放行一个试探请求"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release(self):
+        """结束试探请求但不改变状态（请求因不计入熔断的异常或取消而结束）"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            if self.opened_at is None or self._probing:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class Resilience:
+    """共享的重试与熔断层（同一事件循环内使用）"""
+
+    def __init__(self, policies: dict[str, RetryPolicy] | None = None,
+                 breaker_threshold: int = 5, breaker_reset: float = 60.0, seed: int | None = None):
+        self.policies = {**DEFAULT_POLICIES, **(policies or {})}
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers = {}
+        self.stats = {}
+        self._random = random.Random(seed)
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return self.breakers[host]
+
+    def _count(self, operation: str, field: str):
+        stats = self.stats.setdefault(
+            operation, {"calls": 0, "retries": 0, "recovered": 0, "failed": 0, "rejected": 0}
+        )
+        stats[field] += 1
+
+    async def call(self, operation: str, host: str, step, retry_on: tuple = (Exception,)):
+        """执行 step()（返回 awaitable 的无参函数），遇到 retry_on 中的异常时
+        按 operation 的策略重试；重试用尽后抛出最后一次的异常，站点熔断
+        时抛出 CircuitOpenError"""
+        policy = self.policies.get(operation) or RetryPolicy()
+        breaker = self.breaker(host)
+        self._count(operation, "calls")
+        for attempt in range(1, policy.attempts + 1):
+            if not breaker.allow():
+                self._count(operation, "rejected")
+                raise CircuitOpenError(f"{host} 已熔断（连续失败 {breaker.failures} 次），{operation} 未执行")
+            try:
+                result = await step()
+            except retry_on as e:
+                breaker.record_failure()
+                if attempt == policy.attempts:
+                    self._count(operation, "failed")
+                    raise
+                delay = policy.delay(attempt, self._random)
+                self._count(operation, "retries")
+                print(f"🔁 {operation} 失败（第 {attempt}/{policy.attempts} 次）: {e}，{delay:.1f} 秒后重试")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # 不重试的异常或被取消（如总期限到了）不算站点故障，但必须结束
+                # half-open 的试探，否则之后对这个站点的请求会一直被熔断
+                breaker.release()
+                raise
+            else:
+                breaker.record_success()
+                if attempt > 1:
+                    self._count(operation, "recovered")
+                return result
+
+    def report(self) -> dict:
+        """每种操作的调用/重试/恢复/失败/被熔断次数，以及每个站点的熔断状态"""
+        return {
+            "operations": {name: dict(stats) for name, stats in self.stats.items()},
+            "circuits": {
+                host: {"state": b.state, "failures": b.failures, "trips": b.trips}
+                for host, b in self.breakers.items()
+            },
+        }
@@ -3,29 +3,118 @@
 Z-Library 全自动下载并上传到 NotebookLM
 """
 
+import argparse
 import asyncio
 import sys
-import time
 import re
+import shutil
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from urllib.parse import unquote
+from urllib.parse import urlparse
 
 try:
-    from playwright.async_api import async_playwright
+    from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 except ImportError:
     print("❌ Playwright 未安装")
     print("请运行: pip install playwright")
     sys.exit(1)
 
+try:
+    from .batch import read_urls, run_batch, write_summary
+    from .browser_pool import BrowserPool
+    from .http_download import HTTPDownloader, HTTPDownloadError, TransientHTTPError
+    from .chunking import ChunkPolicy, plan_parts, write_parts
+    from .upload_backends import BACKENDS as UPLOAD_BACKENDS, UploadBackend, make_upload_backend
+    from .conversion_cache import ConversionCache, file_sha256
+    from .convert_pdf import MAX_SOURCE_BYTES, MAX_WORDS_PER_PAGE, page_count, pdf_to_markdown, split_pdf
+    from .download_store import DownloadStore
+    from .job_journal import JobJournal
+    from .resilience import CircuitOpenError, Resilience
+    from .chapter_store import ChapterStore
+    from .utils import count_file_words, count_words
+except ImportError:
+    from batch import read_urls, run_batch, write_summary
+    from browser_pool import BrowserPool
+    from http_download import HTTPDownloader, HTTPDownloadError, TransientHTTPError
+    from chunking import ChunkPolicy, plan_parts, write_parts
+    from upload_backends import BACKENDS as UPLOAD_BACKENDS, UploadBackend, make_upload_backend
+    from conversion_cache import ConversionCache, file_sha256
+    from convert_pdf import MAX_SOURCE_BYTES, MAX_WORDS_PER_PAGE, page_count, pdf_to_markdown, split_pdf
+    from download_store import DownloadStore
+    from job_journal import JobJournal
+    from resilience import CircuitOpenError, Resilience
+    from chapter_store import ChapterStore
+    from utils import count_file_words, count_words
+
+
+# 书籍页面上与下载有关的元素，出现任意一个即认为页面已可操作
+# （与 _find_download_link 查找的元素一致）
+DOWNLOAD_UI_SELECTOR = ', '.join([
+    'a[href*="/dl/"]',
+    'a[data-convert_to]',
+    'button[aria-label="更多选项"]',
+    'button[title="更多"]',
+    '.more-options',
+    'a:has-text("下载")',
+    'a:has-text("Download")',
+    'button:has-text("下载")',
+])
+
+# 三点菜单中的格式选项
+FORMAT_OPTION_SELECTOR = 'a:has-text("PDF"), button:has-text("PDF"), a:has-text("EPUB"), button:has-text("EPUB")'
+
+# 页面提示 "转换为 <格式> ... 完成" 时为真
+CONVERSION_DONE_JS = """fmt => [...document.querySelectorAll('.message')].some(m => {
+    const text = m.innerText;
+    return text.includes('转换为') && text.toLowerCase().includes(fmt) && text.includes('完成');
+})"""
+
+
+@dataclass
+class DownloadDeadlines:
+    """下载各阶段的时限（秒）"""
+    page_load: float = 60        # 打开书籍页面并等到下载区域出现
+    menu: float = 5              # 三点菜单展开
+    conversion: float = 60       # 服务器端格式转换
+    download_start: float = 30   # 点击后浏览器开始下载
+    download: float = 600        # 下载传输本身
+    total: float = 900           # 整个下载过程
+
 
 class ZLibraryAutoUploader:
     """Z-Library 自动下载上传器"""
 
-    def __init__(self):
-        self.downloads_dir = Path.home() / "Downloads"
+    def __init__(self, deadlines: DownloadDeadlines = None, pool: BrowserPool = None, headless: bool = False,
+                 upload_backend: UploadBackend = None, journal: JobJournal = None, resilience: Resilience = None,
+                 direct_download: bool = True):
         self.temp_dir = Path("/tmp")
         self.config_dir = Path.home() / ".zlibrary"
         self.config_file = self.config_dir / "config.json"
+        # 下载库：按内容 SHA-256 存放下载的书，并发下载互不覆盖，相同的书只存一份
+        self.store = DownloadStore(self.config_dir / "downloads")
+        self.deadlines = deadlines or DownloadDeadlines()
+        # 共享的浏览器池（见 new_browser_pool）；为 None 时每次下载单独启动浏览器
+        self.pool = pool
+        self.headless = headless
+        # PDF 文字提取的进程数（0 = 每个 CPU 一个）
+        self.pdf_workers = 0
+        # 超出限制的 PDF 如何分块：pdf 按页码范围切成多个 PDF，markdown 提取文字后分块
+        self.pdf_split = "pdf"
+        # 直接 HTTP 下载（见 http_download）；为 None 时总是用浏览器
+        self.http = HTTPDownloader(self.config_dir / "storage_state.json") if direct_download else None
+        # 上传后端（默认 notebooklm CLI，见 upload_backends）
+        self.upload_backend = upload_backend or make_upload_backend("cli")
+        # 重试与熔断（见 resilience），默认与上传后端共用，重试统计合在一起
+        self.resilience = resilience or self.upload_backend.resilience
+        # 任务日志（见 job_journal）；为 None 时每次都从头处理
+        self.journal = journal
+        # 转换缓存：同一本书（按文件 SHA-256）再次处理时直接复用；
+        # 章节缓存：新版本的书只重新转换内容有变化的章节
+        self.cache = ConversionCache(
+            self.config_dir / "cache" / "conversions",
+            chapters=ChapterStore(self.config_dir / "cache" / "chapters.sqlite3"),
+        )
 
     def load_credentials(self) -> dict | None:
         """加载 Z-Library 凭据"""
@@ -70,7 +159,6 @@ class ZLibraryAutoUploader:
                 # 点击登录按钮
                 login_button = await page.wait_for_selector('a:has-text("Log in"), a:has-text("登录")', timeout=5000)
                 await login_button.click()
-                await asyncio.sleep(2)
 
                 # 输入邮箱
                 email_input = await page.wait_for_selector('input[type="email"], input[name="email"]', timeout=5000)
@@ -84,11 +172,13 @@ class ZLibraryAutoUploader:
                 submit_button = await page.wait_for_selector('button[type="submit"], button:has-text("Log in"), button:has-text("登录")', timeout=5000)
                 await submit_button.click()
 
-            # 等待登录完成
-            await asyncio.sleep(5)
+            # 等待登录完成（页面网络空闲），而不是固定等待
+            try:
+                await page.wait_for_load_state('networkidle', timeout=self.deadlines.page_load * 1000)
+            except PlaywrightTimeoutError:
+                pass
 
             # 检查是否登录成功
-            current_url = page.url
             page_content = await page.content()
 
             if "logout" in page_content.lower() or "登录" not in page_content:
@@ -102,10 +192,26 @@ class ZLibraryAutoUploader:
             print(f"❌ 登录过程出错: {e}")
             return False
 
-    async def download_from_zlibrary(self, url: str) -> Path | None:
-        """从 Z-Library 下载书籍"""
+    def new_browser_pool(self, contexts: int = 1, pages_per_context: int = 1, max_page_uses: int = 20) -> BrowserPool:
+        """创建浏览器池（需 await pool.start()）
+
+        单个上下文直接使用持久化的浏览器配置；多个上下文时各自从
+        login.py 保存的会话状态启动。
+        """
+        storage_state = self.config_dir / "storage_state.json" if contexts > 1 else None
+        return BrowserPool(
+            self.config_dir / "browser_profile",
+            storage_state=storage_state,
+            contexts=contexts,
+            pages_per_context=pages_per_context,
+            max_page_uses=max_page_uses,
+            headless=self.headless,
+        )
+
+    async def download_from_zlibrary(self, url: str) -> tuple[Path | None, str | None]:
+        """从 Z-Library 下载书籍，返回 (文件路径, 格式)；失败时返回 (None, None)"""
         print("="*70)
-        print("🌐 启动浏览器自动化下载")
+        print("🌐 下载书籍")
         print("="*70)
 
         # 检查是否有保存的会话
@@ -114,339 +220,268 @@ class ZLibraryAutoUploader:
         if not storage_state.exists():
             print("❌ 未找到会话状态")
             print("💡 请先运行: python3 /tmp/zlibrary_login.py")
-            return None
+            return None, None
 
-        print(f"✅ 使用已保存的会话")
+        print("✅ 使用已保存的会话")
 
-        async with async_playwright() as p:
-            # 启动浏览器（使用持久化上下文）
+        # 页面已有直接下载链接时不启动浏览器
+        if self.http is not None:
+            downloaded_file, file_format = await self._download_direct(url)
+            if downloaded_file:
+                return downloaded_file, file_format
+
+        # 没有共享的浏览器池时，为这一本书临时启动浏览器（使用持久化上下文）
+        pool = self.pool
+        if pool is None:
             print("🚀 启动浏览器...")
+            pool = await self.new_browser_pool().start()
+
+        try:
+            async with pool.page() as page:
+                page.set_default_timeout(self.deadlines.page_load * 1000)
+
+                # 整个下载过程有总时限，超时即放弃
+                return await asyncio.wait_for(self._download_book(page, url), self.deadlines.total)
+
+        except asyncio.TimeoutError:
+            print(f"❌ 下载超时（超过 {self.deadlines.total:.0f} 秒）")
+            return None, None
+        except CircuitOpenError as e:
+            print(f"❌ {e}")
+            return None, None
+        except Exception as e:
+            print(f"❌ 下载失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return None, None
+        finally:
+            if pool is not self.pool:
+                await pool.close()
+
+    async def _download_direct(self, url: str) -> tuple[Path | None, str | None]:
+        """用保存的 cookie 直接下载；页面需要格式转换、没有直接链接或
+        直接下载失败时返回 (None, None)，由浏览器接手"""
+        host = urlparse(url).netloc
+        try:
+            print("⚡ 查找直接下载链接...")
+            link = await self.resilience.call(
+                "navigate", host, lambda: self.http.find_download_link(url), retry_on=(TransientHTTPError,)
+            )
+            if link is None:
+                print("🌐 页面需要浏览器处理（格式转换或没有直接下载链接）")
+                return None, None
 
-            browser = await p.chromium.launch_persistent_context(
-                user_data_dir=str(self.config_dir / "browser_profile"),
-                headless=False,
-                accept_downloads=True,
-                args=['--disable-blink-features=AutomationControlled']
+            print(f"⬇️  直接下载: {link}")
+            entry = await self.resilience.call(
+                "download", urlparse(link).netloc,
+                lambda: self.http.download(link, self.store, referer=url, deadline=self.deadlines.download),
+                retry_on=(TransientHTTPError,),
             )
+        except (HTTPDownloadError, CircuitOpenError) as e:
+            print(f"⚠️  直接下载失败，改用浏览器: {e}")
+            return None, None
+
+        return self._downloaded(entry, entry["path"].suffix.lstrip('.').lower() or None)
+
+    def _downloaded(self, entry: dict, downloaded_format: str | None) -> tuple[Path, str | None]:
+        """打印下载库返回的结果，返回 (文件路径, 格式)"""
+        download_path = entry["path"]
+        print("✅ 下载成功!")
+        print(f"   格式: {downloaded_format.upper() if downloaded_format else '未知'}")
+        print(f"   文件: {download_path.name}")
+        print(f"   路径: {download_path}")
+        print(f"   大小: {entry['size'] / 1024:.1f} KB")
+        print(f"   SHA-256: {entry['sha256'][:16]}...")
+        if entry["duplicate"]:
+            print("♻️  下载库中已有相同内容的文件，使用已有文件")
+        return download_path, downloaded_format
+
+    async def _download_book(self, page, url: str) -> tuple[Path | None, str | None]:
+        """在已打开的页面中完成一本书的下载"""
+        deadlines = self.deadlines
+        host = urlparse(url).netloc
+
+        async def open_page():
+            # 访问目标页面
+            print("📖 访问书籍页面...")
+            await page.goto(url, wait_until='domcontentloaded', timeout=deadlines.page_load * 1000)
+
+        # 只有打开页面本身（网络错误、加载超时）会重试并计入熔断
+        await self.resilience.call("navigate", host, open_page, retry_on=(PlaywrightError,))
+
+        # 等待下载相关的元素出现，而不是固定等待；页面已打开但没有下载区域
+        # 时重新打开也无济于事，交给 _find_download_link 处理
+        print("⏳ 等待页面加载...")
+        try:
+            await page.wait_for_selector(DOWNLOAD_UI_SELECTOR, state='attached', timeout=deadlines.page_load * 1000)
+        except PlaywrightTimeoutError:
+            print("⚠️  未检测到下载区域，继续尝试...")
 
-            page = browser.pages[0] if browser.pages else await browser.new_page()
-            page.set_default_timeout(60000)
+        # 步骤1: 查找下载方式（优先 PDF，然后 EPUB）
+        print("🔍 步骤1: 查找下载方式...")
+        download_link, downloaded_format = await self._find_download_link(page)
 
-            # 设置下载处理
-            download_path = None
+        if not download_link:
+            print("❌ 未找到下载链接")
+            return None, None
 
-            async def handle_download(download):
-                nonlocal download_path
-                print("✅ 检测到下载开始...")
-                suggested_filename = download.suggested_filename
-                print(f"📄 文件名: {suggested_filename}")
-                download_path = self.downloads_dir / suggested_filename
-                await download.save_as(download_path)
-                print(f"💾 已保存: {download_path}")
+        # 步骤2: 点击下载，并等待浏览器的下载事件
+        print("⬇️  步骤2: 点击下载链接...")
 
-            page.on('download', handle_download)
+        async def start_download():
+            async with page.expect_download(timeout=deadlines.download_start * 1000) as download_info:
+                await download_link.evaluate('el => el.click()')
+                print("✅ 点击成功")
+            return await download_info.value
 
+        # 没有开始下载时只重新点击，不重新打开页面
+        try:
+            download = await self.resilience.call("download", host, start_download, retry_on=(PlaywrightTimeoutError,))
+        except PlaywrightTimeoutError:
+            print(f"❌ {deadlines.download_start:.0f} 秒内未开始下载")
+            return None, None
+
+        print("✅ 检测到下载开始...")
+        suggested_filename = download.suggested_filename
+        print(f"📄 文件名: {suggested_filename}")
+        if not downloaded_format:
+            downloaded_format = Path(suggested_filename).suffix.lstrip('.').lower() or None
+
+        # 步骤3: 等待下载完成（save_as 在下载结束后返回）
+        print("⏳ 步骤3: 等待下载完成...")
+        # 先保存到下载库中每次下载独有的临时路径，再按内容哈希移入下载库
+        download_path = self.store.temp_path()
+        try:
+            await asyncio.wait_for(download.save_as(download_path), deadlines.download)
+        except asyncio.TimeoutError:
+            await download.cancel()
+            download_path.unlink(missing_ok=True)
+            print(f"❌ 下载未在 {deadlines.download:.0f} 秒内完成")
+            return None, None
+
+        failure = await download.failure()
+        if failure or not download_path.exists() or not download_path.stat().st_size:
+            download_path.unlink(missing_ok=True)
+            print(f"❌ 下载失败: {failure or '文件不存在'}")
+            return None, None
+
+        entry = await asyncio.to_thread(self.store.add, download_path, suggested_filename)
+        return self._downloaded(entry, downloaded_format)
+
+    async def _find_download_link(self, page):
+        """查找下载链接（优先 PDF，然后 EPUB），返回 (元素, 格式)"""
+        deadlines = self.deadlines
+
+        # 首先检查是否有三个点的菜单按钮（新界面）
+        dots_button = await page.query_selector('button[aria-label="更多选项"], button[title="更多"], .more-options, [class*="dots"], [class*="more"]')
+
+        if dots_button:
+            print("📱 检测到新版界面（三点菜单）")
+            # 点击打开菜单，等待格式选项出现
+            await dots_button.click()
             try:
-                # 访问目标页面
-                print(f"📖 访问书籍页面...")
-                await page.goto(url, wait_until='domcontentloaded', timeout=60000)
-
-                print("⏳ 等待页面加载...")
-                await asyncio.sleep(5)
-
-                # 步骤1: 查找下载方式（优先 PDF，然后 EPUB）
-                print("🔍 步骤1: 查找下载方式...")
-
-                # 首先检查是否有三个点的菜单按钮（新界面）
-                dots_button = await page.query_selector('button[aria-label="更多选项"], button[title="更多"], .more-options, [class*="dots"], [class*="more"]')
-
-                download_link = None
-                downloaded_format = None
-
-                if dots_button:
-                    print("📱 检测到新版界面（三点菜单）")
-                    # 点击打开菜单
-                    await dots_button.click()
-                    await asyncio.sleep(2)
-
-                    # 查找 PDF 选项（优先）
-                    print("🔍 查找 PDF 选项...")
-                    pdf_options = await page.query_selector_all('a:has-text("PDF"), button:has-text("PDF")')
-                    if pdf_options:
-                        # 选择第一个 PDF（通常文件最小）
-                        download_link = pdf_options[0]
-                        downloaded_format = 'pdf'
-                        print(f"✅ 找到 PDF 选项")
-                    else:
-                        # 备选：查找 EPUB
-                        print("🔍 未找到 PDF，查找 EPUB 选项...")
-                        epub_options = await page.query_selector_all('a:has-text("EPUB"), button:has-text("EPUB")')
-                        if epub_options:
-                            download_link = epub_options[0]
-                            downloaded_format = 'epub'
-                            print(f"✅ 找到 EPUB 选项")
-
-                else:
-                    # 旧界面：检查转换按钮
-                    print("📱 检测到旧版界面")
-                    convert_selector_pdf = 'a[data-convert_to="pdf"]'
-                    convert_selector_epub = 'a[data-convert_to="epub"]'
-
-                    # 优先尝试 PDF
-                    convert_button = await page.query_selector(convert_selector_pdf)
-
-                    if convert_button:
-                        print("📝 检测到 PDF 转换按钮")
-                        downloaded_format = 'pdf'
-                        await convert_button.evaluate('el => el.click()')
-                        print("✅ 已点击 PDF 转换按钮")
-
-                        # 等待转换完成
-                        print("⏳ 等待 PDF 转换完成...")
-                        for i in range(60):
-                            await asyncio.sleep(1)
-                            try:
-                                message = await page.query_selector('.message:has-text("转换为")')
-                                if message:
-                                    message_text = await message.inner_text()
-                                    if 'pdf' in message_text.lower() and '完成' in message_text:
-                                        print("✅ PDF 转换已完成!")
-                                        break
-                            except:
-                                pass
-                            if i % 10 == 0 and i > 0:
-                                print(f"   ⏳ 等待中... {i}秒")
-
-                        # 查找下载链接
-                        download_link = await page.query_selector('a[href*="/dl/"][href*="convertedTo=pdf"]')
-
-                        if not download_link:
-                            all_links = await page.query_selector_all('a[href*="/dl/"]')
-                            if all_links:
-                                download_link = all_links[0]
-                                href = await download_link.get_attribute('href')
-                                print(f"✅ 找到下载链接: {href}")
-
-                    else:
-                        # 备选：尝试 EPUB
-                        convert_button = await page.query_selector(convert_selector_epub)
-
-                        if convert_button:
-                            print("📝 检测到 EPUB 转换按钮")
-                            downloaded_format = 'epub'
-                            await convert_button.evaluate('el => el.click()')
-                            print("✅ 已点击 EPUB 转换按钮")
-
-                            # 等待转换完成
-                            print("⏳ 等待 EPUB 转换完成...")
-                            for i in range(60):
-                                await asyncio.sleep(1)
-                                try:
-                                    message = await page.query_selector('.message:has-text("转换为")')
-                                    if message:
-                                        message_text = await message.inner_text()
-                                        if 'epub' in message_text.lower() and '完成' in message_text:
-                                            print("✅ EPUB 转换已完成!")
-                                            break
-                                except:
-                                    pass
-                                if i % 10 == 0 and i > 0:
-                                    print(f"   ⏳ 等待中... {i}秒")
-
-                            # 查找下载链接
-                            download_link = await page.query_selector('a[href*="/dl/"][href*="convertedTo=epub"]')
-
-                            if not download_link:
-                                all_links = await page.query_selector_all('a[href*="/dl/"]')
-                                if all_links:
-                                    download_link = all_links[0]
-                                    href = await download_link.get_attribute('href')
-                                    print(f"✅ 找到下载链接: {href}")
-
-                # 如果还是没找到，尝试直接下载链接
-                if not download_link:
-                    print("🔍 未检测到转换按钮，查找直接下载链接...")
-
-                    selectors = [
-                        'a[href*="/dl/"]',
-                        'a:has-text("下载")',
-                        'a:has-text("Download")',
-                        'button:has-text("下载")',
-                    ]
-
-                    for selector in selectors:
-                        try:
-                            links = await page.query_selector_all(selector)
-                            if links:
-                                for link in links:
-                                    href = await link.get_attribute('href')
-                                    if href and '/dl/' in href:
-                                        download_link = link
-                                        # 从 URL 判断格式
-                                        if 'pdf' in href.lower():
-                                            downloaded_format = 'pdf'
-                                        elif 'epub' in href.lower():
-                                            downloaded_format = 'epub'
-                                        print(f"✅ 找到下载链接: {href} (格式: {downloaded_format})")
-                                        break
-                                if download_link:
-                                    break
-                        except:
-                            continue
+                await page.wait_for_selector(FORMAT_OPTION_SELECTOR, timeout=deadlines.menu * 1000)
+            except PlaywrightTimeoutError:
+                pass
+
+            # 查找 PDF 选项（优先）
+            print("🔍 查找 PDF 选项...")
+            pdf_options = await page.query_selector_all('a:has-text("PDF"), button:has-text("PDF")')
+            if pdf_options:
+                # 选择第一个 PDF（通常文件最小）
+                print("✅ 找到 PDF 选项")
+                return pdf_options[0], 'pdf'
+
+            # 备选：查找 EPUB
+            print("🔍 未找到 PDF，查找 EPUB 选项...")
+            epub_options = await page.query_selector_all('a:has-text("EPUB"), button:has-text("EPUB")')
+            if epub_options:
+                print("✅ 找到 EPUB 选项")
+                return epub_options[0], 'epub'
 
-                if not download_link:
-                    print("❌ 未找到下载链接")
-                    await browser.close()
-                    return None
+        else:
+            # 旧界面：检查转换按钮（优先 PDF，然后 EPUB）
+            print("📱 检测到旧版界面")
+            for fmt in ('pdf', 'epub'):
+                convert_button = await page.query_selector(f'a[data-convert_to="{fmt}"]')
+                if not convert_button:
+                    continue
 
-                # 点击下载
-                print("⬇️  步骤2: 点击下载链接...")
+                print(f"📝 检测到 {fmt.upper()} 转换按钮")
+                await convert_button.evaluate('el => el.click()')
+                print(f"✅ 已点击 {fmt.upper()} 转换按钮")
 
+                # 等待页面提示转换完成
+                print(f"⏳ 等待 {fmt.upper()} 转换完成...")
                 try:
-                    await download_link.evaluate('el => el.click()')
-                    print("✅ 点击成功")
-                except Exception as e:
-                    print(f"❌ 点击失败: {e}")
-                    await browser.close()
-                    return None
-
-                # 等待下载
-                print("⏳ 步骤3: 等待下载完成...")
-                await asyncio.sleep(20)
-
-                # 检查结果
-                if download_path and download_path.exists():
-                    file_size = download_path.stat().st_size / 1024
-                    print(f"✅ 下载成功!")
-                    print(f"   格式: {downloaded_format.upper() if downloaded_format else '未知'}")
-                    print(f"   文件: {download_path.name}")
-                    print(f"   路径: {download_path}")
-                    print(f"   大小: {file_size:.1f} KB")
-                    await browser.close()
-                    return download_path, downloaded_format
-
-                # 备选：检查下载目录
-                print("🔍 检查下载目录...")
-
-                # 根据格式查找文件
-                if downloaded_format == 'pdf':
-                    pattern = "*.pdf"
-                else:
-                    pattern = "*.epub"
-
-                downloaded_files = list(self.downloads_dir.glob(pattern))
-
-                if downloaded_files:
-                    latest_file = max(downloaded_files, key=lambda p: p.stat().st_mtime)
-                    file_age = time.time() - latest_file.stat().st_mtime
-
-                    if file_age < 120:
-                        file_size = latest_file.stat().st_size / 1024
-                        print(f"✅ 下载成功!")
-                        print(f"   格式: {downloaded_format.upper() if downloaded_format else '未知'}")
-                        print(f"   文件: {latest_file.name}")
-                        print(f"   路径: {latest_file}")
-                        print(f"   大小: {file_size:.1f} KB")
-                        await browser.close()
-                        return latest_file, downloaded_format
-
-                print("❌ 未找到下载的文件")
-                await browser.close()
-                return None, None
+                    await page.wait_for_function(
+                        CONVERSION_DONE_JS, arg=fmt, timeout=deadlines.conversion * 1000
+                    )
+                    print(f"✅ {fmt.upper()} 转换已完成!")
+                except PlaywrightTimeoutError:
+                    print(f"⚠️  {deadlines.conversion:.0f} 秒内未看到转换完成提示，继续查找下载链接")
+
+                # 查找下载链接
+                download_link = await page.query_selector(f'a[href*="/dl/"][href*="convertedTo={fmt}"]')
+                if not download_link:
+                    download_link = await page.query_selector('a[href*="/dl/"]')
+                    if download_link:
+                        href = await download_link.get_attribute('href')
+                        print(f"✅ 找到下载链接: {href}")
+                if download_link:
+                    return download_link, fmt
+                break
+
+        # 如果还是没找到，尝试直接下载链接
+        print("🔍 未检测到转换按钮，查找直接下载链接...")
+
+        selectors = [
+            'a[href*="/dl/"]',
+            'a:has-text("下载")',
+            'a:has-text("Download")',
+            'button:has-text("下载")',
+        ]
+
+        for selector in selectors:
+            try:
+                links = await page.query_selector_all(selector)
+                for link in links:
+                    href = await link.get_attribute('href')
+                    if href and '/dl/' in href:
+                        # 从 URL 判断格式
+                        downloaded_format = None
+                        if 'pdf' in href.lower():
+                            downloaded_format = 'pdf'
+                        elif 'epub' in href.lower():
+                            downloaded_format = 'epub'
+                        print(f"✅ 找到下载链接: {href} (格式: {downloaded_format})")
+                        return link, downloaded_format
+            except Exception:
+                continue
 
-            except Exception as e:
-                print(f"❌ 下载失败: {e}")
-                import traceback
-                traceback.print_exc()
-                await browser.close()
-                return None, None
+        return None, None
 
     def count_words(self, text: str) -> int:
         """统计中英文单词数"""
-        import re
-        # 匹配中文字符
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        # 匹配英文单词
-        english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-        return chinese_chars + english_words
-
-    def split_markdown_file(self, file_path: Path, max_words: int = 350000) -> list[Path]:
-        """分割大 Markdown 文件为多个小文件"""
-        print(f"📊 文件过大，开始分割...")
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        total_words = self.count_words(content)
-        print(f"   总词数: {total_words:,}")
+        return count_words(text)
+
+    def split_markdown_file(self, file_path: Path, max_words: int = 350000, cache_key: str = None) -> list[Path]:
+        """分割大 Markdown 文件为多个小文件（给出 cache_key 时复用缓存的分块方案）"""
+        print("📊 文件过大，开始分割...")
+
+        # 按章节（#、##、### 标题）分割，超大章节再按段落分割；
+        # 分块数取最少，各块大小尽量均衡
+        policy = ChunkPolicy(max_words=max_words, balance=True)
+        if cache_key:
+            parts = self.cache.plan_parts(cache_key, file_path, policy)
+        else:
+            parts = plan_parts(file_path, policy)
+        print(f"   总词数: {sum(part.words for part in parts):,}")
         print(f"   每块最大: {max_words:,} 词")
 
-        # 按章节分割（寻找 ## 或 ### 标题）
-        import re
-        chapters = re.split(r'\n(?=#{1,3}\s)', content)
-
-        chunks = []
-        current_chunk = ""
-        current_words = 0
-        chunk_num = 1
-
-        for i, chapter in enumerate(chapters):
-            chapter_words = self.count_words(chapter)
-
-            # 如果单个章节就超过限制，需要进一步分割
-            if chapter_words > max_words:
-                # 先保存当前 chunk
-                if current_chunk:
-                    chunks.append(current_chunk)
-                    chunk_num += 1
-                    current_chunk = ""
-                    current_words = 0
-
-                # 分割大章节（按段落）
-                paragraphs = chapter.split('\n\n')
-                temp_chunk = ""
-                temp_words = 0
-
-                for para in paragraphs:
-                    para_words = self.count_words(para)
-                    if temp_words + para_words > max_words and temp_chunk:
-                        chunks.append(temp_chunk)
-                        chunk_num += 1
-                        temp_chunk = para + "\n\n"
-                        temp_words = para_words
-                    else:
-                        temp_chunk += para + "\n\n"
-                        temp_words += para_words
-
-                if temp_chunk:
-                    current_chunk = temp_chunk
-                    current_words = temp_words
-
-            elif current_words + chapter_words > max_words:
-                # 当前 chunk 已满，保存并开始新的
-                chunks.append(current_chunk)
-                chunk_num += 1
-                current_chunk = chapter + "\n\n"
-                current_words = chapter_words
-            else:
-                # 添加到当前 chunk
-                current_chunk += chapter + "\n\n"
-                current_words += chapter_words
-
-        # 保存最后一个 chunk
-        if current_chunk:
-            chunks.append(current_chunk)
-
-        # 写入文件
-        chunk_files = []
-        stem = file_path.stem
-        for i, chunk in enumerate(chunks, 1):
-            chunk_file = file_path.parent / f"{stem}_part{i}.md"
-            with open(chunk_file, 'w', encoding='utf-8') as f:
-                f.write(chunk)
-            chunk_files.append(chunk_file)
-            chunk_words = self.count_words(chunk)
-            print(f"   ✅ Part {i}/{len(chunks)}: {chunk_words:,} 词")
+        chunk_files = write_parts(file_path, parts)
+        for i, part in enumerate(parts, 1):
+            print(f"   ✅ Part {i}/{len(parts)}: {part.words:,} 词")
 
         return chunk_files
 
@@ -457,204 +492,358 @@ class ZLibraryAutoUploader:
         print("📝 处理文件")
         print("="*70)
 
+        # 下载库中的书转换到它自己的目录，不同的书同名也不会互相覆盖；
+        # 先写入这次转换私有的临时目录，完成后再原子地移入，其他进程
+        # 同时转换同一本书也不会读到写了一半的文件
+        staging = self.store.staging_dir(file_path)
+        if staging is None:
+            return self._convert(file_path, file_format, self.temp_dir / f"{file_path.stem}.md")
+        try:
+            result = self._convert(file_path, file_format, staging / f"{file_path.stem}.md")
+        except BaseException:
+            self.store.discard_staging(staging)
+            raise
+        return self.store.publish(staging, result)
+
+    def _convert(self, file_path: Path, file_format: str | None, md_file: Path) -> Path | list[Path]:
+        """convert_to_txt 的转换本身：生成的文件写在 md_file 所在目录"""
         file_ext = file_path.suffix.lower()
 
-        # 如果是 PDF，直接使用（方案 A）
+        # 如果是 PDF，不超过词数限制时直接使用（方案 A），否则提取文字后分块
         if file_ext == '.pdf' or file_format == 'pdf':
-            print("✅ 检测到 PDF 格式，直接使用")
+            print("✅ 检测到 PDF 格式")
             print(f"   文件: {file_path.name}")
-            return file_path
-
-        md_file = self.temp_dir / f"{file_path.stem}.md"
+            return self._prepare_pdf(file_path, md_file)
 
         # 如果是 EPUB，转换为 Markdown
         if file_ext == '.epub':
             print("📖 检测到 EPUB 格式，转换为 Markdown...")
-            # 获取脚本所在目录
-            script_dir = Path(__file__).parent
-            convert_script = script_dir / "convert_epub.py"
+            stats = self.cache.epub_to_markdown(file_path, md_file)
 
-            cmd = f"python3 '{convert_script}' '{file_path}' '{md_file}'"
-            import subprocess
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                print(f"❌ 转换失败: {result.stderr}")
+            if not stats:
+                print(f"❌ 转换失败: {file_path}")
                 return file_path
 
-            print(f"✅ 转换成功: {md_file}")
+            if stats["cached"]:
+                print(f"✅ 命中转换缓存: {md_file}")
+            else:
+                print(f"✅ 转换成功: {md_file}")
 
-            # 检查文件大小，如果过大则分割
-            word_count = self.count_words(open(md_file, 'r', encoding='utf-8').read())
+            # 检查文件大小，如果过大则分割（词数在转换时已统计）
+            word_count = stats["words"]
             print(f"📊 词数统计: {word_count:,}")
 
             if word_count > 350000:
-                print(f"⚠️  文件超过 350k 词（NotebookLM CLI 限制）")
-                return self.split_markdown_file(md_file)
+                print("⚠️  文件超过 350k 词（NotebookLM CLI 限制）")
+                return self.split_markdown_file(md_file, cache_key=stats["key"])
             else:
                 return md_file
 
-        else:
-            print(f"ℹ️  文件格式: {file_ext}，直接使用")
+        # 纯文本按流统计词数（不整本读入内存），超过限制时复制到工作目录分块
+        if file_ext in ('.txt', '.md'):
+            word_count = count_file_words(file_path)
+            print(f"📊 词数统计: {word_count:,}")
+            if word_count > 350000:
+                print("⚠️  文件超过 350k 词（NotebookLM CLI 限制）")
+                if md_file != file_path:
+                    shutil.copyfile(file_path, md_file)
+                return self.split_markdown_file(md_file)
             return file_path
 
-    def upload_to_notebooklm(self, file_path: Path | list[Path], title: str = None) -> dict:
-        """上传到 NotebookLM"""
-        print("")
-        print("="*70)
-        print("⬆️  上传到 NotebookLM")
-        print("="*70)
-
-        # 处理文件列表（分割后的文件）
-        if isinstance(file_path, list):
-            print(f"📦 检测到 {len(file_path)} 个文件分块")
+        print(f"ℹ️  文件格式: {file_ext}，直接使用")
+        return file_path
 
-            # 使用第一个文件确定书名
-            first_file = file_path[0]
-            if not title:
-                title = first_file.stem.replace('_part1', '').replace('_', ' ')
-                # 清理文件名
-                title = re.sub(r'\[.*?\]', '', title)
-                title = re.sub(r'\(.*?\)', '', title)
-                title = re.sub(r'\s+', ' ', title).strip()
-                if len(title) > 50:
-                    title = title[:50] + "..."
-
-            # 创建笔记本
-            print(f"📚 创建笔记本: {title}")
-            import subprocess
-            import json
-
-            cmd = f"notebooklm create '{title}' --json"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                return {"success": False, "error": result.stderr}
+    def _prepare_pdf(self, file_path: Path, md_file: Path) -> Path | list[Path]:
+        """PDF 不超过 350k 词和 200MB 时原样返回；否则按 pdf_split 分块：
+        pdf 按页码范围切成多个 PDF，markdown 提取文字（按页并行）后分块。
+        超过 200MB 的 PDF 总是按页码范围切分（扫描版没有文字层，换成提取的
+        文字会丢掉内容）"""
+        try:
+            pages = page_count(file_path)
+        except Exception as e:
+            print(f"⚠️  无法读取 PDF 页数（{e}），直接使用")
+            return file_path
+        size = file_path.stat().st_size
+        if pages * MAX_WORDS_PER_PAGE <= 350000 and size <= MAX_SOURCE_BYTES:
+            print(f"   页数: {pages}，不会超过词数限制，直接使用")
+            return file_path
 
+        if self.pdf_split == "pdf" or size > MAX_SOURCE_BYTES:
+            print(f"📄 共 {pages} 页（{size / 2**20:.1f} MB），按页码范围分割...")
             try:
-                data = json.loads(result.stdout)
-                notebook_id = data['notebook']['id']
-                print(f"✅ 笔记本已创建 (ID: {notebook_id[:8]}...)")
-            except:
-                return {"success": False, "error": "解析笔记本 ID 失败"}
-
-            # 设置上下文
-            print(f"🎯 设置笔记本上下文...")
-            cmd = f"notebooklm use {notebook_id}"
-            subprocess.run(cmd, shell=True, capture_output=True)
-
-            # 上传所有分块
-            source_ids = []
-            for i, chunk_file in enumerate(file_path, 1):
-                print(f"📄 上传分块 {i}/{len(file_path)}: {chunk_file.name}")
-                cmd = f"notebooklm source add '{chunk_file}' --json"
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-
-                if result.returncode != 0:
-                    print(f"⚠️  分块 {i} 上传失败: {result.stderr}")
-                    continue
+                parts = split_pdf(file_path, md_file.parent, max_words=350000, max_bytes=MAX_SOURCE_BYTES,
+                                  workers=self.pdf_workers)
+            except Exception as e:
+                print(f"⚠️  分割失败（{e}），直接使用 PDF")
+                return file_path
+            if len(parts) == 1:
+                print("   不超过词数和大小限制，直接使用")
+                return file_path
+            for i, part in enumerate(parts, 1):
+                print(f"   ✅ Part {i}/{len(parts)}: {part.name} ({part.stat().st_size / 2**20:.1f} MB)")
+            return parts
+
+        print(f"📄 共 {pages} 页，提取文字统计词数...")
+        stats = pdf_to_markdown(file_path, md_file, workers=self.pdf_workers)
+        if not stats:
+            print("⚠️  提取文字失败，直接使用 PDF")
+            return file_path
 
-                try:
-                    data = json.loads(result.stdout)
-                    source_id = data['source']['id']
-                    source_ids.append(source_id)
-                    print(f"   ✅ 成功 (ID: {source_id[:8]}...)")
-                except:
-                    print(f"⚠️  分块 {i} 解析失败")
-
-            return {
-                "success": len(source_ids) > 0,
-                "notebook_id": notebook_id,
-                "source_ids": source_ids,
-                "title": title,
-                "chunks": len(file_path)
-            }
+        word_count = stats["words"]
+        print(f"📊 词数统计: {word_count:,}")
+        if word_count > 350000:
+            print("⚠️  文件超过 350k 词（NotebookLM 限制）")
+            return self.split_markdown_file(md_file)
+        md_file.unlink(missing_ok=True)
+        return file_path
 
-        # 单文件上传
-        # 确定书名
-        if not title:
+    def notebook_title(self, file_path: Path | list[Path]) -> str:
+        """由文件名（分块时取第一块）生成笔记本标题"""
+        if isinstance(file_path, list):
+            title = file_path[0].stem.replace('_part1', '').replace('_', ' ')
+        else:
             title = file_path.stem.replace('_', ' ')
-            # 清理文件名
-            title = re.sub(r'\[.*?\]', '', title)
-            title = re.sub(r'\(.*?\)', '', title)
-            title = re.sub(r'\s+', ' ', title).strip()
-            # 截断过长的书名
-            if len(title) > 50:
-                title = title[:50] + "..."
-
-        # 创建笔记本
-        print(f"📚 创建笔记本: {title}")
-        import subprocess
-        import json
+        # 清理文件名
+        title = re.sub(r'\[.*?\]', '', title)
+        title = re.sub(r'\(.*?\)', '', title)
+        title = re.sub(r'\s+', ' ', title).strip()
+        # 截断过长的书名
+        if len(title) > 50:
+            title = title[:50] + "..."
+        return title
+
+    async def upload_to_notebooklm_async(self, file_path: Path | list[Path], title: str = None,
+                                         url: str = None) -> dict:
+        """上传到 NotebookLM（分块并发上传，不阻塞事件循环）
+
+        给出 url 且启用了任务日志时，笔记本和每个分块的来源 ID 都会记入
+        日志；重跑时继续上传到同一个笔记本，只补传缺少的分块。
+        """
+        print("")
+        print("="*70)
+        print("⬆️  上传到 NotebookLM")
+        print("="*70)
 
-        cmd = f"notebooklm create '{title}' --json"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        files = file_path if isinstance(file_path, list) else [file_path]
+        options = {}
+        job = self.journal.get(url) if self.journal and url else None
+        if job:
+            if job["notebook_id"]:
+                title = title or job["title"]
+                options.update(notebook_id=job["notebook_id"], uploaded=job["sources"])
+            options.update(
+                on_notebook=lambda notebook_id: self.journal.record_notebook(url, notebook_id, title),
+                on_source=lambda part, source_id: self.journal.record_source(url, part, source_id),
+            )
 
-        if result.returncode != 0:
-            return {"success": False, "error": result.stderr}
+        if not title:
+            title = self.notebook_title(file_path)
 
-        try:
-            data = json.loads(result.stdout)
-            notebook_id = data['notebook']['id']
-            print(f"✅ 笔记本已创建 (ID: {notebook_id[:8]}...)")
-        except:
-            return {"success": False, "error": "解析笔记本 ID 失败"}
+        # 处理文件列表（分割后的文件）
+        if isinstance(file_path, list):
+            print(f"📦 检测到 {len(file_path)} 个文件分块")
+        result = await self.upload_backend.upload(files, title, **options)
+        if job and result["success"]:
+            self.journal.mark_completed(url)
 
-        # 设置上下文
-        print(f"🎯 设置笔记本上下文...")
-        cmd = f"notebooklm use {notebook_id}"
-        subprocess.run(cmd, shell=True, capture_output=True)
+        if isinstance(file_path, list):
+            if "notebook_id" in result:
+                result["chunks"] = len(file_path)
+            return result
 
-        # 上传文件
-        print(f"📄 上传文件...")
-        cmd = f"notebooklm source add '{file_path}' --json"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        # 单文件上传
+        if not result["success"]:
+            error = result.get("error") or "; ".join(result["errors"])
+            return {"success": False, "error": error}
+        return {
+            "success": True,
+            "notebook_id": result["notebook_id"],
+            "source_id": result["source_ids"][0],
+            "title": title
+        }
+
+    def upload_to_notebooklm(self, file_path: Path | list[Path], title: str = None, url: str = None) -> dict:
+        """上传到 NotebookLM（同步版本，供事件循环之外调用）"""
+        return asyncio.run(self.upload_to_notebooklm_async(file_path, title, url))
+
+    def completed_result(self, url: str) -> dict | None:
+        """任务日志中已全部完成的书的上传结果，否则 None"""
+        job = self.journal.get(url) if self.journal else None
+        if not job or not job["completed"]:
+            return None
+        print(f"♻️  已完成（任务日志）: {job['title']}")
+        result = {"success": True, "notebook_id": job["notebook_id"], "title": job["title"]}
+        if len(job["parts"]) > 1:
+            result.update(source_ids=[job["sources"][i] for i in sorted(job["sources"])], chunks=len(job["parts"]))
+        else:
+            result["source_id"] = job["sources"][1]
+        return result
+
+    async def fetch_book(self, url: str) -> tuple[Path | None, str | None]:
+        """下载书籍；任务日志中已有完好的下载文件时直接使用
+
+        下载到的内容与任务日志中已完成的另一本书相同时，这本书也记为
+        完成（之后 completed_result 返回那本书的结果）。
+        """
+        job = self.journal.get(url) if self.journal else None
+        if job and job["file"]:
+            file_path = Path(job["file"])
+            if file_path.exists() and file_sha256(file_path) == job["sha256"]:
+                print(f"♻️  跳过下载（任务日志中已有）: {file_path.name}")
+                return file_path, job["format"]
+
+        downloaded_file, file_format = await self.download_from_zlibrary(url)
+        if self.journal and downloaded_file and downloaded_file.exists():
+            sha256 = self.store.sha256_of(downloaded_file) or file_sha256(downloaded_file)
+            self.journal.record_download(url, downloaded_file, sha256, file_format)
+            # 内容相同的书已经通过其他 URL 处理完成时，直接沿用那次的结果
+            source_url = self.journal.adopt_completed(url, sha256)
+            if source_url:
+                print(f"♻️  与已完成的 {source_url} 内容相同，跳过转换和上传")
+        return downloaded_file, file_format
+
+    def journaled_conversion(self, url: str) -> Path | list[Path] | None:
+        """任务日志中记录的转换结果（文件都还在时），否则 None"""
+        job = self.journal.get(url) if self.journal else None
+        if not job or not job["parts"]:
+            return None
+        parts = [Path(p) for p in job["parts"]]
+        if not all(p.exists() for p in parts):
+            return None
+        print(f"♻️  跳过转换（任务日志中已有 {len(parts)} 个文件）")
+        return parts if len(parts) > 1 else parts[0]
+
+    def record_conversion(self, url: str, final_file: Path | list[Path]):
+        if self.journal:
+            self.journal.record_conversion(url, final_file if isinstance(final_file, list) else [final_file])
+
+
+def print_retry_stats(resilience: Resilience):
+    """有重试或熔断时打印每种操作的统计"""
+    report = resilience.report()
+    for name, stats in report["operations"].items():
+        if stats["retries"] or stats["rejected"]:
+            print(f"🔁 {name}: 调用 {stats['calls']}，重试 {stats['retries']}，重试后成功 {stats['recovered']}，"
+                  f"失败 {stats['failed']}，熔断拒绝 {stats['rejected']}")
+    for host, circuit in report["circuits"].items():
+        if circuit["trips"]:
+            print(f"⛔ {host} 熔断 {circuit['trips']} 次（当前 {circuit['state']}）")
+
+
+async def main_batch(uploader: "ZLibraryAutoUploader", urls: list[str], args):
+    """批量模式：下载、转换、上传流水线并行推进，结果写入汇总 JSON"""
+    if not urls:
+        print("❌ 没有可处理的 URL")
+        sys.exit(1)
 
-        if result.returncode != 0:
-            return {"success": False, "error": result.stderr}
+    print(f"📚 批量处理 {len(urls)} 本书（并发 {args.concurrency}，每站点 {args.per_host}）")
+    started = time.time()
+    uploader.pool = uploader.new_browser_pool(pages_per_context=args.concurrency)
+    await uploader.pool.start()
+    try:
+        results, stages = await run_batch(
+            uploader, urls,
+            concurrency=args.concurrency,
+            per_host=args.per_host,
+            host_interval=args.host_interval,
+            convert_workers=args.convert_workers,
+            queue_size=args.queue_size,
+        )
+    finally:
+        await uploader.pool.close()
+        uploader.pool = None
+
+    summary_path = Path(args.summary or f"batch_summary_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    summary = write_summary(results, summary_path, started, stages, uploader.resilience.report())
 
-        try:
-            data = json.loads(result.stdout)
-            source_id = data['source']['id']
-            print(f"✅ 上传成功 (ID: {source_id[:8]}...)")
-
-            return {
-                "success": True,
-                "notebook_id": notebook_id,
-                "source_id": source_id,
-                "title": title
-            }
-        except:
-            return {"success": False, "error": "解析来源 ID 失败"}
+    print("")
+    print("="*70)
+    print(f"📊 完成 {summary['succeeded']}/{summary['total']}，失败 {summary['failed']}，"
+          f"耗时 {summary['elapsed_seconds']:.0f} 秒")
+    print(f"📁 汇总: {summary_path}")
+    print_retry_stats(uploader.resilience)
+    if hasattr(uploader.upload_backend, "report"):
+        print(f"🧪 {uploader.upload_backend.name} 后端记录: {uploader.upload_backend.report()}")
+    print("="*70)
+    if summary["failed"]:
+        sys.exit(1)
 
 
 async def main():
     """主函数"""
-    if len(sys.argv) < 2:
-        print("Z-Library 全自动下载并上传到 NotebookLM")
-        print("")
-        print("用法: python3 auto_download_and_upload.py <Z-Library URL>")
-        sys.exit(1)
-
-    url = sys.argv[1]
-    uploader = ZLibraryAutoUploader()
-
-    # 下载
-    downloaded_file, file_format = await uploader.download_from_zlibrary(url)
-
-    if not downloaded_file or not downloaded_file.exists():
-        print("")
-        print("="*70)
-        print("❌ 下载失败，无法继续")
-        print("="*70)
+    parser = argparse.ArgumentParser(description="Z-Library 全自动下载并上传到 NotebookLM")
+    parser.add_argument("url", nargs="?", help="Z-Library 书籍页面 URL")
+    parser.add_argument("--batch", metavar="FILE", help="批量模式：每行一个 URL 的文件，- 表示标准输入")
+    parser.add_argument("-c", "--concurrency", type=int, default=3, help="批量模式同时下载的书籍数")
+    parser.add_argument("--per-host", type=int, default=2, help="批量模式同一站点同时下载的书籍数")
+    parser.add_argument("--host-interval", type=float, default=1.0,
+                        help="批量模式同一站点两次下载开始的最小间隔（秒）")
+    parser.add_argument("--convert-workers", type=int, default=0,
+                        help="批量模式转换进程数（0 = 每个 CPU 一个）")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="批量模式阶段之间最多排队的书籍数")
+    parser.add_argument("--summary", metavar="FILE", help="批量模式汇总 JSON 路径")
+    parser.add_argument("--upload-concurrency", type=int, default=3, help="同一本书同时上传的分块数")
+    parser.add_argument("--upload-backend", choices=sorted(UPLOAD_BACKENDS), default="cli",
+                        help="上传后端：cli 调用 notebooklm CLI，fake 为本地替身（基准测试用）")
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="fake 后端每次调用的延迟（秒）")
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0, help="fake 后端调用失败的概率")
+    parser.add_argument("--headless", action="store_true", help="无界面运行浏览器")
+    parser.add_argument("--pdf-split", choices=("pdf", "markdown"), default="pdf",
+                        help="超出限制的 PDF：pdf 按页码范围切成多个 PDF，markdown 提取文字后分块")
+    parser.add_argument("--browser-only", action="store_true",
+                        help="总是用浏览器下载（不尝试用保存的 cookie 直接下载）")
+    parser.add_argument("--no-journal", action="store_true", help="不使用任务日志，每次都从头处理")
+    parser.add_argument("--restart", action="store_true", help="忽略任务日志中已有的记录，从头处理这些书")
+    args = parser.parse_args()
+
+    if not args.url and not args.batch:
+        parser.print_help()
         sys.exit(1)
 
-    # 转换
-    final_file = uploader.convert_to_txt(downloaded_file, file_format)
-
-    # 上传
-    result = uploader.upload_to_notebooklm(final_file)
-
+    options = {"concurrency": args.upload_concurrency}
+    if args.upload_backend == "fake":
+        options.update(latency=args.fake_latency, failure_rate=args.fake_failure_rate)
+    backend = make_upload_backend(args.upload_backend, **options)
+    journal = None if args.no_journal else JobJournal(Path.home() / ".zlibrary" / "jobs.sqlite3")
+    uploader = ZLibraryAutoUploader(headless=args.headless, upload_backend=backend, journal=journal,
+                                    direct_download=not args.browser_only)
+    uploader.pdf_split = args.pdf_split
+    urls = read_urls(args.batch) if args.batch else [args.url]
+    if journal and args.restart:
+        for url in urls:
+            journal.forget(url)
+    if args.batch:
+        await main_batch(uploader, urls, args)
+        return
+
+    url = args.url
+    # 已全部完成的书直接显示任务日志中的结果
+    result = uploader.completed_result(url)
+    if result is None:
+        # 下载
+        downloaded_file, file_format = await uploader.fetch_book(url)
+
+        if not downloaded_file or not downloaded_file.exists():
+            print("")
+            print("="*70)
+            print("❌ 下载失败，无法继续")
+            print("="*70)
+            sys.exit(1)
+
+    # 下载到的书与已完成的书内容相同时不再转换和上传
+    result = result or uploader.completed_result(url)
+    if result is None:
+        # 转换
+        final_file = uploader.journaled_conversion(url)
+        if final_file is None:
+            final_file = uploader.convert_to_txt(downloaded_file, file_format)
+            uploader.record_conversion(url, final_file)
+
+        # 上传
+        result = await uploader.upload_to_notebooklm_async(final_file, url=url)
+
+    print_retry_stats(uploader.resilience)
     print("")
     print("="*70)
     if result['success']:
@@ -676,7 +865,7 @@ async def main():
         print("")
         print("💡 下一步:")
         print(f"   notebooklm use {result['notebook_id']}")
-        print(f"   notebooklm ask \"这本书的核心观点是什么？\"")
+        print("   notebooklm ask \"这本书的核心观点是什么？\"")
     else:
         print("❌ 上传失败")
         print("="*70)
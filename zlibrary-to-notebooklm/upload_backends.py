@@ -0,0 +1,304 @@
+"""
+NotebookLM 上传后端
+
+UploadBackend 定义上传接口（创建笔记本、添加来源），并实现一本书的
+上传流程：多个分块并发上传（上限 concurrency），source ID 按分块顺序返回。
+
+可用后端:
+    cli   调用 notebooklm CLI（asyncio.create_subprocess_exec，不经过 shell）
+    fake  进程内的本地替身，可配置延迟和失败率，记录创建的笔记本和来源，
+          用于离线基准测试和吞吐量测试
+
+    backend = make_upload_backend("cli", concurrency=4)
+    result = await backend.upload(part_files, title)
+
+创建笔记本和每个分块的上传各自按 resilience 的 upload 策略重试，
+失败的分块只重传它自己。
+"""
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+import json
+import random
+from pathlib import Path
+
+try:
+    from .resilience import CircuitOpenError, Resilience
+except ImportError:
+    from resilience import CircuitOpenError, Resilience
+
+
+class NotebookLMError(Exception):
+    """上传后端调用失败"""
+
+
+class UploadBackend(ABC):
+    """上传后端接口；子类必须实现 create_notebook 和 add_source，可选实现 use"""
+
+    name = None
+    # 熔断器按此名称统计失败
+    host = None
+
+    def __init__(self, concurrency: int = 3, resilience: Resilience = None):
+        self.concurrency = concurrency
+        self.resilience = resilience or Resilience()
+
+    async def _retrying(self, step):
+        return await self.resilience.call("upload", self.host, step, retry_on=(NotebookLMError,))
+
+    @abstractmethod
+    async def create_notebook(self, title: str) -> str:
+        """创建笔记本，返回笔记本 ID"""
+
+    async def use(self, notebook_id: str) -> None:
+        """把笔记本设为当前笔记本（后端不支持时什么也不做）"""
+
+    @abstractmethod
+    async def add_source(self, notebook_id: str, file_path: Path) -> str:
+        """向笔记本添加一个文件来源，返回来源 ID"""
+
+    async def add_sources(self, notebook_id: str, files: list[Path], uploaded: dict[int, str] | None = None,
+                          on_source=None) -> list[str | BaseException]:
+        """并发上传 files（最多 concurrency 个同时进行），按文件顺序返回
+        每个文件的 source ID 或异常
+
+        uploaded 给出已在笔记本中的分块（序号从 1 开始 -> source ID），
+        这些分块不再上传；每个分块上传成功后调用 on_source(序号, source ID)。
+        """
+        uploaded = uploaded or {}
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def add(i, file_path):
+            if i in uploaded:
+                return uploaded[i]
+            async with slots:
+                print(f"📄 上传分块 {i}/{len(files)}: {file_path.name}")
+                source_id = await self._retrying(lambda: self.add_source(notebook_id, file_path))
+                print(f"   ✅ 分块 {i} 成功 (ID: {source_id[:8]}...)")
+            if on_source is not None:
+                on_source(i, source_id)
+            return source_id
+
+        return await asyncio.gather(
+            *(add(i, f) for i, f in enumerate(files, 1)), return_exceptions=True
+        )
+
+    async def upload(self, files: list[Path], title: str, notebook_id: str | None = None,
+                     uploaded: dict[int, str] | None = None, on_notebook=None, on_source=None) -> dict:
+        """创建笔记本并上传 files，结果格式与 upload_to_notebooklm 相同
+
+        给出 notebook_id 时继续上传到该笔记本，只上传 uploaded 中没有的
+        分块；新建笔记本后调用 on_notebook(notebook_id)，on_source 见
+        add_sources。
+        """
+        if notebook_id is None:
+            print(f"📚 创建笔记本: {title}")
+            try:
+                notebook_id = await self._retrying(lambda: self.create_notebook(title))
+            except (NotebookLMError, CircuitOpenError) as e:
+                return {"success": False, "error": str(e)}
+            print(f"✅ 笔记本已创建 (ID: {notebook_id[:8]}...)")
+            if on_notebook is not None:
+                on_notebook(notebook_id)
+
+            # 设置为当前笔记本，方便之后直接用 notebooklm ask
+            print("🎯 设置笔记本上下文...")
+            try:
+                await self.use(notebook_id)
+            except NotebookLMError:
+                pass
+        else:
+            done = len(uploaded or {})
+            print(f"♻️  继续上传到笔记本 {notebook_id[:8]}...（已有 {done}/{len(files)} 块）")
+
+        results = await self.add_sources(notebook_id, files, uploaded, on_source)
+        source_ids = []
+        failed_parts = []
+        errors = []
+        for i, result in enumerate(results, 1):
+            if isinstance(result, BaseException):
+                print(f"⚠️  分块 {i} 上传失败: {result}")
+                failed_parts.append(i)
+                errors.append(str(result))
+            else:
+                source_ids.append(result)
+
+        result = {
+            # 有分块没传上去就不算成功：重跑时只补传这些分块
+            "success": not failed_parts,
+            "notebook_id": notebook_id,
+            "source_ids": source_ids,
+            "failed_parts": failed_parts,
+            "errors": errors,
+            "title": title,
+        }
+        if failed_parts:
+            parts = ", ".join(map(str, failed_parts))
+            result["error"] = f"{len(failed_parts)}/{len(files)} 个分块上传失败（第 {parts} 块）: {errors[0]}"
+        return result
+
+
+class CLIUploadBackend(UploadBackend):
+    """通过 notebooklm CLI 上传
+
+    与 CLI 文档一致，先用 "notebooklm use" 设置当前笔记本，再 source add。
+    当前笔记本是 CLI 的全局状态，因此同一个后端只在没有分块正在上传时
+    切换笔记本：同一本书的分块并发上传，多本书之间轮流进行（多个进程
+    同时用 CLI 上传仍会互相干扰）。
+    """
+
+    name = "cli"
+    host = "notebooklm.google.com"
+
+    def __init__(self, concurrency: int = 3, executable: str = "notebooklm", timeout: float = 600,
+                 resilience: Resilience = None):
+        super().__init__(concurrency, resilience)
+        self.executable = executable
+        self.timeout = timeout
+        # CLI 的当前笔记本，以及正在向它上传的分块数
+        self._current = None
+        self._adding = 0
+        self._switch = None
+        self._switch_loop = None
+
+    async def run(self, *args: str) -> str:
+        """运行一条 notebooklm 命令，返回标准输出；失败或超时抛出 NotebookLMError"""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                self.executable, *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            raise NotebookLMError(f"无法运行 {self.executable}: {e}") from e
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise NotebookLMError(f"{self.executable} {args[0]} 超时（{self.timeout:.0f} 秒）")
+        if proc.returncode != 0:
+            raise NotebookLMError(stderr.decode('utf-8', 'replace').strip() or f"退出码 {proc.returncode}")
+        return stdout.decode('utf-8', 'replace')
+
+    async def run_json(self, *args: str) -> dict:
+        output = await self.run(*args, "--json")
+        try:
+            return json.loads(output)
+        except ValueError as e:
+            raise NotebookLMError(f"无法解析输出: {output[:200]}") from e
+
+    async def create_notebook(self, title: str) -> str:
+        data = await self.run_json("create", title)
+        try:
+            return data['notebook']['id']
+        except (KeyError, TypeError):
+            raise NotebookLMError("解析笔记本 ID 失败")
+
+    @asynccontextmanager
+    async def _using(self, notebook_id: str):
+        """把 notebook_id 设为当前笔记本并保持到退出；其他笔记本的分块
+        正在上传时先等它们完成"""
+        # 同步的 upload_to_notebooklm 每次都新建事件循环，条件变量随之重建
+        loop = asyncio.get_running_loop()
+        if self._switch_loop is not loop:
+            self._switch, self._switch_loop = asyncio.Condition(), loop
+        switch = self._switch
+        async with switch:
+            await switch.wait_for(lambda: self._current == notebook_id or not self._adding)
+            if self._current != notebook_id:
+                self._current = None
+                await self.run("use", notebook_id)
+                self._current = notebook_id
+            self._adding += 1
+        try:
+            yield
+        finally:
+            async with switch:
+                self._adding -= 1
+                switch.notify_all()
+
+    async def use(self, notebook_id: str) -> None:
+        async with self._using(notebook_id):
+            pass
+
+    async def add_source(self, notebook_id: str, file_path: Path) -> str:
+        async with self._using(notebook_id):
+            data = await self.run_json("source", "add", str(file_path))
+        try:
+            return data['source']['id']
+        except (KeyError, TypeError):
+            raise NotebookLMError("解析来源 ID 失败")
+
+
+class FakeUploadBackend(UploadBackend):
+    """进程内的 NotebookLM 替身
+
+    每次调用等待 latency 秒（另加 0~jitter 秒随机抖动；给出
+    bytes_per_second 时再加上按文件大小计算的传输时间），并以
+    failure_rate 的概率失败。创建的笔记本和来源记录在 notebooks 中，
+    调用次数记录在 calls 中。seed 固定随机序列，便于复现。
+    """
+
+    name = "fake"
+    host = "fake"
+
+    def __init__(self, concurrency: int = 3, latency: float = 0.2, jitter: float = 0.0,
+                 failure_rate: float = 0.0, bytes_per_second: float | None = None, seed: int | None = None,
+                 resilience: Resilience = None):
+        if not 0 <= failure_rate <= 1:
+            raise ValueError("failure_rate must be between 0 and 1")
+        super().__init__(concurrency, resilience)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.bytes_per_second = bytes_per_second
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.notebooks = {}
+        self.calls = {}
+
+    async def _call(self, operation: str, size: int = 0):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if self.bytes_per_second:
+            delay += size / self.bytes_per_second
+        await asyncio.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            raise NotebookLMError(f"模拟失败: {operation}")
+
+    async def create_notebook(self, title: str) -> str:
+        await self._call("create")
+        notebook_id = f"fake-notebook-{next(self._ids):06d}"
+        self.notebooks[notebook_id] = {"title": title, "sources": []}
+        return notebook_id
+
+    async def add_source(self, notebook_id: str, file_path: Path) -> str:
+        if notebook_id not in self.notebooks:
+            raise NotebookLMError(f"笔记本不存在: {notebook_id}")
+        size = Path(file_path).stat().st_size
+        await self._call("source add", size)
+        source_id = f"fake-source-{next(self._ids):06d}"
+        self.notebooks[notebook_id]["sources"].append(
+            {"id": source_id, "path": str(file_path), "bytes": size}
+        )
+        return source_id
+
+    def report(self) -> dict:
+        """记录的笔记本、来源数量和调用次数"""
+        return {
+            "notebooks": len(self.notebooks),
+            "sources": sum(len(n["sources"]) for n in self.notebooks.values()),
+            "calls": dict(self.calls),
+        }
+
+
+BACKENDS = {backend.name: backend for backend in (CLIUploadBackend, FakeUploadBackend)}
+
+
+def make_upload_backend(name: str = "cli", **options) -> UploadBackend:
+    """按名称创建上传后端，options 传给后端的构造函数"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown upload backend: {name} (available: {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
@@ -1,42 +1,93 @@
 # zlibrary_to_notebooklm/utils.py
 from pathlib import Path
+from typing import Iterable
 import re
 
+# One word per CJK ideograph (Unified Ideographs, Extension A, Compatibility
+# Ideographs), one per run of half- or full-width Latin letters.
+_WORD_RE = re.compile(
+    r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]'
+    r'|\b[a-zA-Z\uff21-\uff3a\uff41-\uff5a]+\b'
+)
+
 def count_words(text: str) -> int:
-    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-    english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-    return chinese_chars + english_words
+    # subn counts matches in C without creating a match object per word
+    return _WORD_RE.subn('', text)[1]
+
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+def _stream_cut(text: str) -> int:
+    """Offset up to which text can be counted apart from what follows it.
+
+    Safe cuts are after a non-word character (a Latin run needs the word
+    boundary on both sides) and between two ideographs (one word each);
+    the scan back from the end stops at the first one, so it only crosses
+    a trailing run of letters and digits.
+    """
+    i = len(text)
+    while i > 0:
+        c = text[i - 1]
+        if not (c.isalnum() or c == '_'):
+            return i
+        if i >= 2 and _CJK_RE.match(c) and _CJK_RE.match(text[i - 2]):
+            return i - 1
+        i -= 1
+    return 0
+
+def count_words_iter(chunks: Iterable[str]) -> int:
+    """Count words over a stream of text chunks, e.g. an open file.
+
+    Chunks may cut words anywhere: each chunk is counted up to its last
+    safe cut (see _stream_cut) and the rest is carried into the next, so
+    every word is counted exactly once and the carry stays short even in
+    CJK text without spaces.
+    """
+    total = 0
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk
+        cut = _stream_cut(text)
+        total += count_words(text[:cut])
+        carry = text[cut:]
+    return total + count_words(carry)
+
+def count_file_words(file_path: Path, block_size: int = 1 << 20) -> int:
+    """Words in a UTF-8 text file, read block by block."""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        return count_words_iter(iter(lambda: f.read(block_size), ''))
+
+def parse_pdf_into_chunks(pdf_path, policy=None, workers: int = 0) -> list[str]:
+    """Extract a PDF's text and split it into NotebookLM-sized chunks.
+
+    Pages are extracted in parallel and streamed to a temporary Markdown
+    file (see convert_pdf.pdf_to_markdown), which is then cut by the same
+    chunking as EPUB conversions (``policy``, a chunking.ChunkPolicy).
+    Returns the chunk texts in order, or [] if the PDF could not be read.
+    """
+    import tempfile
+    try:
+        from .chunking import ChunkPolicy, plan_parts, read_ranges
+        from .convert_pdf import pdf_to_markdown
+    except ImportError:
+        from chunking import ChunkPolicy, plan_parts, read_ranges
+        from convert_pdf import pdf_to_markdown
+
+    with tempfile.TemporaryDirectory() as tmp:
+        md_file = Path(tmp) / f"{Path(pdf_path).stem}.md"
+        if not pdf_to_markdown(pdf_path, md_file, workers=workers):
+            return []
+        parts = plan_parts(md_file, policy or ChunkPolicy())
+        return list(read_ranges(md_file, [(part.start, part.end) for part in parts]))
 
 def split_markdown_file(file_path: Path, max_words: int = 350000) -> list[Path]:
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    chapters = re.split(r'\n(?=#{1,3}\s)', content)
-
-    chunks = []
-    current_chunk = ""
-    current_words = 0
-
-    for chapter in chapters:
-        chapter_words = count_words(chapter)
-        if current_words + chapter_words > max_words:
-            chunks.append(current_chunk)
-            current_chunk = chapter
-            current_words = chapter_words
-        else:
-            current_chunk += chapter
-            current_words += chapter_words
-
-    if current_chunk:
-        chunks.append(current_chunk)
-
-    chunk_files = []
-    stem = file_path.stem
-    for i, chunk in enumerate(chunks, 1):
-        chunk_file = file_path.parent / f"{stem}_part{i}.md"
-        with open(chunk_file, 'w', encoding='utf-8') as f:
-            f.write(chunks[i-1])
-        chunk_files.append(chunk_file)
-
-    return chunk_files
+    """Split a Markdown file into parts of at most max_words words.
+
+    Kept for existing callers; see chunking.split_markdown_file for the
+    other chunking options.
+    """
+    try:
+        from .chunking import ChunkPolicy, split_markdown_file as split
+    except ImportError:
+        from chunking import ChunkPolicy, split_markdown_file as split
 
+    return split(file_path, ChunkPolicy(max_words=max_words))
@@ -0,0 +1,12 @@
+"""
+Import name for the package in zlibrary-to-notebooklm/.
+
+That directory name is not a valid module name, so main.py, the tests and
+the benchmarks import the package as zlibrary_to_notebooklm through this
+module, which makes its submodules importable from a plain checkout:
+
+    from zlibrary_to_notebooklm.chunking import split_markdown_file
+"""
+from pathlib import Path
+
+__path__ = [str(Path(__file__).resolve().with_name("zlibrary-to-notebooklm"))]